@@ -4,10 +4,44 @@
 使用方法
     python myscript/0_venv.py
     python myscript/0_venv.py --rebuild
+    python myscript/0_venv.py --rebuild --no-preserve  # 重建时不保留已安装的包
+    python myscript/0_venv.py --matrix                 # 自动发现所有解释器，并发创建 .venv-3.8、.venv-3.10 ...
+    python myscript/0_venv.py --matrix 3.8 3.12 C:/Python310/python.exe  # 指定版本号或解释器路径
+    python myscript/0_venv.py --health                 # 快速健康检查（只检查文件，不启动子进程）
+    python myscript/0_venv.py --repair                 # 只修复检查出的问题
+    python myscript/0_venv.py --snapshot               # 把.venv压缩保存到本地快照缓存
+    python myscript/0_venv.py --restore                # 从快照缓存并行解压恢复.venv（无需重新安装）
+    python myscript/0_venv.py --restore --cache-dir D:/ci-cache --req requirements.txt
+    python myscript/0_venv.py --dedupe ../a/.venv ../b/.venv  # 多个venv之间相同的文件改为硬链接
+    python myscript/0_venv.py --no-template        # 不使用模板，直接用virtualenv创建
+    python myscript/0_venv.py --refresh-template   # 重新生成当前解释器的模板
 
 逻辑
     1. 会先确保virtualenv已安装
     2. 判断是否存在虚拟环境，不存在则创建
+    3. 创建时优先从模板克隆：每个解释器版本在用户缓存目录中保存一份干净的venv模板，
+       新venv用硬链接克隆模板文件，再改写pyvenv.cfg和脚本中的绝对路径，
+       跨文件系统等无法硬链接时退回普通复制，模板不可用时退回virtualenv
+    4. 重建时默认保留已安装的包：先记录已安装的分发包，确保每个包在本地wheel缓存
+       (.misc/.wheelhouse)中有对应版本的wheel（没有就用已安装的文件重新打包成wheel，
+       重新打包的wheel不完整，单独放在 .misc/.repacked_wheels，不会进入离线安装包和本地wheel源），
+       重建后用 --no-index 从本地缓存离线装回完全相同的版本
+    5. 矩阵模式：按多个解释器在线程池中并发创建 <venv>-<主版本.次版本>（版本相同的只创建第一个），
+       当前virtualenv不支持的旧版本改用目标解释器自己的virtualenv或venv模块，
+       每个venv的输出单独收集，最后打印各自的创建用时汇总表
+    6. 健康检查：只读文件校验pyvenv.cfg、home指向的基础解释器及其版本、
+       venv中的python、site-packages和pip/setuptools的dist-info，不启动任何子进程；
+       修复模式只处理有问题的部分（重新指向同版本解释器、补回python、离线补装pip等）
+    7. 快照：按 解释器实现+版本+平台+requirements.txt的sha256 生成键，
+       把venv按文件大小均衡分成多个分片，每个分片边打包边gzip压缩（不生成中间tar），
+       多线程同时写出；恢复时先建好目录，再多线程并行解压各分片到临时目录，
+       改写pyvenv.cfg和脚本中的绝对路径，必要时把home重新指向本机解释器，最后整体替换.venv
+    8. 去重：扫描多个venv的site-packages，先按(大小, 权限)分组，只对可能重复的文件
+       多线程计算sha256，相同内容的文件都改为指向存储目录中同一份副本的硬链接
+       （先链接到临时文件再原子替换；替换前确认文件未被修改）；
+       无法硬链接时（跨分区、链接数上限等）尝试写时复制的reflink，也不支持则跳过
+       文件系统支持reflink时存储副本和各venv的文件都用reflink，inode互相独立；
+       硬链接的存储副本会随venv中的原地修改而变化，每次使用前重新校验大小和sha256，不一致就丢弃重建
 
 """
 
@@ -17,25 +51,81 @@ import argparse
 import subprocess
 import shutil
 import logging
+import json
+import time
+import hashlib
+import importlib.util
+import glob
+import csv
+import re
+import base64
+import zipfile
+import gzip
+import tarfile
+import platform
+import stat
+import errno
+from concurrent.futures import ThreadPoolExecutor
 
 VENV_PATH = '.venv'
+# 用户级缓存目录下的子目录（模板在多个项目间共享）
+TEMPLATE_DIR_NAME = 'venv-templates'
+TEMPLATE_MARKER = 'template.json'
+# 本地wheel缓存目录（与2_install_import.py共用）
+WHEELHOUSE_DIR = '.misc/.wheelhouse'
+# 用已安装文件重新打包的wheel（缺少脚本和data文件，只用于重建时恢复，不放进wheelhouse）
+REPACKED_WHEEL_DIR = '.misc/.repacked_wheels'
+# 新建venv自带的包，重建时不需要恢复
+SEED_PACKAGES = {'pip', 'setuptools', 'wheel'}
+# 重新打包wheel时不带上的安装记录文件（由pip安装时重新生成）
+INSTALL_ONLY_FILES = {'RECORD', 'INSTALLER', 'REQUESTED', 'direct_url.json'}
+# venv快照缓存（默认放在用户级缓存目录下，CI可用--cache-dir指定）
+SNAPSHOT_DIR_NAME = 'venv-snapshots'
+SNAPSHOT_META = 'meta.json'
+REQUIREMENTS_FILE = 'requirements.txt'
+# 快照压缩级别（6在速度和体积之间比较均衡）
+SNAPSHOT_COMPRESS_LEVEL = 6
+# 去重存储目录（每个内容只保存一份，venv中的文件硬链接到这里）
+DEDUPE_STORE_NAME = 'dedupe-store'
+# 小于此大小的文件不去重（节省的空间不值得额外的哈希开销）
+DEDUPE_MIN_SIZE = 4096
+# Linux的FICLONE ioctl（btrfs/xfs等支持reflink的文件系统）
+FICLONE = 0x40049409
 
 def ensure_virtualenv():
+    # 只检查模块是否存在，不实际导入（导入virtualenv本身要几百毫秒）
+    if importlib.util.find_spec('virtualenv') is not None:
+        return True, ''
     try:
+        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'virtualenv'])
         import virtualenv
-        return True, ''
-    except ImportError:
-        try:
-            subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'virtualenv'])
-            import virtualenv
-            return True, '已安装virtualenv'
-        except Exception as e:
-            return False, f'virtualenv安装失败: {e}'
+        return True, '已安装virtualenv'
+    except Exception as e:
+        return False, f'virtualenv安装失败: {e}'
 
 def venv_exists(venv_path=VENV_PATH):
     python_path = os.path.join(venv_path, 'Scripts' if os.name == 'nt' else 'bin', 'python.exe' if os.name == 'nt' else 'python')
     return os.path.isdir(venv_path) and os.path.isfile(python_path)
 
+def _log(msg, output=None):
+    """输出信息；output为列表时收集起来（并发创建时每个venv的输出分开保存）"""
+    if output is None:
+        print(msg)
+    else:
+        output.append(msg)
+
+def _run(cmd, output=None):
+    """运行命令；output为列表时捕获输出，失败时抛出CalledProcessError"""
+    if output is None:
+        subprocess.check_call(cmd)
+        return
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            encoding='utf-8', errors='replace')
+    if result.stdout.strip():
+        output.append(result.stdout.rstrip())
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, cmd)
+
 def get_real_python():
     # 如果是PyInstaller打包的exe，优先用系统python
     if getattr(sys, 'frozen', False):
@@ -44,21 +134,1250 @@ def get_real_python():
             return python
     return sys.executable
 
-def create_venv(venv_path=VENV_PATH):
+def virtualenv_cmds(python, venv_path):
+    """
+    创建venv的候选命令，按顺序尝试：
+        1. 当前解释器的virtualenv配合-p创建，目标解释器无需安装virtualenv
+        2. 目标解释器自己的virtualenv（新版virtualenv自带的pip/setuptools不再支持3.8及更早的版本）
+        3. 目标解释器自带的venv模块
+    """
+    cmds = [[python, '-m', 'virtualenv', venv_path], [python, '-m', 'venv', venv_path]]
+    if not getattr(sys, 'frozen', False):
+        cmds.insert(0, [sys.executable, '-m', 'virtualenv', '-p', python, venv_path])
+    return cmds
+
+def run_virtualenv(python, venv_path, output=None):
+    """依次尝试候选命令创建venv，失败时删除半成品再试下一个"""
+    cmds = virtualenv_cmds(python, venv_path)
+    for i, cmd in enumerate(cmds):
+        try:
+            _run(cmd, output)
+            return
+        except (OSError, subprocess.CalledProcessError) as e:
+            shutil.rmtree(venv_path, ignore_errors=True)
+            if i == len(cmds) - 1:
+                raise
+            _log(f"{' '.join(cmd[:3])} 创建失败: {e}\n改用: {' '.join(cmds[i + 1][:3])}", output)
+
+def get_scripts_dir(venv_path):
+    return os.path.join(venv_path, 'Scripts' if os.name == 'nt' else 'bin')
+
+def get_cache_root():
+    """用户级缓存目录（venv模板等跨项目共享的数据）"""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), 'AppData', 'Local')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pyvenv-cache')
+
+def get_python_info(python):
+    """获取解释器的实现、版本和基础路径（当前解释器无需启动子进程）"""
+    if os.path.normcase(os.path.abspath(python)) == os.path.normcase(os.path.abspath(sys.executable)):
+        return {
+            'implementation': sys.implementation.name,
+            'version': '.'.join(str(v) for v in sys.version_info[:3]),
+            'executable': os.path.realpath(sys.executable),
+            'base_prefix': getattr(sys, 'base_prefix', sys.prefix),
+        }
+    code = (
+        'import sys, os, json; print(json.dumps({'
+        '"implementation": sys.implementation.name, '
+        '"version": ".".join(str(v) for v in sys.version_info[:3]), '
+        '"executable": os.path.realpath(sys.executable), '
+        '"base_prefix": getattr(sys, "base_prefix", sys.prefix)}))'
+    )
+    output = subprocess.check_output([python, '-c', code], encoding='utf-8', stderr=subprocess.DEVNULL)
+    return json.loads(output)
+
+def get_template_dir(info):
+    """模板目录按解释器实现+版本+基础路径区分"""
+    digest = hashlib.sha1(f"{info['executable']}|{info['base_prefix']}".encode('utf-8')).hexdigest()[:10]
+    key = f"{info['implementation']}-{info['version']}-{digest}"
+    return os.path.join(get_cache_root(), TEMPLATE_DIR_NAME, key)
+
+def ensure_template(python, refresh=False, output=None):
+    """
+    确保解释器对应的干净venv模板存在
+    
+    Returns:
+        (ok, (template_venv, source_path)) 或 (False, 错误信息)
+        source_path 是模板创建时所在的路径，克隆后需要替换成新路径
+    """
+    try:
+        info = get_python_info(python)
+    except Exception as e:
+        return False, f'无法获取解释器信息: {e}'
+    
+    template_dir = get_template_dir(info)
+    marker = os.path.join(template_dir, TEMPLATE_MARKER)
+    if not refresh and os.path.isfile(marker):
+        with open(marker, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        template_venv = os.path.join(template_dir, 'venv')
+        if venv_exists(template_venv):
+            return True, (template_venv, meta['source_path'])
+    
+    # 先在临时目录生成，完成后再改名，避免半成品模板被使用
+    tmp_dir = f'{template_dir}.tmp-{os.getpid()}'
+    tmp_venv = os.path.join(tmp_dir, 'venv')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    try:
+        _log(f'正在生成venv模板: {template_dir}', output)
+        run_virtualenv(python, tmp_venv, output)
+        meta = dict(info, source_path=os.path.abspath(tmp_venv), created=time.strftime('%Y-%m-%d %H:%M:%S'))
+        with open(os.path.join(tmp_dir, TEMPLATE_MARKER), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=4)
+        if os.path.exists(template_dir):
+            shutil.rmtree(template_dir)
+        os.replace(tmp_dir, template_dir)
+    except Exception as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False, f'venv模板生成失败: {e}'
+    
+    return True, (os.path.join(template_dir, 'venv'), meta['source_path'])
+
+def clone_tree(src, dst):
+    """
+    用硬链接克隆目录树，无法硬链接时（跨文件系统、不支持硬链接等）退回普通复制
+    
+    Returns:
+        (linked, copied) 硬链接和复制的文件数
+    """
+    linked = copied = 0
+    use_link = True
+    for root, dirs, files in os.walk(src):
+        rel = os.path.relpath(root, src)
+        target_root = dst if rel == '.' else os.path.join(dst, rel)
+        os.makedirs(target_root, exist_ok=True)
+        
+        # 目录符号链接（如lib64 -> lib）原样重建，不进入遍历
+        for d in list(dirs):
+            src_dir = os.path.join(root, d)
+            if os.path.islink(src_dir):
+                os.symlink(os.readlink(src_dir), os.path.join(target_root, d))
+                dirs.remove(d)
+        
+        for name in files:
+            src_file = os.path.join(root, name)
+            dst_file = os.path.join(target_root, name)
+            # 文件符号链接（如bin/python -> 系统解释器）原样重建
+            if os.path.islink(src_file):
+                os.symlink(os.readlink(src_file), dst_file)
+                continue
+            if use_link:
+                try:
+                    os.link(src_file, dst_file)
+                    linked += 1
+                    continue
+                except OSError:
+                    use_link = False
+            shutil.copy2(src_file, dst_file)
+            copied += 1
+    return linked, copied
+
+def _replace_in_file(file_path, replacements):
+    """替换文件中的字节串；写入新文件后替换，不会改动硬链接共享的原文件"""
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    new_data = data
+    for old, new in replacements:
+        new_data = new_data.replace(old, new)
+    if new_data == data:
+        return False
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(new_data)
+    shutil.copymode(file_path, tmp_path)
+    os.replace(tmp_path, file_path)
+    return True
+
+def rewrite_venv_paths(venv_path, old_prefix, new_prefix):
+    """
+    把pyvenv.cfg、激活脚本、脚本shebang和exe启动器中的旧venv路径改为新路径
+    
+    exe启动器末尾是 shebang + zip，启动器按zip末尾的目录记录定位shebang，
+    所以路径长度变化也不影响
+    
+    Returns:
+        改写的文件数
+    """
+    old_prefix = os.path.abspath(old_prefix)
+    new_prefix = os.path.abspath(new_prefix)
+    if os.path.normcase(old_prefix) == os.path.normcase(new_prefix):
+        return 0
+    
+    replacements = [(old_prefix.encode('utf-8'), new_prefix.encode('utf-8'))]
+    if os.sep == '\\':
+        # 部分脚本（如bash的activate）使用正斜杠路径
+        replacements.append((old_prefix.replace('\\', '/').encode('utf-8'),
+                             new_prefix.replace('\\', '/').encode('utf-8')))
+    
+    candidates = [os.path.join(venv_path, 'pyvenv.cfg')]
+    scripts_dir = get_scripts_dir(venv_path)
+    if os.path.isdir(scripts_dir):
+        for name in os.listdir(scripts_dir):
+            path = os.path.join(scripts_dir, name)
+            if os.path.isfile(path) and not os.path.islink(path):
+                candidates.append(path)
+    
+    count = 0
+    for path in candidates:
+        if os.path.isfile(path) and _replace_in_file(path, replacements):
+            count += 1
+    return count
+
+def create_venv_from_template(venv_path, python=None, refresh=False, output=None):
+    """从模板克隆虚拟环境"""
+    start = time.time()
+    python = python or get_real_python()
+    
+    if os.path.exists(venv_path) and os.listdir(venv_path):
+        return False, f'目标目录非空，无法克隆: {venv_path}'
+    
+    ok, result = ensure_template(python, refresh, output)
+    if not ok:
+        return False, result
+    template_venv, source_path = result
+    
+    try:
+        linked, copied = clone_tree(template_venv, venv_path)
+        rewritten = rewrite_venv_paths(venv_path, source_path, venv_path)
+    except Exception as e:
+        shutil.rmtree(venv_path, ignore_errors=True)
+        return False, f'克隆模板失败: {e}'
+    
+    elapsed = time.time() - start
+    return True, (f'虚拟环境创建成功（模板克隆: 硬链接 {linked} 个文件, 复制 {copied} 个, '
+                  f'改写 {rewritten} 个, 用时 {elapsed:.2f} 秒）')
+
+def make_venv(venv_path, python=None, use_template=True, refresh_template=False, output=None):
+    """创建虚拟环境文件：优先模板克隆，失败时退回virtualenv"""
+    python = python or get_real_python()
+    if use_template:
+        ok, msg = create_venv_from_template(venv_path, python, refresh_template, output)
+        if ok:
+            return True, msg
+        _log(f'{msg}，改用virtualenv创建', output)
+    run_virtualenv(python, venv_path, output)
+    return True, '虚拟环境创建成功'
+
+def create_venv(venv_path=VENV_PATH, python=None, use_template=True, refresh_template=False, output=None):
     if venv_exists(venv_path):
         return True, '虚拟环境已存在'
     try:
-        subprocess.check_call([get_real_python(), '-m', 'virtualenv', venv_path])
-        return True, '虚拟环境创建成功'
+        return make_venv(venv_path, python, use_template, refresh_template, output)
     except Exception as e:
         return False, f'虚拟环境创建失败: {e}'
 
+def discover_interpreters():
+    """
+    自动发现本机安装的各版本Python解释器
+    
+    Returns:
+        {'3.10': 解释器路径, ...} 按版本排序，同一版本只保留第一个
+    """
+    found = []
+    if os.name == 'nt':
+        # py启动器输出: " -V:3.12 *        C:\...\python.exe" 或旧版 " -3.8-64        C:\...\python.exe"
+        try:
+            output = subprocess.check_output(['py', '-0p'], encoding='utf-8', errors='replace',
+                                             stderr=subprocess.DEVNULL)
+            for line in output.splitlines():
+                m = re.search(r'([A-Za-z]:\\.*?python[w]?\.exe)\s*$', line.strip(), re.IGNORECASE)
+                if m:
+                    found.append(m.group(1))
+        except (OSError, subprocess.SubprocessError):
+            pass
+    else:
+        for minor in range(6, 30):
+            path = shutil.which(f'python3.{minor}')
+            if path:
+                found.append(path)
+        # pyenv安装的版本（未激活时shim不可用，直接找versions目录）
+        pyenv_root = os.environ.get('PYENV_ROOT') or os.path.join(os.path.expanduser('~'), '.pyenv')
+        found.extend(sorted(glob.glob(os.path.join(pyenv_root, 'versions', '*', 'bin', 'python3'))))
+    
+    # 按真实路径去重（python3 -> python3.12 等符号链接）
+    candidates = []
+    seen = set()
+    for path in found:
+        key = os.path.normcase(os.path.realpath(path))
+        if key not in seen:
+            seen.add(key)
+            candidates.append(path)
+    
+    # 并发探测，去掉无法运行的（如未激活的pyenv shim），同一版本只保留第一个
+    def probe(path):
+        try:
+            return path, get_python_info(path)
+        except Exception:
+            return path, None
+    
+    found_versions = {}
+    with ThreadPoolExecutor(max_workers=max(len(candidates), 1)) as pool:
+        for path, info in pool.map(probe, candidates):
+            if not info:
+                continue
+            major_minor = tuple(int(v) for v in info['version'].split('.')[:2])
+            found_versions.setdefault(major_minor, path)
+    return {f'{v[0]}.{v[1]}': found_versions[v] for v in sorted(found_versions)}
+
+def resolve_interpreter(spec, discovered=None):
+    """把版本号（如3.8）或路径解析成解释器路径，版本号优先从已发现的解释器中查找"""
+    if os.path.isfile(spec):
+        return spec
+    if re.fullmatch(r'\d+\.\d+', spec):
+        if discovered and spec in discovered:
+            return discovered[spec]
+        if os.name == 'nt':
+            try:
+                return subprocess.check_output(
+                    ['py', f'-{spec}', '-c', 'import sys; print(sys.executable)'],
+                    encoding='utf-8', stderr=subprocess.DEVNULL).strip()
+            except (OSError, subprocess.SubprocessError):
+                return None
+        return shutil.which(f'python{spec}')
+    return shutil.which(spec)
+
+def _probe_matrix_python(python):
+    """矩阵模式下获取解释器信息，返回 (信息, 错误信息)"""
+    try:
+        return get_python_info(python), None
+    except Exception as e:
+        return None, f'无法获取解释器信息: {e}'
+
+def _create_matrix_venv(python, info, venv_path, use_template):
+    """矩阵模式下创建单个venv（在线程池中运行，输出单独收集）"""
+    output = []
+    start = time.time()
+    result = {'python': python, 'version': info['version'], 'venv': venv_path, 'ok': False, 'msg': '',
+              'output': output}
+    try:
+        result['ok'], result['msg'] = create_venv(venv_path, python, use_template, output=output)
+    except Exception as e:
+        result['msg'] = f'虚拟环境创建失败: {e}'
+    result['elapsed'] = time.time() - start
+    return result
+
+def create_venv_matrix(specs=None, venv_prefix=VENV_PATH, use_template=True, workers=None):
+    """
+    按多个解释器并发创建venv
+    
+    Args:
+        specs: 解释器路径或版本号列表，为空时自动发现
+        venv_prefix: venv目录前缀，生成 <前缀>-<主版本.次版本>
+        workers: 线程数，默认每个解释器一个线程
+    
+    Returns:
+        结果列表 [{'python', 'version', 'venv', 'ok', 'msg', 'output', 'elapsed'}, ...]
+    """
+    if specs:
+        discovered = None
+        if any(re.fullmatch(r'\d+\.\d+', spec) for spec in specs):
+            discovered = discover_interpreters()
+        interpreters = []
+        for spec in specs:
+            path = resolve_interpreter(spec, discovered)
+            if path:
+                interpreters.append(path)
+            else:
+                print(f'警告: 未找到解释器: {spec}')
+    else:
+        interpreters = list(discover_interpreters().values())
+    
+    # 同一个解释器只创建一次
+    unique = []
+    seen = set()
+    for path in interpreters:
+        key = os.path.normcase(os.path.realpath(path))
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    if not unique:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=workers or len(unique)) as pool:
+        infos = list(pool.map(_probe_matrix_python, unique))
+    
+    # 不同的解释器版本相同时会写同一个 <前缀>-<主版本.次版本>，只创建第一个
+    results = [None] * len(unique)
+    jobs = []
+    owners = {}
+    for i, (path, (info, error)) in enumerate(zip(unique, infos)):
+        if error:
+            results[i] = {'python': path, 'version': '?', 'venv': '', 'ok': False, 'msg': error,
+                          'output': [], 'elapsed': 0.0}
+            continue
+        venv_path = f"{venv_prefix}-{'.'.join(info['version'].split('.')[:2])}"
+        key = os.path.normcase(os.path.abspath(venv_path))
+        if key in owners:
+            results[i] = {'python': path, 'version': info['version'], 'venv': venv_path, 'ok': False,
+                          'msg': f'与 {owners[key]} 的虚拟环境目录相同，已跳过（请用--matrix只指定其中一个）',
+                          'output': [], 'elapsed': 0.0}
+            continue
+        owners[key] = path
+        jobs.append((i, path, info, venv_path))
+    
+    if jobs:
+        print(f'并发创建 {len(jobs)} 个虚拟环境...')
+        with ThreadPoolExecutor(max_workers=workers or len(jobs)) as pool:
+            futures = [(i, pool.submit(_create_matrix_venv, path, info, venv_path, use_template))
+                       for i, path, info, venv_path in jobs]
+            for i, future in futures:
+                results[i] = future.result()
+    return results
+
+def print_matrix_results(results):
+    """依次打印每个venv的输出，最后打印汇总表"""
+    for r in results:
+        print(f"\n{'=' * 20} {r['venv'] or r['python']} {'=' * 20}")
+        for line in r['output']:
+            print(line)
+        print(r['msg'])
+    
+    # 中文字符显示宽度为2，表头的填充宽度相应减小
+    print(f"\n{'虚拟环境':<16}{'Python':<12}{'状态':<6}{'用时':>6}")
+    print('-' * 46)
+    for r in results:
+        status = '成功' if r['ok'] else '失败'
+        print(f"{r['venv'] or '-':<20}{r['version']:<12}{status:<6}{r['elapsed']:>7.2f}s")
+    print(f"\n共 {len(results)} 个, 失败 {sum(1 for r in results if not r['ok'])} 个")
+
+def read_pyvenv_cfg(venv_path):
+    """读取pyvenv.cfg为字典（键统一小写）"""
+    cfg = {}
+    with open(os.path.join(venv_path, 'pyvenv.cfg'), 'r', encoding='utf-8') as f:
+        for line in f:
+            if '=' in line:
+                key, value = line.split('=', 1)
+                cfg[key.strip().lower()] = value.strip()
+    return cfg
+
+def write_pyvenv_cfg_values(venv_path, values):
+    """修改pyvenv.cfg中的指定键，其他行保持不变"""
+    cfg_path = os.path.join(venv_path, 'pyvenv.cfg')
+    with open(cfg_path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    remaining = dict(values)
+    for i, line in enumerate(lines):
+        key = line.split('=', 1)[0].strip().lower() if '=' in line else None
+        if key in remaining:
+            lines[i] = f'{key} = {remaining.pop(key)}'
+    lines.extend(f'{key} = {value}' for key, value in remaining.items())
+    with open(cfg_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def get_cfg_version(cfg):
+    """pyvenv.cfg中记录的主次版本号，如'3.11'"""
+    version = cfg.get('version_info') or cfg.get('version') or ''
+    m = re.match(r'(\d+)\.(\d+)', version)
+    return f'{m.group(1)}.{m.group(2)}' if m else None
+
+def find_base_python(home, version=None):
+    """
+    在home目录中查找基础解释器
+    
+    version为venv的主次版本号时也接受只有带版本号的解释器（如 make altinstall 安装的python3.12）
+    """
+    names = ['python.exe'] if os.name == 'nt' else ['python3', 'python'] + ([f'python{version}'] if version else [])
+    for name in names:
+        path = os.path.join(home, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def detect_base_versions(home):
+    """
+    通过文件推断基础解释器目录中有哪些主次版本（Windows看pythonXY.dll，其他平台看lib/pythonX.Y/os.py）
+    
+    /usr 等共享前缀下可能同时有多个版本，返回所有找到的版本
+    """
+    versions = set()
+    if os.name == 'nt':
+        for path in glob.glob(os.path.join(home, 'python3*.dll')):
+            m = re.fullmatch(r'python(\d)(\d+)\.dll', os.path.basename(path), re.IGNORECASE)
+            if m:
+                versions.add(f'{m.group(1)}.{m.group(2)}')
+        return versions
+    prefix = os.path.dirname(os.path.normpath(home))
+    for path in glob.glob(os.path.join(prefix, 'lib', 'python3.*', 'os.py')):
+        versions.add(os.path.basename(os.path.dirname(path))[len('python'):])
+    return versions
+
+def has_base_version(home, version):
+    """基础解释器目录中是否有指定主次版本的标准库，无法判断（找不到任何版本）时返回None"""
+    if os.name == 'nt':
+        if os.path.isfile(os.path.join(home, f"python{version.replace('.', '')}.dll")):
+            return True
+    elif os.path.isfile(os.path.join(os.path.dirname(os.path.normpath(home)), 'lib', f'python{version}', 'os.py')):
+        return True
+    return False if detect_base_versions(home) else None
+
+def _version_key(version):
+    return tuple(int(v) if v.isdigit() else 0 for v in re.split(r'[.+-]', version))
+
+def find_dist_info(site_packages, name):
+    """查找指定包的dist-info目录，有多个（升级残留）时优先有RECORD的、版本最高的"""
+    candidates = []
+    for path in glob.glob(os.path.join(site_packages, f'{name}-*.dist-info')):
+        version = os.path.basename(path)[len(name) + 1:-len('.dist-info')]
+        if '-' in version:
+            continue
+        candidates.append((os.path.isfile(os.path.join(path, 'RECORD')), _version_key(version), path))
+    return max(candidates)[2] if candidates else None
+
+def check_venv_health(venv_path=VENV_PATH):
+    """
+    快速健康检查，只读文件，不启动子进程
+    
+    Returns:
+        问题列表 [(code, level, message), ...]，level为'error'或'warning'，空列表表示健康
+    """
+    issues = []
+    if not os.path.isdir(venv_path):
+        return [('missing_venv', 'error', f'虚拟环境不存在: {venv_path}')]
+    
+    cfg_path = os.path.join(venv_path, 'pyvenv.cfg')
+    if not os.path.isfile(cfg_path):
+        return [('missing_cfg', 'error', '缺少pyvenv.cfg')]
+    cfg = read_pyvenv_cfg(venv_path)
+    cfg_version = get_cfg_version(cfg)
+    
+    home = cfg.get('home')
+    if not home or not os.path.isdir(home):
+        issues.append(('dangling_home', 'error', f'pyvenv.cfg的home指向的目录不存在: {home}'))
+    elif not find_base_python(home, cfg_version):
+        issues.append(('missing_base_python', 'error', f'home目录中找不到基础解释器: {home}'))
+    else:
+        if cfg_version and has_base_version(home, cfg_version) is False:
+            found = ', '.join(sorted(detect_base_versions(home), key=_version_key))
+            issues.append(('version_mismatch', 'error',
+                           f'基础解释器版本已变为 {found}，venv创建时为 {cfg_version}'))
+    
+    # venv中的python（POSIX下是符号链接，目标不存在时exists为False）
+    python_path = os.path.join(get_scripts_dir(venv_path), 'python.exe' if os.name == 'nt' else 'python')
+    if not os.path.exists(python_path):
+        issues.append(('missing_python', 'error', f'venv中的python不存在或链接失效: {python_path}'))
+    
+    site_packages = get_site_packages(venv_path)
+    if not site_packages:
+        issues.append(('missing_site_packages', 'error', '找不到site-packages目录'))
+        return issues
+    
+    pip_info = find_dist_info(site_packages, 'pip')
+    if not pip_info or not os.path.isfile(os.path.join(pip_info, 'RECORD')) \
+            or not os.path.isfile(os.path.join(site_packages, 'pip', '__init__.py')):
+        issues.append(('missing_pip', 'error', 'pip未安装或已损坏'))
+    
+    setuptools_info = find_dist_info(site_packages, 'setuptools')
+    if setuptools_info:
+        if not os.path.isfile(os.path.join(site_packages, 'setuptools', '__init__.py')):
+            issues.append(('broken_setuptools', 'error', 'setuptools的dist-info存在但包文件缺失'))
+    elif cfg_version and tuple(int(v) for v in cfg_version.split('.')) < (3, 12):
+        # 3.12起virtualenv默认不再预装setuptools
+        issues.append(('missing_setuptools', 'warning', 'setuptools未安装'))
+    
+    return issues
+
+def find_matching_python(version):
+    """查找指定主次版本的可用解释器（修复时使用，允许启动子进程）"""
+    candidates = [get_real_python()] + list(discover_interpreters().values())
+    for python in candidates:
+        try:
+            info = get_python_info(python)
+        except Exception:
+            continue
+        if info['version'].startswith(f'{version}.'):
+            return python, info
+    return None, None
+
+def _repoint_base_python(venv_path, cfg_version):
+    """把pyvenv.cfg和python符号链接重新指向同版本的可用解释器"""
+    python, info = find_matching_python(cfg_version)
+    if not python:
+        return False, f'找不到 {cfg_version} 版本的解释器，需要用 --rebuild 重建'
+    executable = info['executable']
+    write_pyvenv_cfg_values(venv_path, {
+        'home': os.path.dirname(executable),
+        'executable': executable,
+        'base-executable': executable,
+        'base-prefix': info['base_prefix'],
+        'base-exec-prefix': info['base_prefix'],
+    })
+    if os.name != 'nt':
+        scripts_dir = get_scripts_dir(venv_path)
+        for name in os.listdir(scripts_dir):
+            path = os.path.join(scripts_dir, name)
+            if os.path.islink(path) and os.path.isabs(os.readlink(path)) and not os.path.exists(path):
+                os.remove(path)
+                os.symlink(executable, path)
+    return True, f'已重新指向解释器: {executable}'
+
+def _install_seed_package(venv_path, name):
+    """离线补装pip/setuptools：优先ensurepip，其次用virtualenv自带的wheel"""
+    python_path = os.path.join(get_scripts_dir(venv_path), 'python.exe' if os.name == 'nt' else 'python')
+    # 先清掉残留的包文件，避免新旧版本文件混在一起
+    site_packages = get_site_packages(venv_path)
+    for path in [os.path.join(site_packages, name)] + glob.glob(os.path.join(site_packages, f'{name}-*.dist-info')):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+    if name == 'pip':
+        result = subprocess.run([python_path, '-m', 'ensurepip', '--default-pip'],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if result.returncode == 0:
+            return True, '已通过ensurepip补装pip'
+    try:
+        from virtualenv.seed.wheels.embed import BUNDLE_FOLDER
+    except ImportError:
+        return False, f'无法离线补装{name}: ensurepip不可用且未找到virtualenv自带的wheel'
+    wheels = sorted(glob.glob(os.path.join(str(BUNDLE_FOLDER), f'{name}-*.whl')))
+    if not wheels:
+        return False, f'无法离线补装{name}: virtualenv未自带{name}的wheel'
+    # pip的wheel可以直接作为pip运行来安装自己
+    runner = [python_path, os.path.join(wheels[-1], 'pip')] if name == 'pip' else [python_path, '-m', 'pip']
+    result = subprocess.run(runner + ['install', '--no-index', '--force-reinstall', '--no-deps', wheels[-1]],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        return False, f"补装{name}失败: {result.stderr.decode('utf-8', errors='ignore')}"
+    return True, f'已用virtualenv自带的wheel补装{name}'
+
+def repair_venv(venv_path=VENV_PATH, issues=None):
+    """
+    针对健康检查发现的问题做最小修复
+    
+    Returns:
+        (ok, msg)
+    """
+    if issues is None:
+        issues = check_venv_health(venv_path)
+    if not issues:
+        return True, '虚拟环境健康，无需修复'
+    
+    codes = {code for code, _, _ in issues}
+    messages = []
+    
+    if codes & {'missing_venv', 'missing_cfg', 'missing_site_packages'}:
+        return False, '虚拟环境缺少关键文件，无法局部修复，请使用 --rebuild 重建'
+    
+    try:
+        if codes & {'dangling_home', 'missing_base_python', 'version_mismatch'}:
+            ok, msg = _repoint_base_python(venv_path, get_cfg_version(read_pyvenv_cfg(venv_path)))
+            messages.append(msg)
+            if not ok:
+                return False, '\n'.join(messages)
+        
+        # venv中的python缺失：用virtualenv在原目录补建（--no-seed不动已安装的包）
+        if not os.path.exists(os.path.join(get_scripts_dir(venv_path), 'python.exe' if os.name == 'nt' else 'python')):
+            cfg = read_pyvenv_cfg(venv_path)
+            base_python = cfg.get('base-executable') or find_base_python(cfg.get('home', ''), get_cfg_version(cfg))
+            _run([sys.executable, '-m', 'virtualenv', '--no-seed', '-p', base_python, venv_path], [])
+            messages.append('已补建venv中的python')
+        
+        for code, name in (('missing_pip', 'pip'), ('broken_setuptools', 'setuptools'),
+                           ('missing_setuptools', 'setuptools')):
+            if code in codes:
+                ok, msg = _install_seed_package(venv_path, name)
+                messages.append(msg)
+                if not ok and code != 'missing_setuptools':
+                    return False, '\n'.join(messages)
+    except Exception as e:
+        messages.append(f'修复失败: {e}')
+        return False, '\n'.join(messages)
+    
+    remaining = [issue for issue in check_venv_health(venv_path) if issue[1] == 'error']
+    if remaining:
+        messages.append('修复后仍有问题: ' + '; '.join(m for _, _, m in remaining))
+        return False, '\n'.join(messages)
+    return True, '\n'.join(messages)
+
 def is_venv_active():
     """检测当前是否在虚拟环境中运行"""
     return hasattr(sys, 'real_prefix') or (hasattr(sys, 'base_prefix') and sys.base_prefix != sys.prefix)
 
-def rebuild_venv(venv_path=VENV_PATH):
-    """删除现有虚拟环境并重新创建"""
+def get_site_packages(venv_path):
+    """获取虚拟环境的site-packages目录（只检查文件，不启动子进程）"""
+    if os.name == 'nt':
+        path = os.path.join(venv_path, 'Lib', 'site-packages')
+        return path if os.path.isdir(path) else None
+    matches = sorted(glob.glob(os.path.join(venv_path, 'lib', 'python*', 'site-packages')))
+    return matches[-1] if matches else None
+
+def normalize_name(name):
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+def read_dist_metadata(dist_info_path):
+    """从METADATA读取包名和版本"""
+    name = version = None
+    with open(os.path.join(dist_info_path, 'METADATA'), 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if not line.strip():
+                break  # 头部结束
+            if line.startswith('Name:'):
+                name = line.split(':', 1)[1].strip()
+            elif line.startswith('Version:'):
+                version = line.split(':', 1)[1].strip()
+    return name, version
+
+def snapshot_installed(venv_path):
+    """
+    记录虚拟环境中已安装的分发包（只读dist-info，不启动子进程）
+    
+    Returns:
+        [{'name', 'version', 'dist_info', 'editable'}, ...]
+    """
+    site_packages = get_site_packages(venv_path)
+    if not site_packages:
+        return []
+    
+    packages = []
+    for entry in sorted(os.listdir(site_packages)):
+        dist_info = os.path.join(site_packages, entry)
+        if not entry.endswith('.dist-info') or not os.path.isfile(os.path.join(dist_info, 'METADATA')):
+            continue
+        name, version = read_dist_metadata(dist_info)
+        if not name or not version:
+            continue
+        editable = False
+        direct_url = os.path.join(dist_info, 'direct_url.json')
+        if os.path.isfile(direct_url):
+            try:
+                with open(direct_url, 'r', encoding='utf-8') as f:
+                    editable = json.load(f).get('dir_info', {}).get('editable', False)
+            except (OSError, ValueError):
+                pass
+        packages.append({'name': name, 'version': version, 'dist_info': dist_info, 'editable': editable})
+    return packages
+
+def normalize_version(version):
+    """版本号的简单规范化（忽略大小写,本地版本中的 - _ 等同于 .）,用于比较wheel文件名和已安装的版本"""
+    public, sep, local = version.strip().lower().partition('+')
+    return public + sep + re.sub(r'[-_]', '.', local)
+
+def find_cached_wheel(wheelhouse, name, version):
+    """在本地wheel缓存中查找指定包名和版本的wheel（文件名中的版本按pip的方式还原 _ -> -）"""
+    if not os.path.isdir(wheelhouse):
+        return None
+    target = normalize_name(name)
+    target_version = normalize_version(version)
+    for filename in os.listdir(wheelhouse):
+        if not filename.endswith('.whl'):
+            continue
+        parts = filename[:-4].split('-')
+        if (len(parts) >= 5 and normalize_name(parts[0]) == target
+                and normalize_version(parts[1].replace('_', '-')) == target_version):
+            return os.path.join(wheelhouse, filename)
+    return None
+
+def _record_hash(data):
+    digest = hashlib.sha256(data).digest()
+    return 'sha256=' + base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+def _wheel_tag(dist_info):
+    """从WHEEL文件的Tag字段生成wheel文件名中的标签（多个tag合并为压缩形式）"""
+    tags = []
+    wheel_file = os.path.join(dist_info, 'WHEEL')
+    if os.path.isfile(wheel_file):
+        with open(wheel_file, 'r', encoding='utf-8') as f:
+            tags = [line.split(':', 1)[1].strip() for line in f if line.startswith('Tag:')]
+    if not tags:
+        return 'py3-none-any'
+    pythons, abis, platforms = [], [], []
+    for tag in tags:
+        py, abi, plat = tag.split('-', 2)
+        for value, values in ((py, pythons), (abi, abis), (plat, platforms)):
+            if value not in values:
+                values.append(value)
+    return f"{'.'.join(pythons)}-{'.'.join(abis)}-{'.'.join(platforms)}"
+
+def build_wheel_from_installed(package, wheelhouse=WHEELHOUSE_DIR):
+    """
+    用已安装的文件重新打包wheel（按RECORD收集文件，重新生成RECORD）
+    
+    site-packages之外的文件（如非entry_points的脚本、data文件）无法还原，会被跳过，
+    entry_points中的命令会由pip安装时重新生成
+    
+    Returns:
+        (ok, wheel_path 或 错误信息)
+    """
+    dist_info = package['dist_info']
+    site_packages = os.path.dirname(dist_info)
+    dist_info_name = os.path.basename(dist_info)
+    record_path = os.path.join(dist_info, 'RECORD')
+    if not os.path.isfile(record_path):
+        return False, f"{package['name']} 缺少RECORD，无法重新打包"
+    
+    # 版本中只转义 -（本地版本的 + 要保留,否则pip无法解析文件名）
+    name = re.sub(r'[^\w\d.]+', '_', package['name'])
+    version = package['version'].replace('-', '_')
+    filename = f"{name}-{version}-{_wheel_tag(dist_info)}.whl"
+    wheel_path = os.path.join(wheelhouse, filename)
+    tmp_path = wheel_path + '.part'
+    os.makedirs(wheelhouse, exist_ok=True)
+    
+    with open(record_path, 'r', encoding='utf-8', newline='') as f:
+        paths = [row[0].replace('\\', '/') for row in csv.reader(f) if row]
+    
+    records = []
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for path in paths:
+                if path.startswith('../') or path.startswith('/') or '__pycache__/' in path or path.endswith('.pyc'):
+                    continue
+                top, _, rest = path.partition('/')
+                if top == dist_info_name and rest in INSTALL_ONLY_FILES:
+                    continue
+                with open(os.path.join(site_packages, path), 'rb') as src:
+                    data = src.read()
+                zf.writestr(path, data)
+                records.append(f'{path},{_record_hash(data)},{len(data)}')
+            records.append(f'{dist_info_name}/RECORD,,')
+            zf.writestr(f'{dist_info_name}/RECORD', '\n'.join(records) + '\n')
+        os.replace(tmp_path, wheel_path)
+    except OSError as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False, f"{package['name']} 重新打包失败: {e}"
+    return True, wheel_path
+
+def cache_installed_wheels(packages, wheelhouse=WHEELHOUSE_DIR, repack_dir=REPACKED_WHEEL_DIR):
+    """
+    确保每个包在wheel缓存中有对应版本的wheel，wheelhouse中没有时重新打包到repack_dir
+    
+    Returns:
+        (cached, failed) 可离线恢复的包列表（wheel_dir为wheel所在目录）、无法恢复的 (包, 原因) 列表
+    """
+    cached = []
+    failed = []
+    built = 0
+    for package in packages:
+        if package['editable']:
+            failed.append((package, '可编辑安装（-e）无法打包'))
+            continue
+        if find_cached_wheel(wheelhouse, package['name'], package['version']):
+            cached.append(dict(package, wheel_dir=wheelhouse))
+            continue
+        if find_cached_wheel(repack_dir, package['name'], package['version']):
+            cached.append(dict(package, wheel_dir=repack_dir))
+            continue
+        ok, result = build_wheel_from_installed(package, repack_dir)
+        if ok:
+            built += 1
+            cached.append(dict(package, wheel_dir=repack_dir))
+        else:
+            failed.append((package, result))
+    if built:
+        print(f'已用已安装文件重新打包 {built} 个wheel到 {repack_dir}')
+    return cached, failed
+
+def _pip_install_offline(python_path, wheel_dir, reqs):
+    """
+    Returns:
+        (ok, 错误信息)
+    """
+    cmd = [python_path, '-m', 'pip', 'install', '--no-index', '--find-links', wheel_dir,
+           '--no-deps', '--disable-pip-version-check'] + reqs
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode == 0:
+        return True, ''
+    lines = [line for line in result.stderr.decode('utf-8', errors='ignore').splitlines() if line.strip()]
+    return False, lines[-1].strip() if lines else f'pip退出码 {result.returncode}'
+
+def restore_packages(venv_path, packages, wheelhouse=WHEELHOUSE_DIR):
+    """
+    从本地wheel缓存离线安装完全相同版本的包（按包的wheel_dir分组，每组只用自己的目录）
+    
+    一组安装失败时逐个重试，个别包的问题不影响同组的其他包
+    
+    Returns:
+        (restored, failed) 已恢复的包列表、未能恢复的 (包, 原因) 列表
+    """
+    if not packages:
+        return [], []
+    python_path = os.path.join(get_scripts_dir(venv_path), 'python.exe' if os.name == 'nt' else 'python')
+    groups = {}
+    for p in packages:
+        groups.setdefault(p.get('wheel_dir', wheelhouse), []).append(p)
+    restored, failed = [], []
+    for wheel_dir, group in groups.items():
+        ok, _ = _pip_install_offline(python_path, wheel_dir, [f"{p['name']}=={p['version']}" for p in group])
+        if ok:
+            restored.extend(group)
+            continue
+        for package in group:
+            ok, error = _pip_install_offline(python_path, wheel_dir, [f"{package['name']}=={package['version']}"])
+            if ok:
+                restored.append(package)
+            else:
+                failed.append((package, f'离线安装失败: {error}'))
+    return restored, failed
+
+def get_requirements_hash(req_file=REQUIREMENTS_FILE):
+    """requirements文件的sha256（文件不存在时返回'none'）"""
+    if not os.path.isfile(req_file):
+        return 'none'
+    with open(req_file, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def get_snapshot_key(implementation, version, req_hash):
+    """快照键：解释器实现+完整版本+平台+requirements哈希"""
+    version = '.'.join(version.split('.')[:3])
+    return f"{implementation.lower()}-{version}-{sys.platform}-{platform.machine().lower()}-{req_hash[:16]}"
+
+def get_snapshot_dir(key, cache_dir=None):
+    return os.path.join(cache_dir or os.path.join(get_cache_root(), SNAPSHOT_DIR_NAME), key)
+
+def list_venv_entries(venv_path):
+    """
+    列出venv中的目录和文件（符号链接按文件处理，不跟随）
+    
+    Returns:
+        (dirs, files)，files为 [(相对路径, 大小), ...]
+    """
+    dirs, files = [], []
+    for root, dirnames, filenames in os.walk(venv_path):
+        rel_root = os.path.relpath(root, venv_path)
+        for name in list(dirnames):
+            if os.path.islink(os.path.join(root, name)):
+                # 如lib64 -> lib，按链接打包，不进入
+                dirnames.remove(name)
+                filenames.append(name)
+            else:
+                dirs.append(os.path.normpath(os.path.join(rel_root, name)))
+        for name in filenames:
+            path = os.path.join(root, name)
+            size = 0 if os.path.islink(path) else os.path.getsize(path)
+            files.append((os.path.normpath(os.path.join(rel_root, name)), size))
+    return dirs, files
+
+def split_shards(files, count):
+    """按文件大小贪心分配到count个分片，使各分片大小接近"""
+    shards = [[] for _ in range(max(1, count))]
+    sizes = [0] * len(shards)
+    for rel_path, size in sorted(files, key=lambda item: item[1], reverse=True):
+        i = sizes.index(min(sizes))
+        shards[i].append(rel_path)
+        sizes[i] += size
+    return [shard for shard in shards if shard]
+
+def _write_snapshot_part(venv_path, rel_paths, part_path):
+    """流式写出一个分片：tar直接写入gzip流，不生成中间文件"""
+    with gzip.open(part_path, 'wb', compresslevel=SNAPSHOT_COMPRESS_LEVEL) as gz:
+        with tarfile.open(fileobj=gz, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+            for rel_path in rel_paths:
+                tar.add(os.path.join(venv_path, rel_path), arcname=rel_path.replace(os.sep, '/'), recursive=False)
+    return os.path.getsize(part_path)
+
+def snapshot_venv(venv_path=VENV_PATH, req_file=REQUIREMENTS_FILE, cache_dir=None, workers=None):
+    """
+    把venv压缩保存为快照（键由pyvenv.cfg中的解释器版本和requirements哈希决定）
+    
+    Returns:
+        (ok, msg)
+    """
+    if not venv_exists(venv_path):
+        return False, f'虚拟环境不存在: {venv_path}'
+    tmp_dir = None
+    try:
+        cfg = read_pyvenv_cfg(venv_path)
+        version = cfg.get('version_info') or cfg.get('version')
+        if not version:
+            return False, 'pyvenv.cfg中没有版本信息，无法生成快照'
+        key = get_snapshot_key(cfg.get('implementation', sys.implementation.name), version,
+                               get_requirements_hash(req_file))
+        snapshot_dir = get_snapshot_dir(key, cache_dir)
+        
+        start = time.time()
+        dirs, files = list_venv_entries(venv_path)
+        shards = split_shards(files, workers or os.cpu_count() or 1)
+        
+        # 先写到临时目录，全部成功后再替换，避免留下不完整的快照
+        tmp_dir = f'{snapshot_dir}.tmp-{os.getpid()}'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        parts = [f'part-{i}.tar.gz' for i in range(len(shards))]
+        with ThreadPoolExecutor(max_workers=len(shards) or 1) as executor:
+            sizes = list(executor.map(
+                lambda item: _write_snapshot_part(venv_path, item[0], os.path.join(tmp_dir, item[1])),
+                zip(shards, parts)))
+        
+        meta = {
+            'key': key,
+            'source_path': os.path.abspath(venv_path),
+            'implementation': cfg.get('implementation', sys.implementation.name),
+            'version': version,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'dirs': [d.replace(os.sep, '/') for d in dirs],
+            'parts': parts,
+            'files': len(files),
+            'size': sum(size for _, size in files),
+        }
+        with open(os.path.join(tmp_dir, SNAPSHOT_META), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        
+        if os.path.exists(snapshot_dir):
+            shutil.rmtree(snapshot_dir)
+        os.replace(tmp_dir, snapshot_dir)
+        
+        return True, (
+            f'快照已保存: {snapshot_dir}\n'
+            f'{len(files)} 个文件, {meta["size"] / 1024 / 1024:.1f} MB -> {sum(sizes) / 1024 / 1024:.1f} MB '
+            f'({len(parts)} 个分片, 用时 {time.time() - start:.2f} 秒)'
+        )
+    except Exception as e:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False, f'快照保存失败: {e}'
+
+def _extract_snapshot_part(part_path, dest):
+    """流式解压一个分片（目录已预先创建，各分片之间不会冲突）"""
+    # tar过滤器允许venv中指向基础解释器的绝对路径符号链接，但不允许写到目标目录之外
+    extract_args = {'filter': 'tar'} if hasattr(tarfile, 'tar_filter') else {}
+    with tarfile.open(part_path, mode='r|gz') as tar:
+        tar.extractall(dest, **extract_args)
+
+def restore_venv(venv_path=VENV_PATH, req_file=REQUIREMENTS_FILE, cache_dir=None, python=None, workers=None):
+    """
+    从快照恢复venv（键由当前解释器版本和requirements哈希决定）
+    
+    Returns:
+        (ok, msg)
+    """
+    if is_venv_active() and os.path.normcase(os.path.abspath(venv_path)) == os.path.normcase(os.path.abspath(sys.prefix)):
+        return False, '错误：无法替换当前正在使用的虚拟环境，请先运行 deactivate'
+    
+    python = python or get_real_python()
+    info = get_python_info(python)
+    key = get_snapshot_key(info['implementation'], info['version'], get_requirements_hash(req_file))
+    snapshot_dir = get_snapshot_dir(key, cache_dir)
+    meta_path = os.path.join(snapshot_dir, SNAPSHOT_META)
+    if not os.path.isfile(meta_path):
+        return False, f'没有匹配的快照: {key}'
+    
+    tmp_path = f'{os.path.abspath(venv_path)}.restoring'
+    try:
+        start = time.time()
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for rel_dir in meta['dirs']:
+            os.makedirs(os.path.join(tmp_path, rel_dir), exist_ok=True)
+        
+        parts = [os.path.join(snapshot_dir, part) for part in meta['parts']]
+        with ThreadPoolExecutor(max_workers=min(len(parts), workers or os.cpu_count() or 1) or 1) as executor:
+            list(executor.map(lambda part: _extract_snapshot_part(part, tmp_path), parts))
+        extract_time = time.time() - start
+        
+        # 改写绝对路径：快照中记录的是原venv路径，恢复后直接改成最终路径
+        rewritten = rewrite_venv_paths(tmp_path, meta['source_path'], venv_path)
+        
+        # 不同机器上基础解释器的位置可能不同，home失效时重新指向本机同版本解释器
+        messages = []
+        issues = check_venv_health(tmp_path)
+        if any(level == 'error' for _, level, _ in issues):
+            ok, repair_msg = repair_venv(tmp_path, issues)
+            messages.append(repair_msg)
+            if not ok:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                return False, '快照恢复后的环境不可用:\n' + '\n'.join(messages)
+        
+        # 整体替换，旧venv先改名再删除
+        if os.path.exists(venv_path):
+            old_path = f'{os.path.abspath(venv_path)}.old'
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.replace(venv_path, old_path)
+            os.replace(tmp_path, venv_path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.replace(tmp_path, venv_path)
+        
+        messages.insert(0, (
+            f'已从快照恢复: {venv_path} <- {key}\n'
+            f"{meta['files']} 个文件, 解压 {extract_time:.2f} 秒, 改写 {rewritten} 个文件, "
+            f'总用时 {time.time() - start:.2f} 秒'
+        ))
+        return True, '\n'.join(messages)
+    except Exception as e:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return False, f'快照恢复失败: {e}'
+
+def _hash_file(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def reflink_file(src, dst):
+    """写时复制克隆文件（只支持Linux的FICLONE），成功返回True"""
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copymode(src, dst)
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+def _replace_with_store(path, store_path, expected, prefer_reflink=False):
+    """
+    把path替换为指向store_path的硬链接（不支持硬链接时尝试reflink）
+    
+    prefer_reflink为True时（存储副本本身就是reflink出来的）优先reflink，
+    各文件的inode互相独立，原地修改其中一个不会影响其他venv和存储副本
+    
+    Returns:
+        'link'、'reflink' 或 None（跳过）
+    """
+    st = os.stat(path)
+    # 哈希之后文件被修改过就跳过
+    if (st.st_size, st.st_mtime_ns) != expected:
+        return None
+    tmp_path = f'{path}.dedupe-{os.getpid()}'
+    if prefer_reflink and reflink_file(store_path, tmp_path):
+        method = 'reflink'
+    else:
+        try:
+            os.link(store_path, tmp_path)
+            method = 'link'
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EMLINK, errno.EPERM, errno.ENOTSUP, errno.EACCES):
+                raise
+            if not reflink_file(store_path, tmp_path):
+                return None
+            method = 'reflink'
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+    return method
+
+def _store_matches(store_path, size, digest):
+    """
+    存储副本的内容是否仍然是digest
+    
+    硬链接的存储副本与venv中的文件共用inode，venv中的文件被原地修改时存储副本也会跟着变，使用前必须重新校验
+    """
+    try:
+        if os.stat(store_path).st_size != size:
+            return False
+        return _hash_file(store_path) == digest
+    except OSError:
+        return False
+
+def dedupe_venvs(venv_paths, store_dir=None, min_size=DEDUPE_MIN_SIZE, workers=None):
+    """
+    多个venv之间相同内容的文件改为指向存储目录中同一副本的硬链接
+    
+    Returns:
+        (ok, msg)
+    """
+    store_dir = store_dir or os.path.join(get_cache_root(), DEDUPE_STORE_NAME)
+    start = time.time()
+    
+    # 1. 收集文件，按(大小, 权限)分组，同一inode只算一个
+    groups = {}
+    for venv_path in venv_paths:
+        site_packages = get_site_packages(venv_path)
+        if not site_packages:
+            return False, f'找不到site-packages: {venv_path}'
+        for root, _, filenames in os.walk(site_packages):
+            for name in filenames:
+                path = os.path.join(root, name)
+                st = os.lstat(path)
+                if not stat.S_ISREG(st.st_mode) or st.st_size < min_size:
+                    continue
+                group = groups.setdefault((st.st_size, stat.S_IMODE(st.st_mode)), {})
+                group.setdefault((st.st_dev, st.st_ino), []).append((path, st))
+    
+    # 只有多个不同inode的组才可能有重复
+    candidates = [(key, inodes) for key, inodes in groups.items() if len(inodes) > 1]
+    to_hash = [paths[0] for _, inodes in candidates for paths in inodes.values()]
+    
+    # 2. 多线程计算sha256（hashlib计算时会释放GIL）
+    hash_start = time.time()
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 2)) as executor:
+        digests = dict(zip((path for path, _ in to_hash), executor.map(lambda item: _hash_file(item[0]), to_hash)))
+    hash_time = time.time() - hash_start
+    hashed_bytes = sum(st.st_size for _, st in to_hash)
+    
+    # 3. 相同内容的文件替换为存储副本的硬链接
+    linked = reflinked = skipped = stale = 0
+    reclaimed = 0
+    for (size, mode), inodes in candidates:
+        by_digest = {}
+        for paths in inodes.values():
+            by_digest.setdefault(digests[paths[0][0]], []).append(paths)
+        for digest, same in by_digest.items():
+            if len(same) < 2:
+                continue
+            store_path = os.path.join(store_dir, digest[:2], f'{digest}_{mode:o}')
+            if os.path.exists(store_path) and not _store_matches(store_path, size, digest):
+                # 存储副本已被改动（与它共用inode的某个venv文件被原地写入），丢弃后重新建立
+                os.remove(store_path)
+                stale += 1
+            if not os.path.exists(store_path):
+                os.makedirs(os.path.dirname(store_path), exist_ok=True)
+                source_path, source_st = same[0][0]
+                # 支持reflink时存储副本是独立的写时复制副本，否则是硬链接
+                if not reflink_file(source_path, store_path):
+                    try:
+                        os.link(source_path, store_path)
+                    except OSError:
+                        # 存储目录与venv不在同一分区时，以第一个文件为准直接互相链接
+                        store_path = source_path
+                # 哈希之后源文件被修改过，内容不再是digest，这一组跳过
+                current = os.stat(store_path)
+                if (current.st_size, current.st_mtime_ns) != (source_st.st_size, source_st.st_mtime_ns):
+                    if store_path != source_path:
+                        os.remove(store_path)
+                    skipped += sum(len(paths) for paths in same)
+                    continue
+            store_st = os.stat(store_path)
+            prefer_reflink = store_st.st_nlink == 1 and store_path != same[0][0][0]
+            for paths in same:
+                replaced = 0
+                for path, st in paths:
+                    if (st.st_dev, st.st_ino) == (store_st.st_dev, store_st.st_ino):
+                        continue
+                    try:
+                        method = _replace_with_store(path, store_path, (st.st_size, st.st_mtime_ns),
+                                                     prefer_reflink)
+                    except OSError:
+                        method = None
+                    if method == 'link':
+                        linked += 1
+                        replaced += 1
+                    elif method == 'reflink':
+                        reflinked += 1
+                        replaced += 1
+                    else:
+                        skipped += 1
+                # inode的所有链接都被替换后，原来的数据块才真正释放
+                if paths and replaced == paths[0][1].st_nlink:
+                    reclaimed += size
+    
+    total_time = time.time() - start
+    speed = hashed_bytes / 1024 / 1024 / hash_time if hash_time > 0 else 0
+    msg = (
+        f'扫描 {len(venv_paths)} 个venv, 哈希 {len(to_hash)} 个文件 '
+        f'({hashed_bytes / 1024 / 1024:.1f} MB, {speed:.1f} MB/s)\n'
+        f'硬链接 {linked} 个, reflink {reflinked} 个, 跳过 {skipped} 个'
+        + (f', 丢弃已被改动的存储副本 {stale} 个' if stale else '') + '\n'
+        f'回收空间: {reclaimed / 1024 / 1024:.1f} MB（总用时 {total_time:.2f} 秒）\n'
+        f'存储目录: {store_dir}'
+    )
+    return True, msg
+
+def rebuild_venv(venv_path=VENV_PATH, use_template=True, refresh_template=False, preserve=True,
+                 wheelhouse=WHEELHOUSE_DIR, repack_dir=REPACKED_WHEEL_DIR):
+    """删除现有虚拟环境并重新创建（preserve=True时保留已安装的包）"""
     # 检查是否在虚拟环境中运行
     if is_venv_active():
         venv_path_abs = os.path.abspath(venv_path)
@@ -72,6 +1391,14 @@ def rebuild_venv(venv_path=VENV_PATH):
             )
     
     try:
+        # 删除前记录已安装的包，并确保本地有对应的wheel
+        cached, failed = [], []
+        if preserve and venv_exists(venv_path):
+            packages = [p for p in snapshot_installed(venv_path) if normalize_name(p['name']) not in SEED_PACKAGES]
+            if packages:
+                print(f'正在记录已安装的包: {len(packages)} 个')
+                cached, failed = cache_installed_wheels(packages, wheelhouse, repack_dir)
+        
         # 如果虚拟环境存在，先删除
         if os.path.exists(venv_path):
             print(f'正在删除现有虚拟环境: {venv_path}')
@@ -80,8 +1407,21 @@ def rebuild_venv(venv_path=VENV_PATH):
         
         # 重新创建虚拟环境
         print(f'正在创建新的虚拟环境: {venv_path}')
-        subprocess.check_call([get_real_python(), '-m', 'virtualenv', venv_path])
-        return True, '虚拟环境重建成功'
+        ok, msg = make_venv(venv_path, use_template=use_template, refresh_template=refresh_template)
+        msg = msg.replace('创建成功', '重建成功')
+        
+        # 离线恢复原有的包
+        if cached:
+            start = time.time()
+            restored, restore_failed = restore_packages(venv_path, cached, wheelhouse)
+            failed.extend(restore_failed)
+            if restored:
+                msg += f'\n已离线恢复 {len(restored)} 个包（用时 {time.time() - start:.2f} 秒）'
+        if failed:
+            msg += f'\n以下 {len(failed)} 个包未能恢复，请用2_install_import.py重新安装:'
+            for package, reason in failed:
+                msg += f"\n  - {package['name']}=={package['version']}: {reason}"
+        return True, msg
     except PermissionError as e:
         return False, (
             f'权限错误：{e}\n'
@@ -100,6 +1440,23 @@ if __name__ == '__main__':
     parser.add_argument('--venv', type=str, default=VENV_PATH, help='虚拟环境目录名')
     parser.add_argument('--check', action='store_true', help='仅检测虚拟环境是否存在')
     parser.add_argument('--rebuild', action='store_true', help='重新生成虚拟环境（删除现有环境并重新创建）')
+    parser.add_argument('--no-template', action='store_true', help='不使用模板克隆，直接用virtualenv创建')
+    parser.add_argument('--refresh-template', action='store_true', help='重新生成当前解释器的venv模板')
+    parser.add_argument('--no-preserve', action='store_true', help='重建时不保留已安装的包')
+    parser.add_argument('--wheelhouse', type=str, default=WHEELHOUSE_DIR, help=f'本地wheel缓存目录（默认: {WHEELHOUSE_DIR}）')
+    parser.add_argument('--matrix', nargs='*', default=None, metavar='PYTHON',
+                        help='矩阵模式：为多个解释器（路径或版本号，留空则自动发现）并发创建 <venv>-<版本>')
+    parser.add_argument('--workers', type=int, default=None, help='并发数（矩阵模式默认每个解释器一个线程，快照默认CPU核数）')
+    parser.add_argument('--health', action='store_true', help='快速健康检查（不启动子进程）')
+    parser.add_argument('--repair', action='store_true', help='健康检查并只修复有问题的部分')
+    parser.add_argument('--snapshot', action='store_true', help='把虚拟环境压缩保存到快照缓存')
+    parser.add_argument('--restore', action='store_true', help='从快照缓存恢复虚拟环境')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help=f'快照缓存目录（默认: 用户缓存目录下的{SNAPSHOT_DIR_NAME}）')
+    parser.add_argument('--dedupe', nargs='+', default=None, metavar='VENV', help='对多个venv中相同的文件做硬链接去重')
+    parser.add_argument('--store', type=str, default=None, help=f'去重存储目录（默认: 用户缓存目录下的{DEDUPE_STORE_NAME}）')
+    parser.add_argument('--min-size', type=int, default=DEDUPE_MIN_SIZE, help=f'参与去重的最小文件大小（默认: {DEDUPE_MIN_SIZE}字节）')
+    parser.add_argument('--req', type=str, default=REQUIREMENTS_FILE, help=f'用于生成快照键的requirements文件（默认: {REQUIREMENTS_FILE}）')
     args = parser.parse_args()
     
      # 确保 virtualenv 已安装
@@ -110,11 +1467,47 @@ if __name__ == '__main__':
     if msg:
         print(msg)
 
-    if args.check:
+    if args.matrix is not None:
+        results = create_venv_matrix(args.matrix, args.venv, not args.no_template, args.workers)
+        if not results:
+            print('错误: 未找到可用的Python解释器')
+            sys.exit(1)
+        print_matrix_results(results)
+        if not all(r['ok'] for r in results):
+            sys.exit(1)
+    elif args.dedupe:
+        ok, msg = dedupe_venvs(args.dedupe, args.store, args.min_size, args.workers)
+        print(msg)
+        if not ok:
+            sys.exit(1)
+    elif args.check:
         print('存在' if venv_exists(args.venv) else '不存在')
+    elif args.snapshot or args.restore:
+        if args.snapshot:
+            ok, msg = snapshot_venv(args.venv, args.req, args.cache_dir, args.workers)
+        else:
+            ok, msg = restore_venv(args.venv, args.req, args.cache_dir, workers=args.workers)
+        print(msg)
+        if not ok:
+            sys.exit(1)
+    elif args.health or args.repair:
+        issues = check_venv_health(args.venv)
+        if not issues:
+            print('✓ 虚拟环境健康')
+        for _, level, message in issues:
+            print(f"{'错误' if level == 'error' else '警告'}: {message}")
+        if args.repair and issues:
+            ok, msg = repair_venv(args.venv, issues)
+            print(msg)
+            if not ok:
+                sys.exit(1)
+        elif any(level == 'error' for _, level, _ in issues):
+            sys.exit(1)
     elif args.rebuild:
-        ok, msg = rebuild_venv(args.venv)
+        ok, msg = rebuild_venv(args.venv, not args.no_template, args.refresh_template,
+                               not args.no_preserve, args.wheelhouse)
         print(msg)
     else:
-        ok, msg = create_venv(args.venv)
+        ok, msg = create_venv(args.venv, use_template=not args.no_template,
+                              refresh_template=args.refresh_template)
         print(msg) 
\ No newline at end of file
@@ -44,7 +44,7 @@ DEFAULT_CONFIG = {
         "docx": "python-docx",
     },
     "import_ignore_folder": [".misc", ".venv", "venv", "virtualenv", "__pycache__", ".git", ".build_output_dir", "dist", "build"],
-    "import_ignore_file": ["setup.py", "__init__.py", "0_venv.py", "1_requirements.py", "2_install_import.py", "mypackager.py"],
+    "import_ignore_file": ["setup.py", "__init__.py", "0_venv.py", "1_requirements.py", "2_install_import.py", "bootstrap.py", "mypackager.py"],
     "import_src": []
 }
 
@@ -5,6 +5,8 @@
     python myscript/2_install_import.py              # 默认快速安装（跳过已安装）
     python myscript/2_install_import.py --full       # 完整安装（强制重装）
     python myscript/2_install_import.py --source 1   # 使用清华源
+    python myscript/2_install_import.py bundle       # 导出离线安装包（所有wheel + manifest）
+    python myscript/2_install_import.py install --from-bundle requirements_bundle.tar  # 从离线安装包安装（无需联网）
 
 逻辑：
     1. 确保必要头文件
@@ -16,12 +18,19 @@
           1 = 清华源（默认）
           2 = 阿里源
           3 = 中科大源
+          4 = 本地wheel源（wheel_index_server.py 启动的局域网源,可改成服务器的IP）
         - pip_source_list: 对象,pip源列表,可自定义添加
           格式: {"0": {"name": "源名称", "url": "源URL"}, ...}
     4. 读取配置文件
     5. 如果requirements里面有提供版本,按照版本安装
     6. 支持快速模式（跳过已安装）和完整模式（强制重装）
     7. 记录失败日志,包含依赖来源信息
+    8. bundle命令: 用pip wheel生成requirements（含传递依赖）的所有wheel,
+       与manifest.json一起写入单个tar包,wheel同时缓存到 .misc/.wheelhouse
+    9. install --from-bundle: 流式读取tar包,边读边校验sha256边写入wheelhouse,
+       不需要先解出完整副本,然后 --no-index 离线安装
+    10. 安装后预编译字节码: pip安装时不再逐个文件串行编译（--no-compile）,
+        安装完成后只对本次新装/变化的分发包用 compileall -j N 多进程编译
 """
 
 import os
@@ -29,12 +38,26 @@ import sys
 import json
 import subprocess
 import re
+import csv
+import glob
 import argparse
+import hashlib
+import shutil
+import tarfile
+import tempfile
+import io
+import time
 
 # 配置文件路径
 CONFIG_FILE = '.config/pyenv.json'
 SOURCES_FILE = '.config/py_requirements_sources.json'
 VENV_PATH = '.venv'
+# 本地wheel缓存目录（离线安装包解出的wheel也放在这里）
+WHEELHOUSE_DIR = '.misc/.wheelhouse'
+# 离线安装包默认文件名（wheel本身已压缩,tar不再额外压缩）
+BUNDLE_FILE = 'requirements_bundle.tar'
+BUNDLE_MANIFEST = 'manifest.json'
+BUNDLE_WHEEL_DIR = 'wheels'
 
 # 默认配置（只添加pip相关配置，其他的由1_requirements.py管理）
 DEFAULT_CONFIG_ADDON = {
@@ -43,7 +66,8 @@ DEFAULT_CONFIG_ADDON = {
         "0": {"name": "默认源", "url": None},
         "1": {"name": "清华源", "url": "https://pypi.tuna.tsinghua.edu.cn/simple"},
         "2": {"name": "阿里源", "url": "https://mirrors.aliyun.com/pypi/simple/"},
-        "3": {"name": "中科大源", "url": "https://pypi.mirrors.ustc.edu.cn/simple/"}
+        "3": {"name": "中科大源", "url": "https://pypi.mirrors.ustc.edu.cn/simple/"},
+        "4": {"name": "本地wheel源", "url": "http://127.0.0.1:8765/simple/"}
     }
 }
 
@@ -75,21 +99,33 @@ def load_config(config_path=None):
         with open(config_path, 'r', encoding='utf-8') as f:
             config = json.load(f)
     
-    # 检查并补充pip相关参数
-    updated = False
-    for key, default_value in DEFAULT_CONFIG_ADDON.items():
-        if key not in config:
-            config[key] = default_value
-            updated = True
-    
-    # 如果有更新,写回配置文件
-    if updated:
+    # 检查并补充pip相关参数,如果有更新,写回配置文件
+    if merge_config_addon(config):
         with open(config_path, 'w', encoding='utf-8') as f:
             json.dump(config, f, ensure_ascii=False, indent=4)
         print(f'已更新配置文件: {config_path}')
     
     return config
 
+def merge_config_addon(config):
+    """补充缺少的pip相关参数,pip_source_list中缺少的源编号也补充（已有的源不修改）
+    
+    Returns:
+        是否有更新
+    """
+    updated = False
+    for key, default_value in DEFAULT_CONFIG_ADDON.items():
+        if key not in config:
+            config[key] = json.loads(json.dumps(default_value))
+            updated = True
+    sources = config.get('pip_source_list')
+    if isinstance(sources, dict):
+        for key, default_value in DEFAULT_CONFIG_ADDON['pip_source_list'].items():
+            if key not in sources:
+                sources[key] = dict(default_value)
+                updated = True
+    return updated
+
 def get_pip_source_url(config, source_index):
     """从配置中获取pip源URL
     
@@ -109,6 +145,16 @@ def get_pip_source_url(config, source_index):
     
     return None, None
 
+def get_pip_source_args(pip_source):
+    """生成pip源参数,http源（如本地wheel源）需要额外信任该主机"""
+    if not pip_source:
+        return []
+    args = ['-i', pip_source]
+    if pip_source.startswith('http://'):
+        host = pip_source[len('http://'):].split('/', 1)[0].split(':', 1)[0]
+        args += ['--trusted-host', host]
+    return args
+
 def extract_pkg_name(pkg_line):
     """提取包名（去掉版本号）
     支持: pyinstaller==6.9.0, pyinstaller>=6.9.0, pyinstaller<=6.9.0, pyinstaller~=6.9.0, pyinstaller
@@ -182,28 +228,294 @@ def get_python_path(venv_path):
     )
     return python_path
 
+def is_pip_healthy(venv_path):
+    """只检查文件判断pip是否完整（pip脚本、pip包和dist-info的RECORD）,不启动子进程"""
+    if not os.path.isfile(get_pip_path(venv_path)):
+        return False
+    site_packages = get_site_packages(venv_path)
+    if not site_packages or not os.path.isfile(os.path.join(site_packages, 'pip', '__init__.py')):
+        return False
+    return any(os.path.isfile(os.path.join(path, 'RECORD'))
+               for path in glob.glob(os.path.join(site_packages, 'pip-*.dist-info')))
+
 def ensure_pip(venv_path):
-    """确保pip存在,如果不存在尝试自动修复"""
+    """确保pip存在,如果不存在尝试离线修复（只用ensurepip自带的pip,不联网升级）"""
     pip_path = get_pip_path(venv_path)
     python_path = get_python_path(venv_path)
     
-    if os.path.isfile(pip_path):
+    if is_pip_healthy(venv_path):
         return True, pip_path
     
-    # pip不存在,尝试修复
+    # pip不存在或已损坏,尝试修复
     if os.path.isfile(python_path):
         try:
-            print('pip不存在,正在自动修复...')
-            subprocess.check_call([python_path, '-m', 'ensurepip'])
-            subprocess.check_call([python_path, '-m', 'pip', 'install', '--upgrade', 'pip'])
-            if os.path.isfile(pip_path):
+            print('pip不存在或已损坏,正在离线修复...')
+            # 清掉残留的pip文件,避免ensurepip装的版本与残留文件混在一起
+            site_packages = get_site_packages(venv_path)
+            if site_packages:
+                for path in [os.path.join(site_packages, 'pip')] + glob.glob(os.path.join(site_packages, 'pip-*.dist-info')):
+                    shutil.rmtree(path, ignore_errors=True)
+            subprocess.check_call([python_path, '-m', 'ensurepip', '--default-pip'])
+            if is_pip_healthy(venv_path):
                 return True, pip_path
         except Exception as e:
-            return False, f'pip自动修复失败: {e}'
+            return False, f'pip自动修复失败: {e}（可运行 0_venv.py --repair）'
     
     return False, f'未找到pip,请确认虚拟环境已创建: {venv_path}'
 
-def install_requirements(venv_path, req_file, log_file, pip_source=None, skip_installed=True):
+def get_site_packages(venv_path):
+    """获取虚拟环境的site-packages目录（只检查文件,不启动子进程）"""
+    if os.name == 'nt':
+        path = os.path.join(venv_path, 'Lib', 'site-packages')
+        return path if os.path.isdir(path) else None
+    matches = sorted(glob.glob(os.path.join(venv_path, 'lib', 'python*', 'site-packages')))
+    return matches[-1] if matches else None
+
+def snapshot_distributions(site_packages):
+    """记录已安装的分发包 {dist-info目录名: RECORD的mtime}"""
+    result = {}
+    if not site_packages or not os.path.isdir(site_packages):
+        return result
+    with os.scandir(site_packages) as it:
+        for entry in it:
+            if entry.is_dir() and entry.name.endswith('.dist-info'):
+                try:
+                    result[entry.name] = os.stat(os.path.join(entry.path, 'RECORD')).st_mtime_ns
+                except OSError:
+                    result[entry.name] = None
+    return result
+
+def get_changed_distributions(before, after):
+    """对比安装前后的快照,返回新装或重装过的dist-info目录名"""
+    return sorted(name for name, mtime in after.items() if before.get(name, -1) != mtime)
+
+def collect_compile_targets(site_packages, dist_infos):
+    """根据RECORD找出分发包的顶层包目录和单文件模块"""
+    targets = set()
+    for dist_info in dist_infos:
+        record_path = os.path.join(site_packages, dist_info, 'RECORD')
+        if not os.path.isfile(record_path):
+            continue
+        with open(record_path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.reader(f):
+                if not row or not row[0].endswith('.py'):
+                    continue
+                path = row[0].replace('\\', '/')
+                # 跳过site-packages之外的文件（如bin/Scripts下的脚本）
+                if path.startswith('../') or path.startswith('/'):
+                    continue
+                top = path.split('/', 1)[0]
+                if top.endswith('.dist-info') or top.endswith('.data') or top == '__pycache__':
+                    continue
+                target = os.path.join(site_packages, top)
+                if os.path.exists(target):
+                    targets.add(target)
+    return sorted(targets)
+
+def precompile_bytecode(venv_path, dist_infos, workers=0):
+    """
+    用虚拟环境的解释器并行预编译字节码
+    
+    Args:
+        venv_path: 虚拟环境路径
+        dist_infos: 需要编译的dist-info目录名列表（本次新装/变化的分发包）
+        workers: 进程数, 0表示使用全部CPU核心
+    
+    Returns:
+        (ok, msg)
+    """
+    if not dist_infos:
+        return True, '字节码预编译: 没有新安装或变化的分发包,跳过'
+    
+    site_packages = get_site_packages(venv_path)
+    if not site_packages:
+        return False, f'字节码预编译失败: 未找到site-packages: {venv_path}'
+    
+    targets = collect_compile_targets(site_packages, dist_infos)
+    if not targets:
+        return True, '字节码预编译: 没有需要编译的文件'
+    
+    # 目录由compileall内部的进程池并行编译,列表通过stdin传入,避免命令行过长
+    cmd = [get_python_path(venv_path), '-m', 'compileall', '-q', '-j', str(workers), '-i', '-']
+    start = time.time()
+    result = subprocess.run(
+        cmd,
+        input='\n'.join(targets),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        encoding='utf-8',
+        errors='replace'
+    )
+    elapsed = time.time() - start
+    
+    msg = f'字节码预编译完成: {len(dist_infos)} 个分发包, {len(targets)} 个顶层模块, 用时 {elapsed:.2f} 秒'
+    if result.returncode != 0:
+        # 个别文件语法不兼容（如包内的py2测试文件）不影响使用,只提示
+        lines = [line for line in result.stdout.splitlines() if line.strip()]
+        msg += f'\n  部分文件编译失败（{len(lines)} 行输出,通常可忽略）'
+    return True, msg
+
+def read_requirements(req_file):
+    """读取requirements.txt中的依赖列表（忽略空行和注释）"""
+    with open(req_file, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """计算文件的sha256"""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def build_bundle(venv_path, req_file, bundle_file, wheelhouse=WHEELHOUSE_DIR, pip_source=None):
+    """
+    生成离线安装包: requirements中所有依赖（含传递依赖）的wheel + manifest.json
+    
+    Args:
+        venv_path: 虚拟环境路径（使用其中的pip构建wheel）
+        req_file: requirements.txt路径
+        bundle_file: 输出的tar包路径
+        wheelhouse: 本地wheel缓存目录,已有的wheel直接复用,新构建的wheel也会放进去
+        pip_source: pip源URL
+    
+    Returns:
+        (ok, msg)
+    """
+    ok, result = ensure_pip(venv_path)
+    if not ok:
+        return False, result
+    pip_path = result
+    
+    if not os.path.isfile(req_file):
+        return False, f'未找到requirements.txt: {req_file}'
+    pkgs = read_requirements(req_file)
+    if not pkgs:
+        return False, '没有需要打包的依赖'
+    
+    os.makedirs(wheelhouse, exist_ok=True)
+    
+    # 先构建到临时目录,这样目录里恰好是本次依赖集合的wheel
+    work_dir = tempfile.mkdtemp(prefix='bundle-')
+    try:
+        print(f'正在构建 {len(pkgs)} 个依赖及其传递依赖的wheel...')
+        cmd = [pip_path, 'wheel', '-w', work_dir, '--find-links', wheelhouse, '-r', req_file]
+        cmd += get_pip_source_args(pip_source)
+        try:
+            subprocess.check_call(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError as e:
+            error_msg = e.stderr.decode('utf-8', errors='ignore') if e.stderr else str(e)
+            return False, f'构建wheel失败:\n{error_msg}'
+        
+        wheels = sorted(f for f in os.listdir(work_dir) if f.endswith('.whl'))
+        manifest = {
+            'format': 1,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'platform': sys.platform,
+            'requirements': pkgs,
+            'wheels': [],
+        }
+        for name in wheels:
+            wheel_path = os.path.join(work_dir, name)
+            manifest['wheels'].append({
+                'file': name,
+                'size': os.path.getsize(wheel_path),
+                'sha256': file_sha256(wheel_path),
+            })
+        
+        bundle_dir = os.path.dirname(bundle_file)
+        if bundle_dir:
+            os.makedirs(bundle_dir, exist_ok=True)
+        
+        # manifest必须放在第一个,流式解包时才能先拿到校验信息
+        with tarfile.open(bundle_file, 'w') as tar:
+            data = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+            info = tarfile.TarInfo(BUNDLE_MANIFEST)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+            for name in wheels:
+                tar.add(os.path.join(work_dir, name), arcname=f'{BUNDLE_WHEEL_DIR}/{name}')
+        
+        # 同步到本地wheel缓存
+        for name in wheels:
+            dest = os.path.join(wheelhouse, name)
+            if not os.path.exists(dest):
+                shutil.move(os.path.join(work_dir, name), dest)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    total_size = sum(w['size'] for w in manifest['wheels'])
+    return True, f'✓ 已生成离线安装包: {bundle_file} ({len(wheels)} 个wheel, {total_size / 1024 / 1024:.1f} MB)'
+
+def extract_bundle(bundle_file, wheelhouse=WHEELHOUSE_DIR):
+    """
+    流式解包离线安装包到wheelhouse
+    
+    逐个成员顺序读取,边写入边计算sha256,不需要先解出整个包的副本;
+    wheelhouse中已存在且校验一致的wheel直接跳过
+    
+    Returns:
+        (ok, msg, manifest)
+    """
+    if not os.path.isfile(bundle_file):
+        return False, f'未找到离线安装包: {bundle_file}', None
+    
+    os.makedirs(wheelhouse, exist_ok=True)
+    manifest = None
+    expected = {}
+    extracted = 0
+    reused = 0
+    
+    try:
+        with tarfile.open(bundle_file, 'r|*') as tar:
+            for member in tar:
+                if member.name == BUNDLE_MANIFEST:
+                    manifest = json.load(tar.extractfile(member))
+                    expected = {w['file']: w for w in manifest.get('wheels', [])}
+                    continue
+                if manifest is None:
+                    return False, f'离线安装包格式错误: {BUNDLE_MANIFEST} 不在包的开头', None
+                if not member.isfile():
+                    continue
+                # 只接受wheels/下的wheel文件名,防止路径穿越
+                name = os.path.basename(member.name)
+                if os.path.dirname(member.name) != BUNDLE_WHEEL_DIR or name not in expected:
+                    continue
+                
+                info = expected[name]
+                dest = os.path.join(wheelhouse, name)
+                if os.path.isfile(dest) and os.path.getsize(dest) == info['size'] \
+                        and file_sha256(dest) == info['sha256']:
+                    reused += 1
+                    continue
+                
+                src = tar.extractfile(member)
+                tmp_path = dest + '.part'
+                h = hashlib.sha256()
+                with open(tmp_path, 'wb') as out:
+                    for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                        h.update(chunk)
+                        out.write(chunk)
+                if h.hexdigest() != info['sha256']:
+                    os.remove(tmp_path)
+                    return False, f'校验失败: {name} 的sha256与manifest不一致', None
+                os.replace(tmp_path, dest)
+                extracted += 1
+    except (tarfile.TarError, OSError, ValueError) as e:
+        return False, f'读取离线安装包失败: {e}', None
+    
+    if manifest is None:
+        return False, f'离线安装包中缺少 {BUNDLE_MANIFEST}', None
+    
+    missing = [name for name in expected if not os.path.isfile(os.path.join(wheelhouse, name))]
+    if missing:
+        return False, f'离线安装包不完整,缺少: {", ".join(missing)}', None
+    
+    return True, f'已解包到 {wheelhouse}: 新增 {extracted} 个wheel, 复用 {reused} 个', manifest
+
+def install_requirements(venv_path, req_file, log_file, pip_source=None, skip_installed=True,
+                         find_links=None, pkgs=None, no_compile=False):
     """
     安装requirements.txt中的依赖
     
@@ -213,6 +525,9 @@ def install_requirements(venv_path, req_file, log_file, pip_source=None, skip_in
         log_file: 失败日志文件路径
         pip_source: pip源URL
         skip_installed: True=跳过已安装（快速模式）, False=强制重装（完整模式）
+        find_links: 本地wheel目录,指定后只从该目录离线安装（--no-index）
+        pkgs: 直接指定依赖列表（如离线安装包的manifest）,此时不读取req_file
+        no_compile: True=pip安装时不编译字节码（由precompile_bytecode统一并行编译）
     
     Returns:
         (ok, msg, failed_list)
@@ -223,13 +538,13 @@ def install_requirements(venv_path, req_file, log_file, pip_source=None, skip_in
         return False, result, []
     pip_path = result
     
-    # 检查requirements.txt是否存在
-    if not os.path.isfile(req_file):
-        return False, f'未找到requirements.txt: {req_file}', []
-    
-    # 读取依赖列表
-    with open(req_file, 'r', encoding='utf-8') as f:
-        pkgs = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+    if pkgs is None:
+        # 检查requirements.txt是否存在
+        if not os.path.isfile(req_file):
+            return False, f'未找到requirements.txt: {req_file}', []
+        
+        # 读取依赖列表
+        pkgs = read_requirements(req_file)
     
     if not pkgs:
         return True, '没有需要安装的依赖', []
@@ -280,8 +595,12 @@ def install_requirements(venv_path, req_file, log_file, pip_source=None, skip_in
         # 安装依赖
         try:
             cmd = [pip_path, 'install', pkg]
-            if pip_source:
-                cmd += ['-i', pip_source]
+            if no_compile:
+                cmd.append('--no-compile')
+            if find_links:
+                cmd += ['--no-index', '--find-links', find_links]
+            else:
+                cmd += get_pip_source_args(pip_source)
             
             subprocess.check_call(
                 cmd, 
@@ -318,12 +637,19 @@ def install_requirements(venv_path, req_file, log_file, pip_source=None, skip_in
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='依赖安装工具')
+    parser.add_argument('command', nargs='?', default='install', choices=['install', 'bundle'],
+                        help='install=安装依赖（默认）, bundle=导出离线安装包')
     parser.add_argument('--venv', type=str, default=VENV_PATH, help=f'虚拟环境目录名（默认: {VENV_PATH}）')
     parser.add_argument('--req', type=str, default='requirements.txt', help='requirements.txt文件名')
     parser.add_argument('--log', type=str, default='install_failed.log', help='失败日志文件名')
     parser.add_argument('--source', type=int, default=None, help='pip源编号: 0=默认, 1=清华, 2=阿里, 3=中科大')
     parser.add_argument('--full', action='store_true', help='完整安装模式（强制重装所有依赖）')
     parser.add_argument('--config', type=str, default=CONFIG_FILE, help=f'配置文件路径（默认: {CONFIG_FILE}）')
+    parser.add_argument('--bundle-file', type=str, default=BUNDLE_FILE, help=f'bundle命令输出的离线安装包路径（默认: {BUNDLE_FILE}）')
+    parser.add_argument('--from-bundle', type=str, default=None, help='从离线安装包安装（不联网）')
+    parser.add_argument('--wheelhouse', type=str, default=WHEELHOUSE_DIR, help=f'本地wheel缓存目录（默认: {WHEELHOUSE_DIR}）')
+    parser.add_argument('--no-precompile', action='store_true', help='安装后不并行预编译字节码（由pip逐个编译）')
+    parser.add_argument('--compile-workers', type=int, default=0, help='预编译进程数（默认0=CPU核心数）')
     args = parser.parse_args()
     
     # 1. 确保packaging已安装
@@ -356,18 +682,52 @@ if __name__ == '__main__':
             print('使用pip默认源')
             pip_source = None
     
-    # 4. 安装依赖
+    # 4. 导出离线安装包
+    if args.command == 'bundle':
+        ok, msg = build_bundle(args.venv, args.req, args.bundle_file, args.wheelhouse, pip_source)
+        print(msg)
+        sys.exit(0 if ok else 1)
+    
+    # 5. 安装依赖
     skip_installed = not args.full  # full模式不跳过已安装
     
+    find_links = None
+    pkgs = None
+    if args.from_bundle:
+        ok, msg, manifest = extract_bundle(args.from_bundle, args.wheelhouse)
+        print(msg)
+        if not ok:
+            sys.exit(1)
+        find_links = args.wheelhouse
+        pkgs = manifest.get('requirements', [])
+        print('模式: 离线安装（仅使用离线安装包中的wheel）')
+    
+    precompile = not args.no_precompile
+    site_packages = get_site_packages(args.venv)
+    dists_before = snapshot_distributions(site_packages) if precompile else {}
+    
     ok, msg, failed = install_requirements(
         args.venv,
         args.req,
         args.log,
         pip_source,
-        skip_installed
+        skip_installed,
+        find_links=find_links,
+        pkgs=pkgs,
+        no_compile=precompile
     )
     
     print(msg)
     
+    # 6. 对本次新装/变化的分发包并行预编译字节码
+    if precompile:
+        dists_after = snapshot_distributions(site_packages or get_site_packages(args.venv))
+        _, compile_msg = precompile_bytecode(
+            args.venv,
+            get_changed_distributions(dists_before, dists_after),
+            args.compile_workers
+        )
+        print(compile_msg)
+    
     if not ok:
         sys.exit(1)
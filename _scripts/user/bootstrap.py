@@ -0,0 +1,247 @@
+"""
+一键初始化项目环境（venv -> 扫描依赖 -> 安装依赖）
+
+使用方法：
+    python myscript/bootstrap.py               # 依次执行三个阶段,输入没变化的阶段自动跳过
+    python myscript/bootstrap.py --force       # 忽略记录,三个阶段全部重新执行
+    python myscript/bootstrap.py --source 1    # 安装阶段使用清华源
+
+逻辑：
+    1. 在同一个进程中加载 0_venv.py、1_requirements.py、2_install_import.py,
+       只启动一次解释器、只读一次配置文件,各阶段的 ensure_* 检查只在真正执行时才做
+    2. venv阶段：用文件级健康检查（不启动子进程）判断,健康则跳过,
+       不存在则创建,有问题则只修复有问题的部分
+    3. 扫描阶段：输入指纹 = 配置中的import相关参数 + 所有py文件的(路径, 大小, mtime) + requirements.txt内容
+    4. 安装阶段：输入指纹 = requirements.txt内容 + pip源 + venv中已安装的分发包(dist-info)
+    5. 指纹记录在 .misc/.bootstrap_state.json,阶段执行成功后才更新,
+       失败的阶段下次会重新执行
+    6. 最后打印每个阶段的用时
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import importlib.util
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = '.misc/.bootstrap_state.json'
+VENV_PATH = '.venv'
+REQUIREMENTS_FILE = 'requirements.txt'
+
+
+def load_stage_module(name, filename):
+    """按文件路径加载阶段脚本（文件名以数字开头,不能直接import）"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPT_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_state(state_file=STATE_FILE):
+    if os.path.isfile(state_file):
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def save_state(state, state_file=STATE_FILE):
+    state_dir = os.path.dirname(state_file)
+    if state_dir:
+        os.makedirs(state_dir, exist_ok=True)
+    with open(state_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+
+
+def fingerprint(*parts):
+    """把任意可JSON序列化的输入合成一个sha256指纹"""
+    data = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def file_digest(path):
+    """文件内容的sha256（不存在时返回None）"""
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_shared_config(req_mod, install_mod, config_path):
+    """只读一次配置文件：先由1_requirements补齐扫描参数,再补齐2_install_import的pip参数"""
+    config = req_mod.load_config(config_path)
+    if install_mod.merge_config_addon(config):
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=4)
+        print(f'已更新配置文件: {config_path}')
+    return config
+
+
+def scan_fingerprint(config, project, req_file):
+    """扫描阶段的输入指纹：只stat文件,不读取内容"""
+    ignore_folders = set(config['import_ignore_folder'])
+    ignore_files = set(config['import_ignore_file'])
+    entries = []
+    for root, dirs, files in os.walk(project):
+        dirs[:] = [d for d in dirs if d not in ignore_folders]
+        for name in files:
+            if name.endswith('.py') and name not in ignore_files:
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                entries.append((os.path.relpath(path, project), st.st_size, st.st_mtime_ns))
+    entries.sort()
+    settings = {k: config[k] for k in ('import2pip', 'import_ignore_folder', 'import_ignore_file', 'import_src')}
+    return fingerprint(settings, entries, file_digest(req_file))
+
+
+def install_fingerprint(install_mod, venv_path, req_file, pip_source):
+    """安装阶段的输入指纹：requirements内容 + pip源 + 已安装的分发包"""
+    site_packages = install_mod.get_site_packages(venv_path)
+    dists = install_mod.snapshot_distributions(site_packages)
+    return fingerprint(os.path.abspath(venv_path), file_digest(req_file), pip_source, sorted(dists.items()))
+
+
+def run_venv_stage(venv_mod, venv_path):
+    """venv阶段：健康则跳过,不存在则创建,有问题则修复"""
+    issues = venv_mod.check_venv_health(venv_path)
+    if not any(level == 'error' for _, level, _ in issues):
+        return True, True, '虚拟环境健康'
+
+    ok, msg = venv_mod.ensure_virtualenv()
+    if not ok:
+        return False, False, msg
+    if not venv_mod.venv_exists(venv_path) and not os.path.isfile(os.path.join(venv_path, 'pyvenv.cfg')):
+        ok, msg = venv_mod.create_venv(venv_path)
+    else:
+        ok, msg = venv_mod.repair_venv(venv_path, issues)
+        if not ok:
+            msg += '\n请运行: python myscript/0_venv.py --rebuild'
+    return ok, False, msg
+
+
+def run_scan_stage(req_mod, config, project, req_file):
+    """扫描阶段：与1_requirements.py的默认合并模式相同"""
+    ok, msg = req_mod.ensure_stdlib_list()
+    if not ok:
+        return False, msg
+    local_modules = req_mod.get_local_modules(project, config['import_ignore_folder'], config['import_ignore_file'])
+    imports = req_mod.scan_imports(project, config['import_ignore_folder'], config['import_ignore_file'],
+                                   config['import_src'])
+    third_party_deps = req_mod.filter_third_party(imports, local_modules, config['import2pip'])
+    if not third_party_deps:
+        return True, '未找到第三方依赖'
+    total, _, new_count = req_mod.write_requirements(third_party_deps, req_file)
+    return True, f'{req_file}: 共 {total} 项依赖, 新增 {new_count} 项'
+
+
+def run_install_stage(install_mod, config, venv_path, req_file, source, precompile):
+    """安装阶段：与2_install_import.py的快速安装模式相同"""
+    if not os.path.isfile(req_file):
+        return True, f'没有{req_file},跳过安装'
+    ok, msg = install_mod.ensure_packaging()
+    if not ok:
+        return False, msg
+
+    pip_source, _ = install_mod.get_pip_source_url(config, config.get('pip_source', 0) if source is None else source)
+    site_packages = install_mod.get_site_packages(venv_path)
+    dists_before = install_mod.snapshot_distributions(site_packages) if precompile else {}
+
+    ok, msg, _ = install_mod.install_requirements(venv_path, req_file, 'install_failed.log', pip_source,
+                                                  skip_installed=True, no_compile=precompile)
+    if precompile:
+        dists_after = install_mod.snapshot_distributions(site_packages or install_mod.get_site_packages(venv_path))
+        _, compile_msg = install_mod.precompile_bytecode(
+            venv_path, install_mod.get_changed_distributions(dists_before, dists_after))
+        msg += f'\n{compile_msg}'
+    return ok, msg.strip()
+
+
+def bootstrap(venv_path=VENV_PATH, req_file=REQUIREMENTS_FILE, project=None, config_path=None,
+              source=None, force=False, precompile=True, state_file=STATE_FILE):
+    """
+    依次执行三个阶段
+
+    Returns:
+        (ok, timings)  timings为 [(阶段名, 状态, 用时), ...]
+    """
+    project = project or os.getcwd()
+    timings = []
+    state = load_state(state_file)
+
+    start = time.time()
+    venv_mod = load_stage_module('venv_stage', '0_venv.py')
+    req_mod = load_stage_module('requirements_stage', '1_requirements.py')
+    install_mod = load_stage_module('install_stage', '2_install_import.py')
+    config = load_shared_config(req_mod, install_mod, config_path or req_mod.CONFIG_FILE)
+    timings.append(('加载', '完成', time.time() - start))
+
+    # 1. venv
+    start = time.time()
+    ok, skipped, msg = run_venv_stage(venv_mod, venv_path)
+    print(f'[venv] {msg}')
+    timings.append(('venv', '跳过' if skipped else ('完成' if ok else '失败'), time.time() - start))
+    if not ok:
+        return False, timings
+
+    # 2. 扫描依赖
+    start = time.time()
+    fp = scan_fingerprint(config, project, req_file)
+    if not force and state.get('scan') == fp:
+        timings.append(('扫描', '跳过', time.time() - start))
+    else:
+        ok, msg = run_scan_stage(req_mod, config, project, req_file)
+        print(f'[扫描] {msg}')
+        timings.append(('扫描', '完成' if ok else '失败', time.time() - start))
+        if not ok:
+            return False, timings
+        # 写入requirements.txt后再计算指纹,下次没有变化就跳过
+        state['scan'] = scan_fingerprint(config, project, req_file)
+        save_state(state, state_file)
+
+    # 3. 安装依赖
+    start = time.time()
+    pip_source_index = config.get('pip_source', 0) if source is None else source
+    fp = install_fingerprint(install_mod, venv_path, req_file, pip_source_index)
+    if not force and state.get('install') == fp:
+        timings.append(('安装', '跳过', time.time() - start))
+    else:
+        ok, msg = run_install_stage(install_mod, config, venv_path, req_file, source, precompile)
+        print(f'[安装] {msg}')
+        timings.append(('安装', '完成' if ok else '失败', time.time() - start))
+        if not ok:
+            state.pop('install', None)
+            save_state(state, state_file)
+            return False, timings
+        state['install'] = install_fingerprint(install_mod, venv_path, req_file, pip_source_index)
+        save_state(state, state_file)
+
+    return True, timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='一键初始化项目环境（venv、扫描依赖、安装依赖）')
+    parser.add_argument('--venv', type=str, default=VENV_PATH, help=f'虚拟环境目录名（默认: {VENV_PATH}）')
+    parser.add_argument('--req', type=str, default=REQUIREMENTS_FILE, help=f'requirements文件（默认: {REQUIREMENTS_FILE}）')
+    parser.add_argument('--project', type=str, default=os.getcwd(), help='项目根目录')
+    parser.add_argument('--config', type=str, default=None, help='配置文件路径（默认: .config/pyenv.json）')
+    parser.add_argument('--source', type=int, default=None, help='pip源编号: 0=默认, 1=清华, 2=阿里, 3=中科大')
+    parser.add_argument('--force', action='store_true', help='忽略指纹记录,所有阶段重新执行')
+    parser.add_argument('--no-precompile', action='store_true', help='安装后不并行预编译字节码')
+    args = parser.parse_args()
+
+    total_start = time.time()
+    ok, timings = bootstrap(args.venv, args.req, args.project, args.config, args.source,
+                            args.force, not args.no_precompile)
+
+    print('\n阶段      状态    用时')
+    for name, status, elapsed in timings:
+        print(f'{name:<8s}  {status:<4s}  {elapsed:.3f}s')
+    print(f'总计: {time.time() - total_start:.3f}s')
+
+    if not ok:
+        sys.exit(1)
@@ -4,12 +4,35 @@ Python脚本打包器 - PyInstaller图形化界面工具
 功能：
     - 图形化界面操作PyInstaller打包Python脚本
     - 支持单个或批量打包多个Python脚本
-    - 自动检测系统中安装的Python解释器（包括虚拟环境）
+    - 自动检测系统中安装的Python解释器（包括虚拟环境，Linux/macOS下还有PATH、pyenv和conda环境），
+      在后台线程中查找，结果缓存在 .misc/.build/interpreters_cache.json，搜索目录的mtime不变时直接使用
     - 优先使用当前执行脚本的Python解释器
     - 支持拖放添加脚本文件
+    - 添加文件夹在后台线程中扫描，跳过 .venv、.git、dist、build 等目录（可配置），
+      默认只添加含 if __name__ == '__main__': 的入口脚本，扫描到一批就添加一批
     - 自动检测和安装PyInstaller
     - 可配置打包选项（单文件/多文件、控制台/无控制台、图标等）
-    - 实时显示打包日志
+    - 实时显示打包日志：输出按100ms批量刷新到日志页，日志页只保留最近5000行，
+      完整日志写入文件（任务为构建目录下的 build.log），过滤搜索在完整日志文件上进行
+    - 打包队列：同时运行多个PyInstaller进程，每个任务有独立的状态行、日志页和构建目录，
+      可单独取消某个任务或取消整个队列
+    - 构建缓存：与命令行版本共用 .misc/.build/build_manifest.json，
+      脚本、本地依赖、解释器和参数都未变化且输出完好时跳过打包
+    - 打包前的准备（探测解释器、自动排除、运行记录裁剪、计算构建键）在后台线程中进行，界面不会卡住
+    - 清理策略：自动（默认，只有解释器、已安装包或打包参数变化时才 --clean）/总是/从不
+    - 共享打包：填写共享包名称后，所有脚本作为一个任务打包到 <输出目录>/<名称>/，
+      每个脚本一个可执行文件，只启动一次PyInstaller，公共依赖只收集一份（每个脚本仍各自分析；只能是目录形式）
+    - 自动排除：静态分析入口脚本的import，用不到的已安装第三方包和tkinter、unittest等
+      作为 --exclude-module 传给PyInstaller，可填写保留模块，并显示减少的大小和分析量
+    - 运行记录裁剪：使用命令行 --profile 记录的实际加载模块，排除从未加载的模块，
+      打包后做冒烟运行，失败的任务标记为失败并且不记入构建缓存
+    - 持久解压：单文件模式下改为目录模式构建，按内容哈希安装到 <输出目录>/_runtime/<名称>-<哈希>/，
+      输出目录中生成同名启动器，启动时不再每次解压
+    - 构建报告：每个任务结束时在日志页显示Analysis/PYZ/PKG/EXE/COLLECT等阶段用时和进程树的
+      CPU时间、峰值内存，并写入 .misc/.build/reports/（与命令行版本相同）
+    - 打包清单：按 .config/mypackager_targets.json（或.toml）中声明的目标打包（与命令行 --build 相同），
+      每个目标有自己的单文件/控制台/图标/数据/隐藏导入等选项，依赖的目标打包成功后才开始，
+      依赖失败的目标标记为失败
 
 使用方法：
     python myscript/packager.py
@@ -30,15 +53,38 @@ Python脚本打包器 - PyInstaller图形化界面工具
 
 import sys
 import os
+import re
+import glob
+import json
+import time
+import codecs
+import shutil
+import fnmatch
 import subprocess
+from collections import deque
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLineEdit, QPushButton, QFileDialog, 
                              QLabel, QMessageBox, QListWidget, QListWidgetItem,
                              QFrame, QDialog, QScrollArea, QComboBox, QCheckBox,
                              QGroupBox, QFormLayout, QTextEdit, QTabWidget,
-                             QRadioButton, QButtonGroup)
-from PyQt5.QtCore import Qt, QMimeData, QProcess
-from PyQt5.QtGui import QDragEnterEvent, QDropEvent
+                             QRadioButton, QButtonGroup, QPlainTextEdit, QSpinBox,
+                             QTableWidget, QTableWidgetItem, QHeaderView,
+                             QAbstractItemView, QSplitter)
+from PyQt5.QtCore import Qt, QMimeData, QProcess, QProcessEnvironment, QTimer, QThread, pyqtSignal
+from PyQt5.QtGui import QDragEnterEvent, QDropEvent, QColor
+
+# 与命令行版本共用的打包辅助函数
+from mypackager_cli import (default_jobs, probe_interpreter, compute_build_key, get_artifact_path,
+                            load_build_manifest, is_build_cached, record_build,
+                            normalize_clean_policy, compute_env_fingerprint, decide_clean,
+                            save_env_fingerprint, split_arg_lines, generate_shared_spec,
+                            get_shared_options, compute_bundle_key, compute_auto_excludes,
+                            get_keep_modules, format_exclude_report, format_build_change,
+                            get_profile_path, load_profile, save_profile, compute_prune_excludes,
+                            check_pruned_build, get_executable_path, PERSISTENT_STAGING_DIR,
+                            get_launcher_path, get_runtime_root, read_launcher_target,
+                            install_persistent, write_launcher, PhaseTimer, ProcessTreeSampler,
+                            report_build, find_targets_file, load_targets, plan_targets)
 
 # ==================== 配置常量 ====================
 
@@ -55,7 +101,15 @@ DEFAULT_CONFIG = {
     # 打包默认选项
     "default_onefile": True,                # 默认生成单文件
     "default_console": True,                # 默认显示控制台
-    "default_clean": True,                  # 默认打包前清理
+    "default_clean": "auto",                # 清理策略: auto=环境变化时才清理, always=总是清理, never=从不清理
+    "max_jobs": 0,                          # 同时打包的脚本数（0=按CPU核数和可用内存自动决定）
+    "shared_bundle": "",                    # 共享打包名称（留空则每个脚本单独打包）
+    "auto_exclude": False,                  # 自动排除入口脚本用不到的模块
+    "auto_exclude_keep": {},                # 自动排除时保留的模块 {脚本文件名或"*": [模块, ...]}
+    "trace_prune": False,                   # 按命令行 --profile 的运行记录裁剪从未加载的模块
+    "persistent_extract": False,            # 单文件改为持久解压（目录模式 + 启动器）
+    "persistent_runtime_dir": "",           # 持久解压的运行目录（留空为 <输出目录>/_runtime）
+    "persistent_keep_versions": 2,          # 每个程序保留的版本数
     
     # 打包额外参数
     "extra_data": "",                       # 额外数据参数（--add-data）
@@ -85,8 +139,58 @@ DEFAULT_CONFIG = {
         r"C:\Users\*\AppData\Local\Programs\Python\Python*\python.exe"
     ],
     
+    # Python解释器搜索路径（Linux/macOS，PATH中的python、pyenv和conda环境会自动查找）
+    "python_search_paths_posix": [
+        "~/.pyenv/versions/*/bin/python",
+        "~/miniconda3/bin/python",
+        "~/miniconda3/envs/*/bin/python",
+        "~/anaconda3/bin/python",
+        "~/anaconda3/envs/*/bin/python",
+        "~/miniforge3/bin/python",
+        "~/miniforge3/envs/*/bin/python",
+        "/opt/conda/bin/python",
+        "/opt/conda/envs/*/bin/python",
+        "/Library/Frameworks/Python.framework/Versions/*/bin/python3"
+    ],
+    
     # 父目录搜索深度（向上查找虚拟环境的层级数）
-    "parent_dir_search_depth": 0
+    "parent_dir_search_depth": 0,
+    
+    # 添加文件夹时跳过的目录和文件（支持通配符，含pyvenv.cfg的虚拟环境目录总是跳过）
+    "folder_import_ignore_folder": [".misc", ".venv", "venv", "env", ".env", "virtualenv", "__pycache__",
+                                    ".git", ".hg", ".svn", ".tox", ".nox", ".idea", ".vscode",
+                                    "node_modules", "site-packages", "*.egg-info", "dist", "build"],
+    "folder_import_ignore_file": ["setup.py", "__init__.py", "conftest.py"]
+}
+
+# 解释器查找结果的缓存（搜索过的目录mtime不变时直接使用）
+INTERPRETER_CACHE_FILE = '.misc/.build/interpreters_cache.json'
+
+# 虚拟环境中解释器的相对路径（Windows / Linux、macOS）
+VENV_PYTHON_PATHS = (os.path.join('Scripts', 'python.exe'), os.path.join('bin', 'python'))
+
+# 日志页控件中保留的行数（完整日志在文件中）和批量刷新间隔（毫秒）
+LOG_VIEW_MAX_LINES = 5000
+LOG_FLUSH_INTERVAL = 100
+
+# 打包任务状态的显示文字和颜色
+JOB_STATUS_TEXT = {
+    'queued': '排队中',
+    'running': '运行中',
+    'smoke': '冒烟运行',
+    'ok': '成功',
+    'cached': '已缓存',
+    'failed': '失败',
+    'cancelled': '已取消',
+}
+JOB_STATUS_COLOR = {
+    'queued': '#666666',
+    'running': '#2e7d32',
+    'smoke': '#ef6c00',
+    'ok': '#1565c0',
+    'cached': '#6a1b9a',
+    'failed': '#c62828',
+    'cancelled': '#999999',
 }
 
 # ==================== 配置常量结束 ====================
@@ -136,6 +240,391 @@ def load_config(config_path=None):
     return config
 
 
+# ==================== 解释器查找 ====================
+
+def normalize_path_key(path):
+    """去重用的路径（规范化，Windows下不区分大小写）"""
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def is_python_executable(path):
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def get_venv_search_dirs(config):
+    """查找虚拟环境的目录：当前目录、脚本所在目录（打包后的EXE）及按配置层级的父目录"""
+    dirs = {}
+    for d in (os.getcwd(), os.path.dirname(sys.argv[0])):
+        d = os.path.normpath(os.path.abspath(d))
+        dirs.setdefault(normalize_path_key(d), d)
+    depth = config.get('parent_dir_search_depth', 0)
+    for base in list(dirs.values()):
+        for i in range(depth):
+            parent = os.path.normpath(os.path.join(base, *(['..'] * (i + 1))))
+            dirs.setdefault(normalize_path_key(parent), parent)
+    return [d for d in dirs.values() if os.path.isdir(d)]
+
+
+def get_python_search_patterns(config):
+    """当前系统的解释器glob模式（展开 ~ 和环境变量，包括PYENV_ROOT下的版本）"""
+    if sys.platform == 'win32':
+        patterns = list(config.get('python_search_paths', []))
+        python_rel = 'python.exe'
+    else:
+        patterns = list(config.get('python_search_paths_posix', []))
+        python_rel = os.path.join('bin', 'python')
+    pyenv_root = os.environ.get('PYENV_ROOT')
+    if pyenv_root:
+        patterns.append(os.path.join(pyenv_root, 'versions', '*', python_rel))
+    return [os.path.expandvars(os.path.expanduser(p)) for p in patterns]
+
+
+def get_conda_env_file():
+    return os.path.join(os.path.expanduser('~'), '.conda', 'environments.txt')
+
+
+def find_conda_interpreters():
+    """conda记录的环境列表（~/.conda/environments.txt）和当前激活的环境"""
+    prefixes = []
+    try:
+        with open(get_conda_env_file(), 'r', encoding='utf-8') as f:
+            prefixes = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    except OSError:
+        pass
+    if os.environ.get('CONDA_PREFIX'):
+        prefixes.append(os.environ['CONDA_PREFIX'])
+    python_rel = 'python.exe' if sys.platform == 'win32' else os.path.join('bin', 'python')
+    return [os.path.join(prefix, python_rel) for prefix in prefixes]
+
+
+def get_path_dirs():
+    return [d for d in os.environ.get('PATH', '').split(os.pathsep) if d]
+
+
+def find_path_interpreters():
+    """PATH中所有的python（相当于 where python / which -a python3，不启动子进程）"""
+    if sys.platform == 'win32':
+        names, patterns = ('python.exe',), ()
+    else:
+        names, patterns = ('python3', 'python'), ('python3.[0-9]', 'python3.[0-9][0-9]')
+    found = []
+    for name in ('python3', 'python'):
+        which = shutil.which(name)
+        if which:
+            found.append(which)
+    for path_dir in get_path_dirs():
+        found.extend(os.path.join(path_dir, name) for name in names)
+        for pattern in patterns:
+            found.extend(glob.glob(os.path.join(glob.escape(path_dir), pattern)))
+    return found
+
+
+def pattern_stamp_dirs(pattern, matches):
+    """
+    glob模式结果依赖的目录：第一个通配符之前的固定目录，以及每个结果到固定目录之间的各级目录
+    （新装一个版本时它的上级目录mtime会变化）
+    """
+    parts = pattern.replace('\\', '/').split('/')
+    fixed = []
+    for part in parts[:-1]:
+        if glob.has_magic(part):
+            break
+        fixed.append(part)
+    base = os.path.normpath('/'.join(fixed) + '/') if fixed else os.curdir
+    dirs = [base]
+    base_key = normalize_path_key(base)
+    for match in matches:
+        d = os.path.dirname(match)
+        while normalize_path_key(d) != base_key and len(d) > len(base):
+            dirs.append(d)
+            d = os.path.dirname(d)
+    return dirs
+
+
+def get_path_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_interpreter_cache_key(config):
+    """查找条件：配置、当前目录、PATH变化时缓存失效"""
+    return {
+        'platform': sys.platform,
+        'cwd': os.path.abspath(os.getcwd()),
+        'script_dir': os.path.abspath(os.path.dirname(sys.argv[0])),
+        'path': os.environ.get('PATH', ''),
+        'pyenv_root': os.environ.get('PYENV_ROOT', ''),
+        'conda_prefix': os.environ.get('CONDA_PREFIX', ''),
+        'config': {k: config.get(k) for k in ('venv_search_dirs', 'python_search_paths',
+                                              'python_search_paths_posix', 'parent_dir_search_depth')},
+    }
+
+
+def load_interpreter_cache(cache_file=INTERPRETER_CACHE_FILE):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_interpreter_cache(cache, cache_file=INTERPRETER_CACHE_FILE):
+    try:
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+    except OSError:
+        pass
+
+
+def is_interpreter_cache_valid(cache, config):
+    """缓存的查找条件相同、记录的目录mtime都没变、解释器都还在时有效"""
+    if not cache or cache.get('key') != get_interpreter_cache_key(config):
+        return False
+    stamps = cache.get('stamps', {})
+    if any(get_path_mtime(path) != mtime for path, mtime in stamps.items()):
+        return False
+    return all(os.path.isfile(path) for path in cache.get('interpreters', []))
+
+
+def load_cached_interpreters(cache_file=INTERPRETER_CACHE_FILE):
+    """上次查找的结果（不检查是否过期，用于启动时立即显示）"""
+    return [p for p in load_interpreter_cache(cache_file).get('interpreters', []) if os.path.isfile(p)]
+
+
+def scan_python_interpreters(config):
+    """
+    实际查找解释器
+
+    Returns:
+        (解释器列表, {目录: mtime})  虚拟环境排在前面，其余按路径排序
+    """
+    venv_dirs = config.get('venv_search_dirs', ['.venv', 'venv'])
+    stamp_dirs = []
+    venv_candidates = []
+    other_candidates = []
+
+    # 虚拟环境（包括带版本号的目录，如 venv310、venv311）
+    for check_dir in get_venv_search_dirs(config):
+        stamp_dirs.append(check_dir)
+        escaped_dir = glob.escape(check_dir)
+        for venv_dir in venv_dirs:
+            for venv_root in glob.glob(os.path.join(escaped_dir, glob.escape(venv_dir) + '*')):
+                stamp_dirs.append(venv_root)
+                venv_candidates.extend(os.path.join(venv_root, rel) for rel in VENV_PYTHON_PATHS)
+
+    # 配置的glob模式（系统安装、pyenv、conda）
+    for pattern in get_python_search_patterns(config):
+        matches = glob.glob(pattern)
+        other_candidates.extend(matches)
+        stamp_dirs.extend(pattern_stamp_dirs(pattern, matches))
+
+    # conda环境列表和PATH
+    stamp_dirs.append(get_conda_env_file())
+    other_candidates.extend(find_conda_interpreters())
+    stamp_dirs.extend(get_path_dirs())
+    other_candidates.extend(find_path_interpreters())
+
+    # 按规范化路径去重
+    seen = set()
+    venv_interpreters = []
+    other_interpreters = []
+    venv_keywords = [v.lower() for v in venv_dirs]
+    for is_venv, candidates in ((True, venv_candidates), (False, other_candidates)):
+        for path in candidates:
+            key = normalize_path_key(path)
+            if key in seen or not is_python_executable(path):
+                continue
+            seen.add(key)
+            path = os.path.normpath(os.path.abspath(path))
+            # 统一转换为大写盘符显示
+            if len(path) > 1 and path[1] == ':':
+                path = path[0].upper() + path[1:]
+            if is_venv or any(keyword in path.lower() for keyword in venv_keywords):
+                venv_interpreters.append(path)
+            else:
+                other_interpreters.append(path)
+
+    stamps = {}
+    for d in stamp_dirs:
+        stamps.setdefault(os.path.normpath(os.path.abspath(d)), None)
+    for d in stamps:
+        stamps[d] = get_path_mtime(d)
+    return sorted(venv_interpreters) + sorted(other_interpreters), stamps
+
+
+def discover_python_interpreters(config, use_cache=True, cache_file=INTERPRETER_CACHE_FILE):
+    """
+    查找系统中的Python解释器，结果缓存在 .misc/.build/interpreters_cache.json，
+    搜索过的目录（虚拟环境、glob固定目录、PATH目录）mtime都没变时直接使用缓存
+
+    Returns:
+        (解释器列表, 是否来自缓存)
+    """
+    if use_cache:
+        cache = load_interpreter_cache(cache_file)
+        if is_interpreter_cache_valid(cache, config):
+            return cache['interpreters'], True
+
+    # 先创建缓存目录，避免写缓存本身改变搜索目录的mtime
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    except OSError:
+        pass
+    interpreters, stamps = scan_python_interpreters(config)
+    save_interpreter_cache({
+        'key': get_interpreter_cache_key(config),
+        'stamps': stamps,
+        'interpreters': interpreters,
+    }, cache_file)
+    return interpreters, False
+
+
+def order_interpreters(interpreters, config):
+    """
+    下拉框中的顺序：
+    1. 当前目录的虚拟环境（最优先）
+    2. 当前执行的Python解释器
+    3. 其他解释器
+    """
+    current_python = os.path.normpath(os.path.abspath(sys.executable))
+    current_dir = normalize_path_key(os.getcwd())
+    venv_dirs = [normalize_path_key(os.path.join(current_dir, v)) for v in config.get('venv_search_dirs', ['.venv', 'venv'])]
+
+    ordered = []
+    for interpreter in interpreters:
+        key = normalize_path_key(interpreter)
+        if any(key.startswith(venv_dir) for venv_dir in venv_dirs):
+            ordered.append(interpreter)
+            break
+    ordered.append(current_python)
+    ordered.extend(interpreters)
+
+    result = []
+    seen = set()
+    for interpreter in ordered:
+        key = normalize_path_key(interpreter)
+        if key not in seen:
+            seen.add(key)
+            result.append(interpreter)
+    return result
+
+
+class InterpreterDiscoveryThread(QThread):
+    """
+    后台查找Python解释器，完成后发出 found(解释器列表, 是否来自缓存)
+    """
+    found = pyqtSignal(list, bool)
+
+    def __init__(self, config, use_cache=True, parent=None):
+        super().__init__(parent)
+        self.config = config
+        self.use_cache = use_cache
+
+    def run(self):
+        try:
+            interpreters, cached = discover_python_interpreters(self.config, self.use_cache)
+        except Exception:
+            interpreters, cached = [], False
+        self.found.emit(interpreters, cached)
+
+
+class CallThread(QThread):
+    """
+    在后台线程中调用一个函数（探测解释器、分析依赖、冒烟运行等会阻塞的操作），
+    完成后发出 done(返回值)，函数抛出异常时返回值为 on_error(异常)
+    """
+    done = pyqtSignal(object)
+
+    def __init__(self, func, on_error, parent=None):
+        super().__init__(parent)
+        self.func = func
+        self.on_error = on_error
+
+    def run(self):
+        try:
+            result = self.func()
+        except Exception as e:
+            result = self.on_error(e)
+        self.done.emit(result)
+
+
+# ==================== 文件夹导入 ====================
+
+# 入口脚本的特征：顶层的 if __name__ == '__main__':（也接受两边对调的写法）
+ENTRY_POINT_PATTERN = re.compile(
+    rb'^if\s+(?:__name__\s*==\s*([\'"])__main__\1|([\'"])__main__\2\s*==\s*__name__)\s*:', re.MULTILINE)
+
+# 每批添加到列表的脚本数
+FOLDER_SCAN_BATCH = 50
+
+
+def is_entry_point(path):
+    """脚本是否包含顶层的 if __name__ == '__main__':"""
+    try:
+        with open(path, 'rb') as f:
+            return ENTRY_POINT_PATTERN.search(f.read()) is not None
+    except OSError:
+        return False
+
+
+def match_any(name, patterns):
+    return name in patterns or any(fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def scan_folder_scripts(folder, ignore_folders, ignore_files):
+    """
+    遍历文件夹中的.py文件，跳过忽略的目录和文件（支持通配符）以及虚拟环境（含pyvenv.cfg的目录）
+
+    Yields:
+        (脚本路径, 是否为入口脚本)
+    """
+    ignore_folders = set(ignore_folders)
+    ignore_files = set(ignore_files)
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not match_any(d, ignore_folders)
+                         and not os.path.isfile(os.path.join(root, d, 'pyvenv.cfg')))
+        for name in sorted(files):
+            if name.lower().endswith('.py') and not match_any(name, ignore_files):
+                path = os.path.join(root, name)
+                yield path, is_entry_point(path)
+
+
+class FolderScanThread(QThread):
+    """
+    后台扫描文件夹：入口脚本按批发出 batch_found(路径列表)，
+    结束时发出 scan_finished(入口脚本数, 非入口脚本路径列表)
+    """
+    batch_found = pyqtSignal(list)
+    scan_finished = pyqtSignal(int, list)
+
+    def __init__(self, folder, ignore_folders, ignore_files, parent=None):
+        super().__init__(parent)
+        self.folder = folder
+        self.ignore_folders = ignore_folders
+        self.ignore_files = ignore_files
+
+    def run(self):
+        batch = []
+        found = 0
+        others = []
+        for path, entry in scan_folder_scripts(self.folder, self.ignore_folders, self.ignore_files):
+            if self.isInterruptionRequested():
+                break
+            if not entry:
+                others.append(path)
+                continue
+            batch.append(path)
+            found += 1
+            if len(batch) >= FOLDER_SCAN_BATCH:
+                self.batch_found.emit(batch)
+                batch = []
+        if batch:
+            self.batch_found.emit(batch)
+        self.scan_finished.emit(found, others)
+
 
 class DragDropLineEdit(QLineEdit):
     """
@@ -362,6 +851,190 @@ class DragDropScriptArea(QScrollArea):
             QMessageBox.information(self.packager, "提示", "无法识别拖放的Python文件。请确保拖放的是.py文件。")
 
 
+class BufferedLogView(QWidget):
+    """
+    日志页：输出先放入缓冲区，定时批量追加到控件；控件只保留最近的 LOG_VIEW_MAX_LINES 行，
+    完整日志写入文件，搜索/过滤读取文件而不是控件内容
+    """
+    def __init__(self, log_file=None, parent=None):
+        super().__init__(parent)
+        self.log_file = log_file
+        self.log_handle = None
+        self.pending = []       # 等待刷新的行
+        self.filter_text = ''   # 当前过滤条件（小写）
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        search_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("在完整日志中过滤（不区分大小写，回车执行）")
+        self.search_input.returnPressed.connect(self.apply_filter)
+        search_layout.addWidget(self.search_input, 1)
+        filter_btn = QPushButton("过滤")
+        filter_btn.clicked.connect(self.apply_filter)
+        search_layout.addWidget(filter_btn)
+        show_all_btn = QPushButton("显示全部")
+        show_all_btn.clicked.connect(self.clear_filter)
+        search_layout.addWidget(show_all_btn)
+        layout.addLayout(search_layout)
+
+        self.view = QPlainTextEdit()
+        self.view.setReadOnly(True)
+        self.view.setUndoRedoEnabled(False)
+        self.view.setMaximumBlockCount(LOG_VIEW_MAX_LINES)
+        layout.addWidget(self.view, 1)
+
+        self.info_label = QLabel()
+        self.info_label.setStyleSheet("color: gray;")
+        layout.addWidget(self.info_label)
+        self.update_info()
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(LOG_FLUSH_INTERVAL)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def appendPlainText(self, text):
+        """追加一段文本（与QPlainTextEdit接口相同），在下一次定时刷新时显示"""
+        self.pending.append(text)
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    append = appendPlainText
+
+    def clear(self):
+        """清空显示，下次写入时重新创建日志文件"""
+        self.pending = []
+        self.close_file()
+        self.view.clear()
+
+    def open_file(self):
+        if self.log_handle is None and self.log_file:
+            try:
+                os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+                self.log_handle = open(self.log_file, 'w', encoding='utf-8')
+            except OSError as e:
+                self.view.appendPlainText(f"警告: 无法写入日志文件 {self.log_file}: {e}")
+                self.log_file = None
+                self.update_info()
+        return self.log_handle
+
+    def close_file(self):
+        self.flush()
+        if self.log_handle is not None:
+            self.log_handle.close()
+            self.log_handle = None
+
+    def flush(self):
+        """把缓冲区一次性写入日志文件和控件"""
+        self.flush_timer.stop()
+        if not self.pending:
+            return
+        text = '\n'.join(self.pending)
+        self.pending = []
+
+        handle = self.open_file()
+        if handle is not None:
+            handle.write(text + '\n')
+            handle.flush()
+
+        lines = text.split('\n')
+        if self.filter_text:
+            lines = [line for line in lines if self.filter_text in line.lower()]
+        if lines:
+            # 超过上限的部分反正会被控件丢弃，不再交给控件排版
+            self.view.appendPlainText('\n'.join(lines[-LOG_VIEW_MAX_LINES:]))
+
+    def read_file_lines(self, predicate=None):
+        """
+        从日志文件读取行
+
+        Returns:
+            (最后 LOG_VIEW_MAX_LINES 个符合条件的行, 符合条件的总行数)
+        """
+        lines = deque(maxlen=LOG_VIEW_MAX_LINES)
+        count = 0
+        if self.log_handle is None:
+            # 清空后还没有写入过，文件中是上一次的日志
+            return lines, count
+        try:
+            with open(self.log_file, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    if predicate is None or predicate(line):
+                        lines.append(line.rstrip('\n'))
+                        count += 1
+        except OSError:
+            pass
+        return lines, count
+
+    def apply_filter(self):
+        """只显示完整日志中包含搜索内容的行，之后的输出也按同样条件过滤"""
+        text = self.search_input.text().strip().lower()
+        if not text:
+            self.clear_filter()
+            return
+        self.flush()
+        self.filter_text = text
+        lines, count = self.read_file_lines(lambda line: text in line.lower())
+        self.view.setPlainText('\n'.join(lines))
+        self.update_info(f"匹配 {count} 行" + (f"（显示最后 {len(lines)} 行）" if count > len(lines) else ''))
+
+    def clear_filter(self):
+        """取消过滤，显示日志文件的最后部分"""
+        self.flush()
+        self.filter_text = ''
+        self.search_input.clear()
+        lines, _ = self.read_file_lines()
+        self.view.setPlainText('\n'.join(lines))
+        self.update_info()
+
+    def update_info(self, message=''):
+        parts = [message] if message else []
+        parts.append(f"显示最近 {LOG_VIEW_MAX_LINES} 行")
+        if self.log_file:
+            parts.append(f"完整日志: {self.log_file}")
+        self.info_label.setText('，'.join(parts))
+
+
+class BuildJob:
+    """
+    打包队列中的一个任务
+    """
+    def __init__(self, script_path, name, row, log_view):
+        self.script_path = script_path
+        self.name = name
+        self.row = row                  # 在任务表格中的行号
+        self.log_view = log_view        # 独立的日志页
+        self.status = 'queued'
+        self.process = None
+        self.start_time = None
+        self.elapsed = 0.0
+        self.cancel_btn = None
+        self.build_key = None           # 构建缓存键（无法获取解释器信息时为None）
+        self.artifact = None            # 输出文件路径
+        self.env_fingerprint = None     # 构建环境指纹（清理策略用）
+        self.clean = True               # 本次是否传 --clean
+        self.saved = 0.0                # 增量构建节省的秒数
+        self.entries = None             # 共享打包的 [(脚本路径, 可执行文件名), ...]，普通任务为None
+        self.excludes = []              # 自动排除的模块
+        self.exclude_report = None      # 自动排除的统计
+        self.profile = None             # 运行记录（裁剪时使用）
+        self.pruned = False             # 是否按运行记录裁剪了模块
+        self.command = None             # 完整的打包命令（写入构建报告）
+        self.phase_timer = None         # 按日志拆分阶段用时
+        self.sampler = None             # 进程树CPU和内存采样
+        self.pending_line = ''          # 输出中还没收到换行的部分
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')  # 多字节字符可能跨两次读取
+        self.options = None             # 打包清单目标自己的打包选项（None表示使用界面上的选项）
+        self.depends_on = []            # 打包清单中依赖的任务名称
+        self.smoke_thread = None        # 裁剪后冒烟运行的后台线程
+
+    @property
+    def finished(self):
+        return self.status in ('ok', 'cached', 'failed', 'cancelled')
+
+
 class PythonPackager(QMainWindow):
     """
     Python脚本打包器主界面
@@ -369,14 +1042,20 @@ class PythonPackager(QMainWindow):
     def __init__(self):
         super().__init__()
         self.script_widgets = []
+        self.script_keys = set()  # 列表中脚本的规范化路径（去重用）
+        self.folder_scan_thread = None  # 后台扫描文件夹的线程
+        self.folder_scan_added = 0
         self.process = None
-        self.current_script_index = 0
+        self.jobs = []  # 打包队列中的任务
+        self.build_probe = None  # 打包解释器的信息（构建缓存和清理策略用）
         self.scripts_to_package = []
         self.package_all = False
         self.package_options = {}
         self.tabs = None  # 保存标签页引用
         self.log_needs_attention = False  # 标记日志是否需要用户关注
         self.is_packaging = False  # 标记是否正在打包中
+        self.interpreter_thread = None  # 后台查找解释器的线程
+        self.prepare_thread = None  # 后台准备打包任务的线程
         
         # 加载配置文件
         self.config = load_config()
@@ -431,9 +1110,15 @@ class PythonPackager(QMainWindow):
         add_script_btn.clicked.connect(self.add_script)
         script_buttons_layout.addWidget(add_script_btn)
         
-        add_folder_btn = QPushButton("添加文件夹中的所有脚本")
-        add_folder_btn.clicked.connect(self.add_folder_scripts)
-        script_buttons_layout.addWidget(add_folder_btn)
+        self.add_folder_btn = QPushButton("添加文件夹中的所有脚本")
+        self.add_folder_btn.clicked.connect(self.add_folder_scripts)
+        script_buttons_layout.addWidget(self.add_folder_btn)
+        
+        package_targets_btn = QPushButton("按打包清单打包")
+        package_targets_btn.setToolTip("按 .config/mypackager_targets.json（或.toml）中的目标打包，"
+                                       "依赖的目标先打包（与命令行 --build 相同）")
+        package_targets_btn.clicked.connect(self.package_targets)
+        script_buttons_layout.addWidget(package_targets_btn)
         
         clear_scripts_btn = QPushButton("清空列表")
         clear_scripts_btn.clicked.connect(self.clear_scripts)
@@ -469,9 +1154,9 @@ class PythonPackager(QMainWindow):
         interpreter_input_layout.addWidget(self.interpreter_combo, 1)
         
         # 刷新解释器列表按钮
-        refresh_interpreter_btn = QPushButton("刷新列表")
-        refresh_interpreter_btn.clicked.connect(self.refresh_interpreters)
-        interpreter_input_layout.addWidget(refresh_interpreter_btn)
+        self.refresh_interpreter_btn = QPushButton("刷新列表")
+        self.refresh_interpreter_btn.clicked.connect(lambda: self.refresh_interpreters(use_cache=False))
+        interpreter_input_layout.addWidget(self.refresh_interpreter_btn)
         
         browse_interpreter_btn = QPushButton("浏览...")
         browse_interpreter_btn.clicked.connect(self.browse_interpreter)
@@ -526,6 +1211,14 @@ class PythonPackager(QMainWindow):
         self.one_file_cb.setChecked(self.config.get('default_onefile', True))  # 使用配置
         basic_layout.addRow("输出格式:", self.one_file_cb)
         
+        self.persistent_cb = QCheckBox("持久解压（只在打包时解压一次，启动更快）")
+        self.persistent_cb.setChecked(bool(self.config.get('persistent_extract', False)))
+        self.persistent_cb.setToolTip("以目录模式构建并按内容哈希安装到 输出目录/_runtime/名称-哈希，"
+                                      "输出目录中生成同名启动器；分发时需要连同_runtime目录一起复制")
+        self.persistent_cb.setEnabled(self.one_file_cb.isChecked())
+        self.one_file_cb.toggled.connect(self.persistent_cb.setEnabled)
+        basic_layout.addRow("", self.persistent_cb)
+        
         self.console_cb = QCheckBox("显示cmd窗口(exe运行会有黑色的cmd来输出信息，关掉就不显示)")
         self.console_cb.setChecked(self.config.get('default_console', True))  # 使用配置
         basic_layout.addRow("控制台:", self.console_cb)
@@ -555,9 +1248,48 @@ class PythonPackager(QMainWindow):
         advanced_group = QGroupBox("高级选项")
         advanced_layout = QFormLayout(advanced_group)
         
-        self.clean_cb = QCheckBox("打包前清理")
-        self.clean_cb.setChecked(self.config.get('default_clean', True))  # 使用配置
-        advanced_layout.addRow("清理:", self.clean_cb)
+        self.clean_combo = QComboBox()
+        self.clean_combo.addItem("自动（解释器、已安装包或参数变化时才清理）", 'auto')
+        self.clean_combo.addItem("总是清理", 'always')
+        self.clean_combo.addItem("从不清理", 'never')
+        clean_policy = normalize_clean_policy(self.config.get('default_clean', 'auto'))  # 使用配置
+        self.clean_combo.setCurrentIndex(self.clean_combo.findData(clean_policy))
+        advanced_layout.addRow("清理:", self.clean_combo)
+        
+        self.jobs_spin = QSpinBox()
+        self.jobs_spin.setRange(0, 64)
+        self.jobs_spin.setSpecialValueText(f"自动 ({default_jobs()})")
+        self.jobs_spin.setValue(self.config.get('max_jobs', 0))
+        self.jobs_spin.setToolTip("同时运行的PyInstaller进程数，0为按CPU核数和可用内存自动决定")
+        advanced_layout.addRow("并发数:", self.jobs_spin)
+        
+        self.force_rebuild_cb = QCheckBox("忽略构建缓存，强制重新打包")
+        self.force_rebuild_cb.setToolTip("默认脚本、本地依赖、解释器和参数都未变化且输出完好时跳过打包")
+        advanced_layout.addRow("缓存:", self.force_rebuild_cb)
+        
+        self.shared_bundle_input = QLineEdit(self.config.get('shared_bundle', ''))
+        self.shared_bundle_input.setPlaceholderText("留空则每个脚本单独打包")
+        self.shared_bundle_input.setToolTip("填写名称后所有脚本打包到同一个目录（输出目录/名称），"
+                                            "每个脚本一个可执行文件，共享同一份依赖库，只运行一次PyInstaller")
+        advanced_layout.addRow("共享打包:", self.shared_bundle_input)
+        
+        self.auto_exclude_cb = QCheckBox("自动排除入口脚本用不到的模块")
+        self.auto_exclude_cb.setChecked(bool(self.config.get('auto_exclude', False)))
+        self.auto_exclude_cb.setToolTip("静态分析import，未被用到的已安装第三方包和tkinter、unittest等标准库模块"
+                                        "作为 --exclude-module 传给PyInstaller")
+        advanced_layout.addRow("排除:", self.auto_exclude_cb)
+        
+        self.keep_modules_input = QLineEdit()
+        self.keep_modules_input.setPlaceholderText("自动排除时保留的模块，逗号分隔，如 matplotlib, unittest")
+        self.keep_modules_input.setToolTip("动态导入的模块静态分析看不到，被误排除时填在这里；"
+                                           "也可以在配置的 auto_exclude_keep 中按脚本设置")
+        advanced_layout.addRow("保留模块:", self.keep_modules_input)
+        
+        self.prune_cb = QCheckBox("按运行记录裁剪从未加载的模块")
+        self.prune_cb.setChecked(bool(self.config.get('trace_prune', False)))
+        self.prune_cb.setToolTip("需要先用 mypackager_cli.py 脚本 --profile 记录实际加载的模块，"
+                                 "打包后会用记录时的参数冒烟运行")
+        advanced_layout.addRow("裁剪:", self.prune_cb)
         
         self.icon_path = DragDropLineEdit(accept_files=True, file_extensions=['.ico'])
         self.icon_path.setPlaceholderText("选择应用图标 (.ico)")
@@ -694,9 +1426,32 @@ class PythonPackager(QMainWindow):
         log_tab = QWidget()
         log_layout = QVBoxLayout(log_tab)
         
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
-        log_layout.addWidget(self.log_text)
+        # 上方为任务状态表格，下方为日志页（总览 + 每个任务一页）
+        log_splitter = QSplitter(Qt.Vertical)
+        
+        self.job_table = QTableWidget(0, 4)
+        self.job_table.setHorizontalHeaderLabels(["脚本", "状态", "用时", "操作"])
+        self.job_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.job_table.verticalHeader().hide()
+        self.job_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.job_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.job_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.job_table.itemSelectionChanged.connect(self.on_job_selected)
+        log_splitter.addWidget(self.job_table)
+        
+        self.job_log_tabs = QTabWidget()
+        self.log_text = BufferedLogView(os.path.abspath(os.path.join(
+            self.config.get('build_temp_dir', '.misc/.build/build'), 'packager.log')))
+        self.job_log_tabs.addTab(self.log_text, "总览")
+        log_splitter.addWidget(self.job_log_tabs)
+        log_splitter.setStretchFactor(1, 1)
+        
+        log_layout.addWidget(log_splitter)
+        
+        # 每秒刷新运行中任务的用时
+        self.job_timer = QTimer(self)
+        self.job_timer.setInterval(1000)
+        self.job_timer.timeout.connect(self.refresh_job_elapsed)
         
         # 添加日志标签，并保存索引
         self.log_tab_index = self.tabs.addTab(log_tab, "打包日志")
@@ -710,11 +1465,11 @@ class PythonPackager(QMainWindow):
         # 打包按钮
         self.package_btn = QPushButton("打包脚本")
         self.package_btn.setMinimumHeight(40)
-        self.package_btn.clicked.connect(self.package_scripts)
+        self.package_btn.clicked.connect(lambda: self.package_scripts())
         main_layout.addWidget(self.package_btn)
         
-        # 终止打包按钮（初始隐藏）
-        self.stop_btn = QPushButton("终止打包")
+        # 取消整个队列按钮（初始隐藏）
+        self.stop_btn = QPushButton("取消全部任务")
         self.stop_btn.setMinimumHeight(40)
         self.stop_btn.setStyleSheet("background-color: #d9534f; color: white;")
         self.stop_btn.clicked.connect(self.stop_packaging)
@@ -725,30 +1480,20 @@ class PythonPackager(QMainWindow):
         self.show()
     
     def stop_packaging(self):
-        """终止打包进程"""
-        if not self.is_packaging or not self.process:
+        """取消整个打包队列"""
+        if not self.is_packaging:
             return
             
         # 弹出确认对话框
-        reply = QMessageBox.question(self, "确认", "确定要终止当前打包进程吗？", 
+        reply = QMessageBox.question(self, "确认", "确定要取消所有打包任务吗？", 
                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply != QMessageBox.Yes:
             return
-            
-        # 终止进程
-        self.process.kill()
         
-        # 添加日志
-        self.log_text.append("\n打包进程已被用户终止")
-        
-        # 重置状态
-        self.is_packaging = False
-        self.stop_btn.hide()
-        self.package_btn.show()
-        
-        # 高亮日志标签页（蓝色）
-        self.log_needs_attention = True
-        self.highlight_log_tab(True, color='blue')
+        self.log_text.append("\n打包队列已被用户取消")
+        for job in self.jobs:
+            self.cancel_job(job, check_finished=False)
+        self.check_queue_finished()
     
     def on_tab_changed(self, index):
         """标签页切换事件处理"""
@@ -771,173 +1516,60 @@ class PythonPackager(QMainWindow):
                 self.interpreter_combo.addItem(file_path)
             self.interpreter_combo.setCurrentText(file_path)
     
-    def refresh_interpreters(self):
-        """刷新Python解释器列表"""
+    def refresh_interpreters(self, use_cache=True):
+        """
+        刷新Python解释器列表：先显示当前解释器和上次的查找结果，
+        在后台线程中查找（或验证缓存），完成后再更新下拉框
+        """
+        if self.interpreter_thread is not None and self.interpreter_thread.isRunning():
+            return
+        if self.interpreter_combo.count() == 0:
+            self.set_interpreters(order_interpreters(load_cached_interpreters(), self.config))
+
+        self.refresh_interpreter_btn.setEnabled(False)
+        self.refresh_interpreter_btn.setText("查找中...")
+        self.interpreter_thread = InterpreterDiscoveryThread(self.config, use_cache, self)
+        self.interpreter_thread.found.connect(self.on_interpreters_found)
+        self.interpreter_thread.start()
+
+    def on_interpreters_found(self, interpreters, cached):
+        """后台查找完成"""
+        self.set_interpreters(order_interpreters(interpreters, self.config))
+        self.refresh_interpreter_btn.setEnabled(True)
+        self.refresh_interpreter_btn.setText("刷新列表")
+
+    def set_interpreters(self, interpreters):
+        """填充解释器下拉框；用户已经选择或输入了其他解释器时保留其选择"""
+        current = self.interpreter_combo.currentText().strip()
+        default = self.interpreter_combo.itemText(0) if self.interpreter_combo.count() else ''
         self.interpreter_combo.clear()
-        
-        # 获取当前执行脚本的Python解释器
-        current_python = os.path.normpath(os.path.abspath(sys.executable))
-        
-        # 获取当前工作目录（规范化）
-        current_dir = os.path.normpath(os.path.abspath(os.getcwd()))
-        
-        # 查找所有系统Python解释器
-        interpreters = self.find_python_interpreters()
-        
-        # 查找当前目录的虚拟环境解释器
-        current_dir_venv = None
-        venv_dirs = self.config.get('venv_search_dirs', ['.venv', 'venv'])
-        for interpreter in interpreters:
-            normalized_interpreter = os.path.normpath(os.path.abspath(interpreter))
-            # 检查解释器是否在当前目录下的虚拟环境中
-            if current_dir in normalized_interpreter:
-                # 检查是否包含虚拟环境关键词
-                for venv_dir in venv_dirs:
-                    if venv_dir in normalized_interpreter:
-                        current_dir_venv = interpreter
-                        break
-                if current_dir_venv:
-                    break
-        
-        # 排序优先级：
-        # 1. 当前目录的虚拟环境（最优先）
-        # 2. 当前执行的Python解释器
-        # 3. 其他解释器
-        final_interpreters = []
-        
-        # 添加当前目录的虚拟环境（如果存在）
-        if current_dir_venv:
-            final_interpreters.append(current_dir_venv)
-        
-        # 添加当前Python解释器（如果不是当前目录的虚拟环境）
-        if current_python not in [os.path.normpath(os.path.abspath(i)) for i in final_interpreters]:
-            final_interpreters.append(current_python)
-        
-        # 添加其他解释器
-        for interpreter in interpreters:
-            normalized = os.path.normpath(os.path.abspath(interpreter))
-            if normalized not in [os.path.normpath(os.path.abspath(i)) for i in final_interpreters]:
-                final_interpreters.append(interpreter)
-        
-        # 添加到下拉框
-        for interpreter in final_interpreters:
-            self.interpreter_combo.addItem(interpreter)
-        
-        # 默认选择第一个（当前目录虚拟环境或当前Python解释器）
-        if self.interpreter_combo.count() > 0:
+        self.interpreter_combo.addItems(interpreters)
+
+        if current and current != default:
+            if self.interpreter_combo.findText(current) == -1:
+                self.interpreter_combo.addItem(current)
+            self.interpreter_combo.setCurrentText(current)
+        elif self.interpreter_combo.count() > 0:
+            # 默认选择第一个（当前目录虚拟环境或当前Python解释器）
             self.interpreter_combo.setCurrentIndex(0)
-    
-    def find_python_interpreters(self):
-        """查找系统中安装的Python解释器"""
-        import glob
-        interpreters = []
-        
-        # 获取当前目录（规范化）
-        current_dir = os.path.normpath(os.path.abspath(os.getcwd()))
-        
-        # 如果是打包后的EXE，尝试使用脚本所在目录（规范化）
-        script_dir = os.path.normpath(os.path.abspath(os.path.dirname(sys.argv[0])))
-        
-        # 查找虚拟环境
-        venv_paths = []
-        
-        # 要检查的目录列表 - 移除重复的目录
-        dirs_to_check = []
-        for d in [current_dir, script_dir]:
-            normalized_path = os.path.normpath(d)
-            if normalized_path not in dirs_to_check and os.path.exists(d):
-                dirs_to_check.append(normalized_path)
-        
-        # 添加父目录（使用配置）
-        parent_depth = self.config.get('parent_dir_search_depth', 0)
-        for base_dir in list(dirs_to_check):  # 使用列表的副本进行迭代
-            for i in range(parent_depth):
-                parent_dir = os.path.normpath(os.path.abspath(os.path.join(base_dir, *(['..'] * (i+1)))))
-                if parent_dir not in dirs_to_check and os.path.exists(parent_dir):
-                    dirs_to_check.append(parent_dir)
-        
-        # 在所有目录中查找虚拟环境（使用配置）
-        venv_dirs = self.config.get('venv_search_dirs', ['.venv', 'venv'])
-        for check_dir in dirs_to_check:
-            if not os.path.exists(check_dir):
-                continue
-                
-            for venv_dir in venv_dirs:
-                # Windows路径 - 使用 normpath 规范化
-                venv_path = os.path.normpath(os.path.join(check_dir, venv_dir, 'Scripts', 'python.exe'))
-                if os.path.exists(venv_path):
-                    normalized_path = os.path.normcase(os.path.normpath(venv_path))
-                    if normalized_path not in [os.path.normcase(os.path.normpath(p)) for p in venv_paths]:
-                        venv_paths.append(venv_path)
-                
-                # 使用通配符匹配带任意版本号的虚拟环境目录（如 venv310, venv311, venv40 等）
-                # 这样无论Python出什么新版本都能自动识别
-                versioned_pattern = os.path.join(check_dir, f"{venv_dir}*", 'Scripts', 'python.exe')
-                versioned_matches = glob.glob(versioned_pattern)
-                for match in versioned_matches:
-                    # 规范化路径
-                    match = os.path.normpath(os.path.abspath(match))
-                    normalized_path = os.path.normcase(match)
-                    if normalized_path not in [os.path.normcase(os.path.normpath(p)) for p in venv_paths]:
-                        venv_paths.append(match)
-        
-        # 使用glob查找匹配的系统Python解释器（使用配置）
-        python_paths = self.config.get('python_search_paths', [])
-        for path_pattern in python_paths:
-            matches = glob.glob(path_pattern)
-            for match in matches:
-                # 规范化路径
-                match = os.path.normpath(os.path.abspath(match))
-                normalized_path = os.path.normcase(match)
-                if normalized_path not in [os.path.normcase(os.path.normpath(p)) for p in interpreters]:
-                    interpreters.append(match)
-        
-        # 添加找到的虚拟环境解释器
-        for venv_path in venv_paths:
-            normalized_path = os.path.normcase(os.path.normpath(venv_path))
-            if normalized_path not in [os.path.normcase(os.path.normpath(p)) for p in interpreters]:
-                interpreters.append(venv_path)
-        
-        # 检查系统PATH中的Python
-        try:
-            which_python = subprocess.check_output(["where", "python"], text=True, stderr=subprocess.DEVNULL)
-            for path in which_python.strip().split('\n'):
-                if path:
-                    # 规范化路径
-                    path = os.path.normpath(os.path.abspath(path))
-                    normalized_path = os.path.normcase(path)
-                    if normalized_path not in [os.path.normcase(os.path.normpath(p)) for p in interpreters]:
-                        interpreters.append(path)
-        except (subprocess.SubprocessError, FileNotFoundError):
-            pass
-        
-        # 去重并排序 - 使用规范化路径进行比较
-        unique_interpreters = []
-        normalized_paths = []
-        
-        for path in interpreters:
-            normalized_path = os.path.normcase(os.path.normpath(path))
-            if normalized_path not in normalized_paths:
-                normalized_paths.append(normalized_path)
-                unique_interpreters.append(path)
-        
-        interpreters = sorted(unique_interpreters)
-        
-        # 将虚拟环境解释器排在前面（使用配置中的关键词）
-        venv_dirs = self.config.get('venv_search_dirs', ['.venv', 'venv'])
-        venv_keywords = [v.lower() for v in venv_dirs]
-        venv_interpreters = [i for i in interpreters if any(keyword in i.lower() for keyword in venv_keywords)]
-        other_interpreters = [i for i in interpreters if i not in venv_interpreters]
-        
-        # 统一转换为大写盘符显示
-        result = []
-        for path in venv_interpreters + other_interpreters:
-            if path and len(path) > 1 and path[1] == ':':
-                path = path[0].upper() + path[1:]
-            result.append(path)
-            
-        return result
-        
+
+    def closeEvent(self, event):
+        """关闭窗口前等待后台线程结束，并把缓冲的日志写入文件"""
+        if self.interpreter_thread is not None:
+            self.interpreter_thread.wait()
+        if self.prepare_thread is not None:
+            self.prepare_thread.wait()
+        for job in self.jobs:
+            if job.smoke_thread is not None:
+                job.smoke_thread.wait()
+        if self.folder_scan_thread is not None:
+            self.folder_scan_thread.requestInterruption()
+            self.folder_scan_thread.wait()
+        self.log_text.close_file()
+        for job in self.jobs:
+            job.log_view.close_file()
+        super().closeEvent(event)
+
     def get_interpreter_path(self):
         """获取当前选择的解释器路径"""
         return self.interpreter_combo.currentText().strip()
@@ -951,29 +1583,50 @@ class PythonPackager(QMainWindow):
             self.add_script_to_list(file_path)
     
     def add_folder_scripts(self):
-        """添加文件夹中的所有Python脚本"""
+        """在后台线程中扫描文件夹，默认只添加入口脚本（含 if __name__ == '__main__':）"""
+        if self.folder_scan_thread is not None and self.folder_scan_thread.isRunning():
+            return
         folder_path = QFileDialog.getExistingDirectory(
             self, "选择包含Python脚本的文件夹", ""
         )
         if not folder_path:
             return
         
-        python_files = []
-        # 遍历文件夹查找所有.py文件
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                if file.lower().endswith('.py'):
-                    python_files.append(os.path.join(root, file))
+        self.add_folder_btn.setEnabled(False)
+        self.add_folder_btn.setText("扫描中...")
+        self.folder_scan_added = 0
+        self.folder_scan_thread = FolderScanThread(
+            folder_path, self.config.get('folder_import_ignore_folder', []),
+            self.config.get('folder_import_ignore_file', []), self)
+        self.folder_scan_thread.batch_found.connect(self.on_folder_batch_found)
+        self.folder_scan_thread.scan_finished.connect(self.on_folder_scan_finished)
+        self.folder_scan_thread.start()
+    
+    def on_folder_batch_found(self, paths):
+        """每扫描到一批入口脚本就添加到列表"""
+        for path in paths:
+            if self.add_script_to_list(path):
+                self.folder_scan_added += 1
+    
+    def on_folder_scan_finished(self, found, others):
+        """扫描结束：报告结果，非入口脚本由用户决定是否添加"""
+        self.add_folder_btn.setEnabled(True)
+        self.add_folder_btn.setText("添加文件夹中的所有脚本")
         
-        if not python_files:
-            QMessageBox.information(self, "信息", f"在所选文件夹中未找到Python脚本。")
+        if not found and not others:
+            QMessageBox.information(self, "信息", "在所选文件夹中未找到Python脚本。")
             return
         
-        # 添加找到的所有Python脚本
-        for py_file in python_files:
-            self.add_script_to_list(py_file)
-        
-        QMessageBox.information(self, "信息", f"已添加 {len(python_files)} 个Python脚本。")
+        message = f"找到 {found} 个入口脚本，已添加 {self.folder_scan_added} 个（其余已在列表中）。"
+        if not others:
+            QMessageBox.information(self, "信息", message)
+            return
+        reply = QMessageBox.question(
+            self, "信息", f"{message}\n\n另有 {len(others)} 个脚本不含 if __name__ == '__main__':，"
+                          f"是否也添加？", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            for path in others:
+                self.add_script_to_list(path)
     
     def clear_scripts(self):
         """清空脚本列表"""
@@ -990,27 +1643,28 @@ class PythonPackager(QMainWindow):
                 self.remove_script(widget)
     
     def add_script_to_list(self, script_path):
-        """向列表添加脚本项"""
-        # 检查是否已经在列表中
-        for widget in self.script_widgets:
-            if widget.script_path == script_path:
-                return  # 已存在，不重复添加
-                
+        """向列表添加脚本项，已在列表中时返回False"""
+        key = normalize_path_key(script_path)
+        if key in self.script_keys:
+            return False  # 已存在，不重复添加
+        
+        self.script_keys.add(key)
         script_widget = ScriptItemWidget(script_path, self)
         self.script_widgets.append(script_widget)
         self.scripts_layout.addWidget(script_widget)
+        return True
     
     def remove_script(self, script_widget):
         """从列表中删除脚本项"""
         if script_widget in self.script_widgets:
             self.script_widgets.remove(script_widget)
+            self.script_keys.discard(normalize_path_key(script_widget.script_path))
             self.scripts_layout.removeWidget(script_widget)
             script_widget.deleteLater()
     
     def update_script_list(self):
-        """更新脚本列表"""
-        # 仅在需要时重新排列或更新脚本列表
-        pass
+        """脚本项的路径被编辑后，重建去重用的路径集合"""
+        self.script_keys = {normalize_path_key(w.script_path) for w in self.script_widgets}
     
     def browse_output_dir(self):
         """浏览选择输出目录"""
@@ -1246,6 +1900,7 @@ class PythonPackager(QMainWindow):
         
         # 切换到日志标签页
         self.tabs.setCurrentIndex(self.log_tab_index)
+        self.job_log_tabs.setCurrentWidget(self.log_text)
         
         # 启动进程检查PyInstaller
         self.process = QProcess()
@@ -1280,12 +1935,39 @@ class PythonPackager(QMainWindow):
             self.log_text.append("\n检查失败，PyInstaller未安装或Python解释器路径错误")
             self.log_text.append(f'可以点击"安装PyInstaller"按钮进行安装，或手动安装: "{self.get_interpreter_path()}" -m pip install pyinstaller')
     
-    def package_scripts(self):
-        """打包选中的Python脚本"""
+    def package_targets(self):
+        """按打包清单打包所有目标（与命令行 --build 相同），依赖的目标先打包"""
+        if self.is_packaging:
+            return
+        path = find_targets_file()
+        targets, error = load_targets(path)
+        if not error:
+            order, error = plan_targets(targets)
+        if not error:
+            missing = [targets[key]['script'] for key in order if not os.path.isfile(targets[key]['script'])]
+            if missing:
+                error = f"以下脚本不存在: {', '.join(missing)}"
+        if error:
+            QMessageBox.warning(self, "错误", error)
+            return
+        self.package_scripts([(key, targets[key]) for key in order], path)
+    
+    def package_scripts(self, targets=None, targets_path=None):
+        """
+        打包选中的Python脚本
+        
+        Args:
+            targets: 打包清单中的 [(目标名, 目标配置), ...]（按依赖排好序），提供时代替脚本列表
+            targets_path: 打包清单路径（显示用）
+        """
         # 检查是否已经在打包中，防止重复运行
         if self.is_packaging:
             QMessageBox.information(self, "提示", "打包进程已在运行中")
             return
+        # 取消后上一次的任务准备可能还在后台进行
+        if self.prepare_thread is not None and self.prepare_thread.isRunning():
+            QMessageBox.information(self, "提示", "上一次的打包任务还在准备中，请稍后再试")
+            return
             
         interpreter_path = self.get_interpreter_path()
         if not interpreter_path:
@@ -1296,7 +1978,7 @@ class PythonPackager(QMainWindow):
             QMessageBox.warning(self, "错误", "Python解释器路径不存在")
             return
         
-        if len(self.script_widgets) == 0:
+        if not targets and len(self.script_widgets) == 0:
             QMessageBox.warning(self, "错误", "请添加至少一个Python脚本")
             return
         
@@ -1306,14 +1988,23 @@ class PythonPackager(QMainWindow):
             'console': self.console_cb.isChecked(),
             'name': self.name_input.text().strip(),
             'output_dir': self.output_dir.text().strip(),
-            'clean': self.clean_cb.isChecked(),
+            'clean_policy': self.clean_combo.currentData(),
             'icon_path': self.icon_path.text().strip(),
             'extra_data': self.extra_data.toPlainText().strip(),  # 使用toPlainText()获取多行文本
             'extra_args': self.extra_args.toPlainText().strip(),  # 使用toPlainText()获取多行文本
             'build_dir': self.build_dir.text().strip(),
             'spec_dir': self.spec_dir.text().strip(),
+            'shared_bundle': self.shared_bundle_input.text().strip(),
+            'auto_exclude': self.auto_exclude_cb.isChecked(),
+            'keep_modules': [m.strip() for m in self.keep_modules_input.text().split(',') if m.strip()],
+            'prune': self.prune_cb.isChecked(),
+            'persistent': self.one_file_cb.isChecked() and self.persistent_cb.isChecked(),
         }
         
+        # 清空上一次的日志和任务
+        self.log_text.clear()
+        self.clear_jobs()
+        
         # 确保目录存在（使用 exist_ok=True 避免已存在错误）
         for dir_path in [self.package_options['output_dir'], 
                         self.package_options['build_dir'], 
@@ -1331,7 +2022,10 @@ class PythonPackager(QMainWindow):
         self.package_all = self.all_scripts_rb.isChecked()
         
         # 准备要打包的脚本列表
-        all_scripts = [w.script_path for w in self.script_widgets if os.path.exists(w.script_path)]
+        if targets:
+            all_scripts = [target['script'] for _, target in targets]
+        else:
+            all_scripts = [w.script_path for w in self.script_widgets if os.path.exists(w.script_path)]
         if not all_scripts:
             QMessageBox.warning(self, "错误", "没有有效的Python脚本可打包")
             return
@@ -1344,7 +2038,11 @@ class PythonPackager(QMainWindow):
         self.stop_btn.show()
         
         # 根据选项过滤脚本
-        if self.package_all:
+        if targets:
+            self.scripts_to_package = all_scripts
+            self.log_text.append(f"打包清单: {targets_path} (共 {len(targets)} 个目标，"
+                                 f"顺序: {' -> '.join(key for key, _ in targets)})")
+        elif self.package_all:
             # 打包所有脚本
             self.scripts_to_package = all_scripts
             self.log_text.append(f"打包模式: 打包所有脚本 (共 {len(self.scripts_to_package)} 个)")
@@ -1365,90 +2063,550 @@ class PythonPackager(QMainWindow):
                 self.log_text.append(f"打包模式: 未找到 main.py，打包第一个脚本")
                 self.log_text.append(f"  脚本路径: {all_scripts[0]}")
         
+        # 同名脚本会输出到同一个可执行文件和构建目录
+        if targets:
+            names = [target['name'] for _, target in targets]
+        else:
+            names = [self.get_job_name(script) for script in self.scripts_to_package]
+        duplicates = sorted({n for n in names if names.count(n) > 1})
+        if duplicates:
+            self.log_text.append(f"错误: 以下脚本名称重复，输出会互相覆盖: {', '.join(duplicates)}")
+            QMessageBox.warning(self, "错误", f"脚本名称重复: {', '.join(duplicates)}")
+            self.is_packaging = False
+            self.stop_btn.hide()
+            self.package_btn.show()
+            return
+        
+        # 创建任务队列，每个任务一行状态和一页日志；共享打包时所有脚本合为一个任务
+        bundle_name = '' if targets else self.package_options['shared_bundle']
+        if bundle_name:
+            self.add_job(', '.join(self.scripts_to_package), bundle_name)
+            self.jobs[0].entries = list(zip(self.scripts_to_package, names))
+            self.log_text.append(f"共享打包: {bundle_name} ({len(names)} 个入口: {', '.join(names)})")
+            if self.package_options['one_file']:
+                self.log_text.append("警告: 共享打包只能生成目录形式（多个可执行文件共用一个目录），忽略单文件选项")
+        else:
+            for script_path, name in zip(self.scripts_to_package, names):
+                self.add_job(script_path, name)
+        if targets:
+            # 打包清单：每个任务使用目标自己的选项，依赖的任务成功后才开始
+            target_names = {key: target['name'] for key, target in targets}
+            for job, (_, target) in zip(self.jobs, targets):
+                job.options = self.get_target_options(target)
+                job.depends_on = [target_names[dep] for dep in target['depends_on']]
+        
+        self.max_jobs = min(self.jobs_spin.value() or default_jobs(), len(self.jobs))
+        self.log_text.append(f"并发数: {self.max_jobs}")
+        
         # 不自动跳转到日志标签页，让用户自行查看
         # 打包开始时显示绿色高亮
         self.log_needs_attention = True
         self.highlight_log_tab(True, color='green')
-        
-        # 开始打包第一个脚本
-        self.current_script_index = 0
-        self.package_next_script()
+        self.job_timer.start()
+        
+        # 探测解释器、自动排除、运行记录裁剪和计算构建键都可能很慢，在后台线程中进行，
+        # 完成后命中缓存的任务直接标记为已缓存，其余任务开始打包
+        self.log_text.append("正在准备打包任务（探测解释器、分析依赖、计算构建键）...")
+        interpreter = self.get_interpreter_path()
+        force_rebuild = self.force_rebuild_cb.isChecked()
+        self.prepare_thread = CallThread(
+            lambda: self.prepare_jobs(interpreter, force_rebuild),
+            lambda e: {'probe': None, 'log': [f"警告: 准备打包任务失败: {e}，本次不使用构建缓存"], 'jobs': []},
+            self)
+        self.prepare_thread.done.connect(self.on_jobs_prepared)
+        self.prepare_thread.start()
     
-    def package_next_script(self):
-        """打包下一个脚本"""
-        if self.current_script_index >= len(self.scripts_to_package):
-            # 所有脚本打包完成
-            self.log_text.append("\n所有脚本打包完成！")
-            # 取消日志标签页高亮
-            self.highlight_log_tab(False)
-            return
-            
-        script_path = self.scripts_to_package[self.current_script_index]
-        script_name = os.path.basename(script_path)
-        script_basename = os.path.splitext(script_name)[0]
-        
-        # 构建PyInstaller命令参数
-        pyinstaller_args = []
-        
-        if self.package_options['one_file']:
+    def get_target_options(self, target):
+        """打包清单目标的打包选项：在界面选项的基础上使用目标自己的设置"""
+        options = dict(self.package_options)
+        options['name'] = target['name']
+        if target['onefile'] is not None:
+            options['one_file'] = target['onefile']
+            options['persistent'] = target['onefile'] and self.persistent_cb.isChecked()
+        if target['console'] is not None:
+            options['console'] = target['console']
+        if target['icon']:
+            options['icon_path'] = target['icon']
+        options['extra_data'] = '\n'.join([options['extra_data']] + [f"--add-data={data}" for data in target['add_data']]).strip()
+        options['extra_args'] = '\n'.join([options['extra_args']]
+                                          + [f"--hidden-import={module}" for module in target['hidden_imports']]
+                                          + target['extra_args']).strip()
+        return options
+    
+    def get_job_options(self, job):
+        """任务使用的打包选项"""
+        return job.options or self.package_options
+    
+    def find_job(self, name):
+        for job in self.jobs:
+            if job.name == name:
+                return job
+        return None
+    
+    def get_job_name(self, script_path):
+        """任务名称（即输出的可执行文件名）"""
+        name = self.package_options.get('name')
+        return name if name else os.path.splitext(os.path.basename(script_path))[0]
+    
+    def get_job_dirs(self, name):
+        """每个任务独立的构建目录和spec目录"""
+        build_dir = self.package_options['build_dir'] or os.path.join(
+            os.getcwd(), self.config.get('build_temp_dir', '.misc/.build/build'))
+        spec_dir = self.package_options['spec_dir'] or os.path.join(
+            os.getcwd(), self.config.get('build_spec_dir', '.misc/.build/spec'))
+        return (os.path.normpath(os.path.abspath(os.path.join(build_dir, name))),
+                os.path.normpath(os.path.abspath(os.path.join(spec_dir, name))))
+    
+    def clear_jobs(self):
+        """清空任务表格和各任务的日志页（保留总览页）"""
+        self.jobs = []
+        self.job_table.setRowCount(0)
+        while self.job_log_tabs.count() > 1:
+            widget = self.job_log_tabs.widget(1)
+            self.job_log_tabs.removeTab(1)
+            widget.close_file()
+            widget.deleteLater()
+    
+    def add_job(self, script_path, name):
+        """向队列添加一个任务"""
+        # 完整日志与命令行版本一样写到任务构建目录的 build.log
+        log_view = BufferedLogView(os.path.join(self.get_job_dirs(name)[0], 'build.log'))
+        self.job_log_tabs.addTab(log_view, name)
+        
+        row = self.job_table.rowCount()
+        self.job_table.insertRow(row)
+        script_item = QTableWidgetItem(name)
+        script_item.setToolTip(script_path)
+        self.job_table.setItem(row, 0, script_item)
+        self.job_table.setItem(row, 1, QTableWidgetItem())
+        self.job_table.setItem(row, 2, QTableWidgetItem())
+        
+        job = BuildJob(script_path, name, row, log_view)
+        job.cancel_btn = QPushButton("取消")
+        job.cancel_btn.clicked.connect(lambda _=False, job=job: self.cancel_job(job))
+        self.job_table.setCellWidget(row, 3, job.cancel_btn)
+        
+        self.jobs.append(job)
+        self.update_job_row(job)
+    
+    def update_job_row(self, job):
+        """刷新任务的状态和用时"""
+        status_item = self.job_table.item(job.row, 1)
+        status_item.setText(JOB_STATUS_TEXT[job.status])
+        status_item.setForeground(QColor(JOB_STATUS_COLOR[job.status]))
+        
+        if job.status == 'running':
+            job.elapsed = time.time() - job.start_time
+        self.job_table.item(job.row, 2).setText(f"{job.elapsed:.1f}s" if job.start_time else "")
+        
+        if job.finished and job.cancel_btn:
+            job.cancel_btn.setEnabled(False)
+    
+    def refresh_job_elapsed(self):
+        """定时刷新运行中任务的用时"""
+        for job in self.jobs:
+            if job.status == 'running':
+                self.update_job_row(job)
+    
+    def on_job_selected(self):
+        """选中任务行时切换到该任务的日志页"""
+        rows = self.job_table.selectionModel().selectedRows()
+        if rows and rows[0].row() < len(self.jobs):
+            self.job_log_tabs.setCurrentWidget(self.jobs[rows[0].row()].log_view)
+    
+    def build_pyinstaller_args(self, script_path, name, work_dir, spec_dir, clean=False, excludes=(), options=None):
+        """构建PyInstaller命令参数（脚本路径固定为最后一个参数），options为任务的打包选项"""
+        options = options or self.package_options
+        # 不清理时PyInstaller会询问是否覆盖已有输出，进程中无法交互，直接确认
+        pyinstaller_args = ["--noconfirm"]
+        
+        # 持久解压时以目录模式构建到构建目录，完成后再安装到运行目录
+        if options['one_file'] and not options['persistent']:
             pyinstaller_args.append("--onefile")
         
-        if not self.package_options['console']:
+        if not options['console']:
             pyinstaller_args.append("--noconsole")
         
-        # 如果指定了名称则使用，否则使用脚本文件名
-        name = self.package_options['name'] if self.package_options['name'] else script_basename
         pyinstaller_args.append(f"--name={name}")
         
-        if self.package_options['output_dir']:
-            pyinstaller_args.append(f"--distpath={self.package_options['output_dir']}")
-        
-        # 添加构建目录和spec文件目录参数
-        if self.package_options['build_dir']:
-            pyinstaller_args.append(f"--workpath={self.package_options['build_dir']}")
+        if options['persistent']:
+            pyinstaller_args.append(f"--distpath={os.path.join(work_dir, PERSISTENT_STAGING_DIR)}")
+        elif options['output_dir']:
+            pyinstaller_args.append(f"--distpath={options['output_dir']}")
         
-        if self.package_options['spec_dir']:
-            pyinstaller_args.append(f"--specpath={self.package_options['spec_dir']}")
+        # 每个任务独立的构建目录和spec文件目录，并发时互不干扰
+        pyinstaller_args.append(f"--workpath={work_dir}")
+        pyinstaller_args.append(f"--specpath={spec_dir}")
         
-        if self.package_options['clean']:
+        if clean:
             pyinstaller_args.append("--clean")
         
-        if self.package_options['icon_path']:
-            pyinstaller_args.append(f"--icon={self.package_options['icon_path']}")
+        if options['icon_path']:
+            pyinstaller_args.append(f"--icon={options['icon_path']}")
         
-        if self.package_options['extra_data']:
+        if options['extra_data']:
             # 处理多行 --add-data 参数，将每行作为独立参数添加
-            for data_arg in self.package_options['extra_data'].split():
-                pyinstaller_args.append(data_arg)
+            pyinstaller_args.extend(options['extra_data'].split())
         
-        if self.package_options['extra_args']:
-            pyinstaller_args.extend(self.package_options['extra_args'].split())
+        if options['extra_args']:
+            pyinstaller_args.extend(options['extra_args'].split())
+        
+        for module in excludes:
+            pyinstaller_args.append(f"--exclude-module={module}")
         
         # 添加脚本路径
         pyinstaller_args.append(script_path)
+        return pyinstaller_args
+    
+    def get_shared_tokens(self, job):
+        """共享打包时转换为spec选项的参数"""
+        tokens = (split_arg_lines(self.package_options['extra_data'])
+                  + split_arg_lines(self.package_options['extra_args']))
+        for module in job.excludes:
+            tokens += ['--exclude-module', module]
+        return tokens
+    
+    def get_output_dir(self):
+        return os.path.normpath(os.path.abspath(
+            self.package_options['output_dir'] or os.path.join(os.getcwd(), 'dist')))
+    
+    def build_shared_args(self, job, work_dir, spec_dir):
+        """生成共享打包的spec，返回PyInstaller命令参数（spec路径固定为最后一个参数）"""
+        spec_path = os.path.join(spec_dir, f"{job.name}.spec")
+        unsupported = generate_shared_spec(job.entries, job.name, spec_path, self.package_options['console'],
+                                           self.package_options['icon_path'] or None, self.get_shared_tokens(job))
+        if unsupported:
+            job.log_view.appendPlainText(f"警告: 共享打包的spec不支持以下参数，已忽略: {' '.join(unsupported)}")
+        return ["--noconfirm", f"--distpath={self.get_output_dir()}", f"--workpath={work_dir}", spec_path]
+    
+    def prepare_jobs(self, interpreter, force_rebuild):
+        """
+        准备打包任务（在后台线程中运行，不访问界面控件）：探测解释器、自动排除、
+        运行记录裁剪、计算构建键并检查构建缓存，日志先收集起来由on_jobs_prepared输出
         
-        # 构建完整命令
-        cmd = f'"{self.get_interpreter_path()}" -m PyInstaller {" ".join(pyinstaller_args)}'
-        
-        # 清空或添加分隔符到日志
-        if self.current_script_index == 0:
-            self.log_text.clear()
+        Returns:
+            {'probe': 解释器信息, 'log': [总日志], 'jobs': [(任务, [任务日志], 是否命中缓存), ...]}
+        """
+        result = {'probe': None, 'log': [], 'jobs': []}
+        probe = result['probe'] = probe_interpreter(interpreter)
+        if probe is None:
+            result['log'].append("警告: 无法获取解释器信息，本次不使用构建缓存，并在打包前清理")
+            return result
+        
+        manifest = load_build_manifest()
+        output_dir = self.package_options['output_dir'] or os.path.join(os.getcwd(), 'dist')
+        cached_names = set()
+        for job in self.jobs:
+            messages = []
+            if self.package_options['auto_exclude']:
+                scripts = [script for script, _ in job.entries] if job.entries else [job.script_path]
+                keep = set(self.package_options['keep_modules'])
+                for script in scripts:
+                    keep |= get_keep_modules(self.config, script)
+                job.excludes, job.exclude_report = compute_auto_excludes(
+                    scripts, probe, keep, self.get_job_dirs(job.name)[0])
+            if self.package_options['prune'] and not job.entries:
+                messages.append(self.apply_trace_prune(job, interpreter))
+            if job.entries:
+                options = get_shared_options(self.get_shared_tokens(job), self.package_options['console'],
+                                             self.package_options['icon_path'] or None, self.get_output_dir())
+                job.build_key = compute_bundle_key(job.entries, options, probe)
+                job.artifact = os.path.join(self.get_output_dir(), job.name)
+            else:
+                options = self.get_job_options(job)
+                work_dir, spec_dir = self.get_job_dirs(job.name)
+                args = self.build_pyinstaller_args(job.script_path, job.name, work_dir, spec_dir,
+                                                   excludes=job.excludes, options=options)
+                job.build_key = compute_build_key(job.script_path, args, probe)
+                if options['persistent']:
+                    # 版本目录在构建后才知道，使用启动器当前指向的版本目录
+                    launcher = get_launcher_path(self.get_output_dir(), job.name, probe)
+                    job.artifact = (read_launcher_target(launcher) if os.path.isfile(launcher) else None) or ''
+                else:
+                    job.artifact = get_artifact_path(output_dir, job.name, not options['one_file'], probe)
+            # 依赖的任务需要重新打包时，本任务也重新打包（依赖的任务排在前面）
+            cached = (not force_rebuild and all(dep in cached_names for dep in job.depends_on)
+                      and is_build_cached(manifest, job.name, job.build_key, job.artifact))
+            if cached:
+                cached_names.add(job.name)
+            result['jobs'].append((job, messages, cached))
+        return result
+    
+    def on_jobs_prepared(self, result):
+        """任务准备完成：输出日志，命中缓存的任务直接完成，然后开始打包"""
+        self.build_probe = result['probe']
+        for line in result['log']:
+            self.log_text.append(line)
+        for job, messages, cached in result['jobs']:
+            for line in messages:
+                job.log_view.appendPlainText(line)
+            # 准备期间被取消的任务保持取消状态
+            if cached and job.status == 'queued':
+                job.status = 'cached'
+                self.update_job_row(job)
+                job.log_view.appendPlainText(f"未变化，跳过打包: {job.artifact}")
+                self.log_text.append(f"{job.name} 未变化，使用缓存")
+        self.start_next_jobs()
+    
+    def apply_trace_prune(self, job, interpreter):
+        """按运行记录把从未加载的模块加入排除列表，返回日志"""
+        work_dir, spec_dir = self.get_job_dirs(job.name)
+        profile_path = get_profile_path(spec_dir, job.name)
+        profile = load_profile(profile_path)
+        if not profile.get('modules'):
+            return (f"运行记录裁剪: 没有 {profile_path}，"
+                    f"先运行 mypackager_cli.py {job.script_path} --profile")
+        keep = set(self.package_options['keep_modules']) | get_keep_modules(self.config, job.script_path)
+        excludes, report = compute_prune_excludes(profile, work_dir, keep, interpreter)
+        save_profile(profile_path, profile)
+        job.excludes = sorted(set(job.excludes) | set(excludes))
+        job.profile = profile
+        job.pruned = bool(excludes)
+        return (f"运行记录裁剪: 冒烟运行加载了 {report['loaded']} 个顶层模块，"
+                f"构建收集了 {report['collected']} 个，裁剪 {report['pruned']} 个")
+    
+    def start_next_jobs(self):
+        """在并发数允许的范围内启动排队中的任务，依赖的任务完成后才启动"""
+        running = sum(1 for job in self.jobs if job.status == 'running')
+        for job in self.jobs:
+            if job.status != 'queued':
+                continue
+            deps = [self.find_job(dep) for dep in job.depends_on]
+            blocked = [dep.name for dep in deps if dep.status in ('failed', 'cancelled')]
+            if blocked:
+                # 依赖打包失败，本任务不再打包
+                job.status = 'failed'
+                self.update_job_row(job)
+                message = f"{job.name} 未打包: 依赖的任务 {', '.join(blocked)} 打包失败"
+                job.log_view.appendPlainText(message)
+                self.log_text.append(message)
+                continue
+            if running < self.max_jobs and all(dep.status in ('ok', 'cached') for dep in deps):
+                self.start_job(job)
+                running += 1
+        self.check_queue_finished()
+    
+    def start_job(self, job):
+        """启动一个任务的PyInstaller进程"""
+        work_dir, spec_dir = self.get_job_dirs(job.name)
+        for dir_path in (work_dir, spec_dir):
+            os.makedirs(dir_path, exist_ok=True)
+        
+        interpreter = self.get_interpreter_path()
+        
+        # 清理策略：自动模式下只有构建环境变化才清理
+        if job.entries:
+            pyinstaller_args = self.build_shared_args(job, work_dir, spec_dir)
+            fingerprint_args = get_shared_options(
+                self.get_shared_tokens(job), self.package_options['console'], self.package_options['icon_path'] or None,
+                self.get_output_dir()) + [name for _, name in job.entries] + pyinstaller_args[-1:]
         else:
-            self.log_text.append("\n" + "="*50 + "\n")
-            
-        self.log_text.append(f"开始打包 ({self.current_script_index + 1}/{len(self.scripts_to_package)}): {script_name}")
-        self.log_text.append(f"执行命令: {cmd}")
-        
-        # 启动打包进程
-        self.process = QProcess()
-        self.process.readyReadStandardOutput.connect(self.process_output)
-        self.process.readyReadStandardError.connect(self.process_error)
-        self.process.finished.connect(self.on_package_finished)
+            pyinstaller_args = self.build_pyinstaller_args(job.script_path, job.name, work_dir, spec_dir,
+                                                           excludes=job.excludes, options=self.get_job_options(job))
+            fingerprint_args = pyinstaller_args
+        if self.build_probe:
+            job.env_fingerprint = compute_env_fingerprint(self.build_probe, fingerprint_args)
+        job.clean, clean_reason = decide_clean(self.package_options['clean_policy'], work_dir, job.env_fingerprint)
+        if job.clean:
+            pyinstaller_args.insert(-1, '--clean')
+        args = ['-m', 'PyInstaller'] + pyinstaller_args
+        job.command = [interpreter] + args
+        job.log_view.appendPlainText(f"清理策略: {self.package_options['clean_policy']} -> {clean_reason}")
+        if job.exclude_report:
+            job.log_view.appendPlainText(format_exclude_report(job.exclude_report))
+        
+        process = QProcess(self)
+        process.setProcessChannelMode(QProcess.MergedChannels)
+        # 独立的PyInstaller缓存目录，--clean 只清理本任务的缓存
+        env = QProcessEnvironment.systemEnvironment()
+        env.insert('PYINSTALLER_CONFIG_DIR', os.path.join(work_dir, '.pyinstaller'))
+        env.insert('PYTHONIOENCODING', 'utf-8')
+        process.setProcessEnvironment(env)
+        process.readyReadStandardOutput.connect(lambda job=job: self.on_job_output(job))
+        process.finished.connect(
+            lambda exit_code, exit_status, job=job: self.on_job_finished(job, exit_code, exit_status))
+        process.errorOccurred.connect(lambda error, job=job: self.on_job_error(job, error))
+        
+        job.process = process
+        job.status = 'running'
+        job.start_time = time.time()
+        self.update_job_row(job)
+        
+        job.log_view.appendPlainText(f"执行命令: \"{interpreter}\" {' '.join(args)}")
+        self.log_text.append(f"开始打包: {job.name}")
+        job.phase_timer = PhaseTimer()
+        process.start(interpreter, args)
+        if process.waitForStarted(5000):
+            job.sampler = ProcessTreeSampler(process.processId())
+            job.sampler.start()
+    
+    def on_job_output(self, job):
+        """追加任务输出到该任务的日志页"""
+        data = job.decoder.decode(job.process.readAllStandardOutput().data())
+        # 输出可能在行中间断开，只把完整的行交给日志页和阶段计时
+        lines = (job.pending_line + data).split('\n')
+        job.pending_line = lines.pop()
+        for line in lines:
+            self.append_job_line(job, line.rstrip('\r'))
+    
+    def append_job_line(self, job, line):
+        """一行完整的输出：写入日志页并交给阶段计时"""
+        job.log_view.appendPlainText(line)
+        if job.phase_timer:
+            job.phase_timer.feed(line)
+    
+    def flush_job_output(self, job):
+        """进程结束后输出最后一段没有换行的内容"""
+        tail = job.pending_line + job.decoder.decode(b'', final=True)
+        job.pending_line = ''
+        if tail:
+            self.append_job_line(job, tail.rstrip('\r'))
+    
+    def on_job_error(self, job, error):
+        """进程无法启动时不会发出finished信号，按失败处理"""
+        if error == QProcess.FailedToStart:
+            job.log_view.appendPlainText(f"进程启动失败: {job.process.errorString()}")
+            self.on_job_finished(job, -1, QProcess.CrashExit)
+    
+    def on_job_finished(self, job, exit_code, exit_status):
+        """任务结束：更新状态并启动下一个排队的任务"""
+        if (job.finished and job.status != 'cancelled') or job.smoke_thread is not None:
+            return
+        if job.process:
+            self.on_job_output(job)
+            self.flush_job_output(job)
+        if job.status != 'cancelled':
+            job.status = 'ok' if exit_code == 0 and exit_status == QProcess.NormalExit else 'failed'
+        job.elapsed = time.time() - job.start_time
+        
+        # 阶段用时和资源占用（取消的任务不记录）
+        if job.phase_timer and job.status != 'cancelled':
+            stats = {'phases': job.phase_timer.finish(), 'resources': job.sampler.stop() if job.sampler else None}
+            scripts = [script for script, _ in job.entries] if job.entries else [job.script_path]
+            report_build(job.name, scripts, exit_code if exit_status == QProcess.NormalExit else -1, False,
+                         job.elapsed, stats, job.command, job.log_view.appendPlainText)
+        elif job.sampler:
+            job.sampler.stop()
+        
+        options = self.get_job_options(job)
+        if job.status == 'ok' and options['persistent'] and not job.entries:
+            self.install_persistent_job(job)
+        
+        # 裁剪后冒烟运行（最长60秒）在后台线程中进行，完成后再结束任务，无法运行的输出按失败处理
+        if job.status == 'ok' and job.pruned and job.artifact:
+            _, spec_dir = self.get_job_dirs(job.name)
+            onedir = not options['one_file'] or options['persistent']
+            args = (job.profile, get_profile_path(spec_dir, job.name),
+                    get_executable_path(job.artifact, job.name, onedir, self.build_probe), job.artifact, True)
+            job.status = 'smoke'
+            self.update_job_row(job)
+            job.smoke_thread = CallThread(lambda: check_pruned_build(*args, timeout=60),
+                                          lambda e: (False, [f"冒烟运行失败: {e}"]), self)
+            job.smoke_thread.done.connect(lambda result, job=job: self.on_job_smoke_finished(job, result))
+            job.smoke_thread.start()
+            return
+        self.finish_job(job)
+    
+    def on_job_smoke_finished(self, job, result):
+        """冒烟运行结束：输出结果后结束任务（冒烟期间被取消的任务保持取消状态）"""
+        smoke_ok, lines = result
+        for line in lines:
+            job.log_view.appendPlainText(line)
+        if job.status == 'smoke':
+            job.status = 'ok' if smoke_ok else 'failed'
+        job.smoke_thread.deleteLater()
+        job.smoke_thread = None
+        self.finish_job(job)
+    
+    def finish_job(self, job):
+        """记录任务结果并启动下一个排队的任务"""
+        self.update_job_row(job)
+        
+        result = {'ok': '打包成功', 'failed': '打包失败，请检查该任务的日志', 'cancelled': '已取消'}[job.status]
+        job.log_view.appendPlainText(f"\n{job.name} {result} ({job.elapsed:.1f}s)")
+        self.log_text.append(f"{job.name} {result} ({job.elapsed:.1f}s)")
+        
+        if job.status == 'ok' and job.exclude_report and job.artifact:
+            job.log_view.appendPlainText(
+                format_build_change(load_build_manifest().get(job.name), job.artifact, job.elapsed).strip())
+        if job.status == 'ok' and job.build_key:
+            record_build(job.name, job.build_key, job.artifact, job.elapsed)
+        if job.status == 'ok' and job.env_fingerprint:
+            work_dir, _ = self.get_job_dirs(job.name)
+            job.saved = save_env_fingerprint(work_dir, job.env_fingerprint, job.elapsed, job.clean)
+            if job.saved > 0:
+                job.log_view.appendPlainText(f"增量构建比上次清理构建节省约 {job.saved:.1f}s")
+        
+        if job.process:
+            job.process.deleteLater()
+            job.process = None
+        
+        self.start_next_jobs()
+    
+    def install_persistent_job(self, job):
+        """持久解压：把目录模式的输出安装到运行目录并生成启动器"""
+        work_dir, _ = self.get_job_dirs(job.name)
+        output_dir = self.get_output_dir()
+        try:
+            version_dir, reused, removed = install_persistent(
+                os.path.join(work_dir, PERSISTENT_STAGING_DIR, job.name), get_runtime_root(output_dir, self.config),
+                job.name, self.config.get('persistent_keep_versions', 2))
+            launcher = write_launcher(output_dir, job.name, version_dir, self.build_probe)
+        except OSError as e:
+            job.log_view.appendPlainText(f"持久解压安装失败: {e}")
+            job.status = 'failed'
+            return
+        job.artifact = version_dir
+        job.log_view.appendPlainText(f"持久解压: {launcher} -> {version_dir}"
+                                     + ("（内容未变，复用已有版本）" if reused else "")
+                                     + (f"，清理旧版本 {removed} 个" if removed else ""))
+    
+    def cancel_job(self, job, check_finished=True):
+        """取消单个任务：排队中直接移出队列，运行中则终止进程"""
+        if job.finished:
+            return
+        if job.status == 'queued':
+            job.status = 'cancelled'
+            self.update_job_row(job)
+            self.log_text.append(f"{job.name} 已取消")
+        else:
+            # 进程结束（冒烟运行中的任务则是冒烟运行结束）后再收尾
+            job.status = 'cancelled'
+            job.process.kill()
+        if check_finished:
+            self.check_queue_finished()
+    
+    def check_queue_finished(self):
+        """队列中所有任务都结束后恢复界面状态"""
+        if not self.is_packaging or not all(job.finished for job in self.jobs):
+            return
+        # 被取消的运行中任务要等进程真正退出
+        if any(job.process for job in self.jobs):
+            return
         
-        # 设置日志标签为绿色（进行中）
-        self.highlight_log_tab(True, color='green')
+        self.job_timer.stop()
+        ok_count = sum(1 for job in self.jobs if job.status == 'ok')
+        cached_count = sum(1 for job in self.jobs if job.status == 'cached')
+        failed_count = sum(1 for job in self.jobs if job.status == 'failed')
+        cancelled_count = sum(1 for job in self.jobs if job.status == 'cancelled')
+        self.log_text.append(f"\n所有打包任务已完成！成功 {ok_count} 个，缓存 {cached_count} 个，"
+                             f"失败 {failed_count} 个，取消 {cancelled_count} 个")
+        saved_total = sum(job.saved for job in self.jobs)
+        self.log_text.append(f"清理策略: {self.package_options['clean_policy']}"
+                             + (f"，增量构建共节省约 {saved_total:.1f}s" if saved_total > 0 else ""))
+        
+        # 添加打开输出目录按钮
+        if (ok_count or cached_count) and self.package_options.get('output_dir') and os.path.exists(self.package_options['output_dir']):
+            self.add_open_output_dir_button()
+        
+        # 打包完成后高亮日志标签页（蓝色），提醒用户查看
+        self.log_needs_attention = True
+        self.is_packaging = False
+        self.highlight_log_tab(True, color='blue')
         
-        self.process.start(cmd)
+        # 恢复按钮状态
+        self.stop_btn.hide()
+        self.package_btn.show()
     
     def highlight_log_tab(self, active=True, color='blue'):
         """高亮或取消高亮日志标签页
@@ -1470,46 +2628,6 @@ class PythonPackager(QMainWindow):
             self.tabs.setTabText(self.log_tab_index, "打包日志")
             self.tabs.tabBar().setTabTextColor(self.log_tab_index, Qt.black)
     
-    def on_package_finished(self, exit_code, exit_status):
-        """单个脚本打包完成后的处理"""
-        script_path = self.scripts_to_package[self.current_script_index]
-        script_name = os.path.basename(script_path)
-        
-        if exit_code == 0:
-            self.log_text.append(f"\n{script_name} 打包成功！")
-        else:
-            self.log_text.append(f"\n{script_name} 打包失败，请检查错误信息")
-        
-        # 增加索引，准备打包下一个脚本
-        self.current_script_index += 1
-        
-        # 如果是打包所有脚本模式且还有脚本未打包，则继续打包下一个
-        if self.package_all and self.current_script_index < len(self.scripts_to_package):
-            self.package_next_script()
-        else:
-            if self.current_script_index >= len(self.scripts_to_package):
-                self.log_text.append("\n所有打包任务已完成！")
-                
-                # 添加打开输出目录按钮
-                if self.package_options.get('output_dir') and os.path.exists(self.package_options['output_dir']):
-                    self.add_open_output_dir_button()
-            elif not self.package_all:
-                # 单脚本模式只打包第一个
-                self.log_text.append("\n打包任务已完成！")
-                
-                # 添加打开输出目录按钮
-                if self.package_options.get('output_dir') and os.path.exists(self.package_options['output_dir']):
-                    self.add_open_output_dir_button()
-            
-            # 打包完成后高亮日志标签页（蓝色），提醒用户查看
-            self.log_needs_attention = True
-            self.is_packaging = False  # 设置打包状态为False
-            self.highlight_log_tab(True, color='blue')
-            
-            # 恢复按钮状态
-            self.stop_btn.hide()
-            self.package_btn.show()
-    
     def add_open_output_dir_button(self):
         """添加打开输出目录按钮"""
         # 创建一个水平布局，放在日志标签页下方
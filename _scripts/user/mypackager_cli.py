@@ -26,6 +26,38 @@ Python脚本打包器 - 命令行版本
     # 使用目录模式而非单文件
     python .pyscript/mypackager_cli.py script.py --onedir
     
+    # 同时打包4个脚本（默认按CPU核数和可用内存自动决定并发数）
+    python .pyscript/mypackager_cli.py tools/*.py -j 4
+    
+    # 忽略构建缓存，强制重新打包
+    python .pyscript/mypackager_cli.py tools/*.py --force
+    
+    # 共享打包：所有脚本打成一个目录（多个exe共享同一份依赖,只启动一次PyInstaller）
+    python .pyscript/mypackager_cli.py tools/*.py --shared-bundle mytools
+    
+    # 自动排除入口脚本用不到的模块（--keep-module 保留被误排除的模块）
+    python .pyscript/mypackager_cli.py script.py --auto-exclude --keep-module matplotlib
+    
+    # 记录一次真实运行加载的模块,之后打包时裁剪从未加载的模块
+    python .pyscript/mypackager_cli.py script.py --profile --smoke-args="--version"
+    python .pyscript/mypackager_cli.py script.py --prune
+    
+    # 持久解压：只在打包时解压一次到 dist/_runtime/<名称>-<哈希>/,dist/<名称> 为启动器
+    python .pyscript/mypackager_cli.py tool.py --persistent
+    
+    # 测试已打包程序的启动用时、峰值内存和大小（冷启动1次 + 热启动5次）
+    python .pyscript/mypackager_cli.py tools/*.py --bench --bench-runs 5
+    
+    # 按 .config/mypackager_targets.json（或.toml）中的目标和依赖关系打包
+    python .pyscript/mypackager_cli.py --build -j 4
+    python .pyscript/mypackager_cli.py --build server
+    
+    # 常驻打包进程：启动后的打包不再每次启动解释器、导入PyInstaller（Linux/macOS）
+    python .pyscript/mypackager_cli.py --worker-start
+    python .pyscript/mypackager_cli.py tools/*.py
+    python .pyscript/mypackager_cli.py --worker-status
+    python .pyscript/mypackager_cli.py --worker-stop
+    
     # 查看帮助
     python .pyscript/mypackager_cli.py --help
 
@@ -34,14 +66,68 @@ Python脚本打包器 - 命令行版本
     - 默认输出目录: dist
     - 默认构建目录: .misc/.build/build
     - 默认spec目录: .misc/.build/spec
+    - 每个脚本使用独立的 <构建目录>/<名称>、<spec目录>/<名称> 和PyInstaller缓存目录,
+      并发打包时互不干扰；完整日志写入 <构建目录>/<名称>/build.log
+    - 构建缓存: .misc/.build/build_manifest.json 记录每个目标的构建键,
+      构建键 = 脚本及其递归引用的本地模块内容 + 解释器版本 + 已安装的分发包版本
+      + PyInstaller版本 + 实际使用的PyInstaller参数；键未变且输出文件完好（大小/mtime一致）时跳过打包
+    - 清理策略（default_clean / --clean-policy）: always=每次--clean, never=从不清理,
+      auto（默认）=只有解释器、已安装包或PyInstaller参数变化时才清理,
+      只改了入口脚本或本地模块时复用构建目录中的分析缓存；环境指纹保存在 <构建目录>/<名称>/env_fingerprint.json
+    - 共享打包（--shared-bundle 名称）: 生成一个spec,每个脚本一个Analysis和一个EXE（exclude_binaries）,
+      由同一个COLLECT收集到 <输出目录>/<名称>/ 下,公共的依赖库和数据只收集一份
+      （每个入口仍各自分析一遍,只是在同一个PyInstaller进程中；输出只能是目录形式,忽略 --onefile）
+    - 自动排除（auto_exclude / --auto-exclude）: 静态分析入口脚本及本地模块的import,
+      从直接导入的分发包出发沿Requires-Dist找出需要的包,其余已安装的第三方包和
+      内置黑名单（tkinter、unittest、test等）作为 --exclude-module 传给PyInstaller；
+      auto_exclude_keep 按脚本文件名（"*"表示所有脚本）配置需要保留的模块,例如
+      {"main.py": ["matplotlib"], "*": ["unittest"]}
+    - 运行记录裁剪（--profile / --prune）: --profile 用目标解释器运行脚本（--smoke-args 为冒烟参数）,
+      退出时记录 sys.modules,保存为 <spec目录>/<名称>/<名称>.modules.json；
+      --prune（或配置 trace_prune）打包时把上次构建中收集了、但冒烟运行从未加载的顶层模块排除,
+      PyInstaller启动必需的模块、运行时钩子导入的模块和保留模块不会被排除；
+      打包后运行输出的可执行文件做冒烟测试,并与未裁剪的构建比较大小和启动用时
+    - 启动测试（--bench）: 对已打包的单文件/目录输出各做1次冷启动（Linux/macOS上先把输出文件从
+      页缓存中清出）和N次热启动,参数为 --smoke-args（默认 --help）,记录退出用时、峰值内存和大小,
+      追加到 .misc/.build/bench_history.json,与上一次同模式的结果比较,变慢或变大超过10%时提示
+    - 持久解压（--persistent / persistent_extract）: 单文件程序每次启动都要解压到新的临时目录,
+      这里改为以目录模式构建,按内容哈希安装到 <运行目录>/<名称>-<哈希>/（默认 <输出目录>/_runtime,
+      配置 persistent_runtime_dir）,<输出目录>/<名称>（Windows为 <名称>.cmd）是直接执行它的启动器；
+      哈希相同的版本直接复用,旧版本只保留最近的 persistent_keep_versions 个（默认2个,
+      避免删除正在运行的版本）；分发时需要连同运行目录一起复制
+    - 构建报告: 按PyInstaller日志中的 "checking Analysis/PYZ/PKG/EXE/COLLECT" 等行拆分各阶段用时,
+      运行期间每0.2秒采样PyInstaller进程树的CPU时间和内存（有psutil时用psutil,Linux上读/proc）,
+      每个任务结束时显示阶段耗时,并写入 .misc/.build/reports/<名称>-<时间>.json（每个目标保留最近20份）
+    - 常驻打包进程（--worker-start/--worker-stop/--worker-status）: 在目标解释器中常驻一个已导入
+      PyInstaller及其构建模块的进程,通过本地套接字（multiprocessing.connection,随机密钥认证,
+      密钥保存在 .misc/.build/worker/<键>.json,权限0600）接收打包任务,每个任务从它fork一个新的子进程
+      执行 PyInstaller.__main__.run(),输出逐行发回；运行时打包自动使用（--no-worker 关闭）,
+      也不再单独启动进程检查PyInstaller；需要fork,Windows上仍使用独立进程
+    - 打包清单（--build）: .config/mypackager_targets.toml（需要Python 3.11+或tomli）或
+      .config/mypackager_targets.json,在 targets 下声明每个目标的 script、name、icon、onefile、console、
+      add_data、hidden_imports、extra_args 和 depends_on（GUI版本也读取同一份清单）；
+      按依赖关系排序,互不依赖的目标并发打包,未变化的目标由构建缓存跳过,依赖重新打包后强制重新打包,
+      依赖失败的目标跳过；进度写入 .misc/.build/build_state.json,中断后再次运行时继续
 """
 
 import sys
 import os
+import re
 import argparse
 import subprocess
 import json
 import glob
+import ast
+import time
+import shlex
+import shutil
+import signal
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
 
 # ==================== 配置常量 ====================
 
@@ -53,9 +139,15 @@ DEFAULT_CONFIG = {
     "build_spec_dir": ".misc/.build/spec",
     "default_onefile": True,
     "default_console": False,  # CLI版本默认不显示控制台
-    "default_clean": True,
+    "default_clean": "auto",  # auto/always/never（兼容旧配置的True/False）
     "extra_data": "",
     "extra_args": "",
+    "auto_exclude": False,  # 自动排除入口脚本用不到的模块
+    "auto_exclude_keep": {},  # {脚本文件名或"*": [不排除的模块, ...]}
+    "trace_prune": False,  # 按 --profile 的运行记录裁剪从未加载的模块
+    "persistent_extract": False,  # 单文件改为持久解压（目录模式 + 启动器）
+    "persistent_runtime_dir": "",  # 持久解压的运行目录（留空为 <输出目录>/_runtime）
+    "persistent_keep_versions": 2,  # 每个程序保留的版本数
     "venv_search_dirs": [
         ".misc/.venv",
         ".misc/venv",
@@ -66,8 +158,283 @@ DEFAULT_CONFIG = {
     ],
 }
 
+# 每个PyInstaller进程大约占用的内存（用于估算默认并发数）
+JOB_MEMORY_BYTES = int(1.5 * 1024 ** 3)
+
+# 构建缓存清单和解释器信息缓存
+BUILD_MANIFEST_FILE = '.misc/.build/build_manifest.json'
+PROBE_CACHE_FILE = '.misc/.build/interpreter_probe.json'
+
+# 不影响输出结果的PyInstaller参数（不计入构建键）
+KEY_IGNORED_ARGS = ('--clean', '--noconfirm', '-y')
+
+# 清理策略
+CLEAN_POLICIES = ('auto', 'always', 'never')
+ENV_FINGERPRINT_FILE = 'env_fingerprint.json'
+
+# 自动排除时总是排除的标准库模块（入口脚本或本地模块直接导入时除外）
+AUTO_EXCLUDE_DENYLIST = ('tkinter', '_tkinter', 'turtle', 'turtledemo', 'idlelib', 'unittest', 'test',
+                         'lib2to3', 'pydoc_data', 'ensurepip', 'venv', 'distutils')
+# 分发包文件中的import语句（只按行首匹配,条件导入也计入,宁可多保留）
+IMPORT_LINE_PATTERN = re.compile(
+    rb'^[ \t]*(?:from[ \t]+(\w+)|import[ \t]+([\w.]+(?:[ \t]*,[ \t]*[\w.]+)*))', re.MULTILINE)
+# PyInstaller及其钩子运行时需要的分发包,不参与自动排除
+AUTO_EXCLUDE_PROTECTED = ('pyinstaller', 'pyinstaller-hooks-contrib', 'altgraph', 'pefile', 'macholib',
+                          'pywin32-ctypes', 'setuptools', 'packaging', 'importlib-metadata', 'zipp')
+
+# 运行记录文件的后缀（保存在spec目录中）
+PROFILE_SUFFIX = '.modules.json'
+# 裁剪时不排除的模块：PyInstaller打包进base_library.zip的启动模块及其常用依赖
+PRUNE_SAFE_MODULES = ('_collections_abc', '_weakrefset', 'abc', 'codecs', 'collections', 'copyreg', 'encodings',
+                      'enum', 'functools', 'genericpath', 'io', 'heapq', 'keyword', 'linecache', 'locale',
+                      'ntpath', 'operator', 'os', 'posixpath', 're', 'reprlib', 'sre_compile', 'sre_constants',
+                      'sre_parse', 'stat', 'traceback', 'types', 'warnings', 'weakref', 'struct', 'zipimport',
+                      'importlib', 'inspect', 'pkgutil', 'marshal', 'zlib', 'tokenize', 'token', 'ast',
+                      'contextlib', 'dis', 'opcode', 'threading', 'signal', 'pathlib', 'fnmatch')
+
+# 在目标解释器中运行脚本,退出时把 sys.modules 写入文件（argv: 输出文件 脚本 [参数...]）
+PROFILE_CODE = r"""
+import os, sys, json, atexit, runpy
+out, script = sys.argv[1], os.path.abspath(sys.argv[2])
+sys.argv = sys.argv[2:]
+sys.path[0] = os.path.dirname(script)
+
+def dump():
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(sorted(sys.modules), f)
+
+atexit.register(dump)
+runpy.run_path(script, run_name='__main__')
+"""
+
+# 启动测试历史（每个目标保留最近的记录数）
+BENCH_HISTORY_FILE = '.misc/.build/bench_history.json'
+BENCH_HISTORY_LIMIT = 50
+# 与上一次相比变化超过该比例时提示回归
+BENCH_REGRESSION_RATIO = 0.10
+
+# 持久解压：构建目录中的暂存输出、默认运行目录和启动器中的标记
+PERSISTENT_STAGING_DIR = 'persistent-dist'
+PERSISTENT_RUNTIME_DIR = '_runtime'
+LAUNCHER_MARKER = 'mypackager-runtime:'
+
+# 构建报告目录和每个目标保留的报告数
+REPORTS_DIR = '.misc/.build/reports'
+REPORTS_LIMIT = 20
+# 进程树采样间隔（秒）
+SAMPLE_INTERVAL = 0.2
+# 启动测试的内存采样间隔（秒,被测进程通常只运行零点几秒）
+BENCH_SAMPLE_INTERVAL = 0.01
+# PyInstaller日志中的阶段标记：(正则, 阶段名)
+PHASE_PATTERNS = [
+    (re.compile(r'INFO: checking (Analysis|PYZ|PKG|EXE|COLLECT|MERGE|BUNDLE)\b'), None),
+    # 只匹配实际执行upx的命令行（PyInstaller 6不再以INFO输出,压缩时间计入所在阶段）,
+    # 不匹配启动时的"UPX is not available."等提示
+    (re.compile(r'INFO: Executing - (?:.*[/\\])?upx(?:\.exe)?\s', re.IGNORECASE), 'UPX'),
+    (re.compile(r'INFO: Build complete!'), '完成'),
+]
+LOG_TIME_PATTERN = re.compile(r'^(\d+) (?:DEBUG|INFO|WARNING|ERROR|CRITICAL|DEPRECATION):')
+
+# 解释器信息的格式版本（PROBE_CODE输出变化时递增,旧缓存自动失效）
+PROBE_VERSION = 2
+
+# 在目标解释器中执行，输出版本、平台、已安装分发包（及其顶层模块和依赖）和site-packages目录
+PROBE_CODE = r"""
+import re, sys, json, site, platform, sysconfig
+try:
+    from importlib import metadata
+except ImportError:
+    import importlib_metadata as metadata
+
+def normalize(name):
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+def top_level_names(dist):
+    text = dist.read_text('top_level.txt')
+    if text:
+        return sorted({line.strip().split('/')[0] for line in text.splitlines() if line.strip()})
+    names = set()
+    for f in dist.files or []:
+        parts = f.parts
+        if not parts or parts[0] in ('..', '__pycache__') or parts[0].endswith(('.dist-info', '.egg-info', '.data')):
+            continue
+        if len(parts) > 1:
+            names.add(parts[0])
+        elif parts[0].endswith(('.py', '.so', '.pyd')):
+            names.add(parts[0].split('.')[0])
+    return sorted(names)
+
+dists, top_levels, requires = {}, {}, {}
+for dist in metadata.distributions():
+    name = dist.metadata['Name']
+    if name:
+        dists[name.lower()] = dist.version
+        key = normalize(name)
+        top_levels[key] = top_level_names(dist)
+        requires[key] = sorted({normalize(re.match(r'[A-Za-z0-9._-]+', req).group())
+                                for req in dist.requires or [] if 'extra' not in req.partition(';')[2]})
+try:
+    import PyInstaller
+    pyinstaller = PyInstaller.__version__
+except Exception:
+    pyinstaller = None
+paths = site.getsitepackages() if hasattr(site, 'getsitepackages') else []
+print(json.dumps({
+    'executable': sys.executable,
+    'version': '.'.join(str(v) for v in sys.version_info[:3]),
+    'implementation': sys.implementation.name,
+    'platform': sys.platform,
+    'machine': platform.machine(),
+    'pyinstaller': pyinstaller,
+    'distributions': dists,
+    'top_levels': top_levels,
+    'requires': requires,
+    'stdlib': sysconfig.get_paths()['stdlib'],
+    'site_packages': [p for p in paths + [site.getusersitepackages()] if p],
+}))
+"""
+
+# 常驻打包进程的状态目录（状态文件含连接密钥,权限0600）和启动等待时间（秒）
+WORKER_DIR = '.misc/.build/worker'
+WORKER_START_TIMEOUT = 60
+
+# 在目标解释器中常驻运行（argv: 监听地址；stdin第一行: 十六进制密钥）：
+# 预先导入PyInstaller和构建模块,每个打包任务从这个已导入的进程fork出子进程执行 PyInstaller.__main__.run(),
+# 子进程换用客户端的环境变量（PYTHONPATH同时更新sys.path）,把输出逐行发回客户端,最后发送退出码
+WORKER_CODE = r"""
+import os, sys, time, signal, threading, traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+import PyInstaller
+import PyInstaller.__main__
+import PyInstaller.building.build_main
+import PyInstaller.depend.analysis
+
+address = sys.argv[1]
+authkey = bytes.fromhex(sys.stdin.readline().strip())
+started = time.time()
+children = set()
+builds = 0
+
+def reap(signum, frame):
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            break
+        children.discard(pid)
+
+def run_job(conn, job):
+    # 无论哪一步出错都必须退出,不能回到上面的accept循环里成为第二个常驻进程
+    code = 1
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGCHLD])
+        os.setpgid(0, 0)
+        os.chdir(job['cwd'])
+        old_paths = [p for p in os.environ.get('PYTHONPATH', '').split(os.pathsep) if p]
+        new_paths = [p for p in job['env'].get('PYTHONPATH', '').split(os.pathsep) if p]
+        sys.path[1:] = new_paths + [p for p in sys.path[1:] if p not in old_paths]
+        os.environ.clear()
+        os.environ.update(job['env'])
+        conn.send(('pid', os.getpid()))
+        read_fd, write_fd = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(write_fd, 1)
+        os.dup2(write_fd, 2)
+        os.close(write_fd)
+
+        def forward():
+            try:
+                with os.fdopen(read_fd, 'r', encoding='utf-8', errors='replace') as f:
+                    for line in f:
+                        conn.send(('line', line.rstrip('\n')))
+            except (OSError, ValueError):
+                # 客户端已断开：终止整个任务,否则PyInstaller写满管道后会一直阻塞
+                os.killpg(os.getpid(), signal.SIGKILL)
+
+        forwarder = threading.Thread(target=forward, daemon=True)
+        forwarder.start()
+        code = 0
+        try:
+            PyInstaller.__main__.run(job['args'])
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                code = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.close(1)
+        os.close(2)
+        forwarder.join()
+        conn.send(('exit', code))
+        conn.close()
+    finally:
+        os._exit(code)
+
+signal.signal(signal.SIGCHLD, reap)
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+listener = Listener(address, 'AF_UNIX', authkey=authkey)
+print(f'worker {os.getpid()} listening on {address}', flush=True)
+try:
+    while True:
+        try:
+            conn = listener.accept()
+            message = conn.recv()
+        except (OSError, EOFError, AuthenticationError):
+            continue
+        try:
+            if message[0] == 'ping':
+                conn.send(('pong', {'pid': os.getpid(), 'pyinstaller': PyInstaller.__version__,
+                                    'python': sys.version.split()[0], 'running': len(children),
+                                    'builds': builds, 'uptime': time.time() - started}))
+            elif message[0] == 'stop':
+                conn.send(('bye', None))
+                break
+            elif message[0] == 'build':
+                # fork期间屏蔽SIGCHLD,保证子进程先记入children再被回收
+                signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGCHLD])
+                try:
+                    pid = os.fork()
+                    if pid == 0:
+                        run_job(conn, message[1])
+                    children.add(pid)
+                    builds += 1
+                finally:
+                    signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGCHLD])
+        except (OSError, EOFError):
+            pass
+        finally:
+            conn.close()
+finally:
+    listener.close()
+"""
+
+# 打包清单（TOML需要Python 3.11+或tomli,两者都存在时优先TOML）和按清单构建的进度
+TARGETS_FILE = '.config/mypackager_targets.json'
+TARGETS_TOML_FILE = '.config/mypackager_targets.toml'
+TARGET_KEYS = ('script', 'name', 'icon', 'onefile', 'console', 'add_data', 'hidden_imports', 'extra_args',
+               'depends_on')
+BUILD_STATE_FILE = '.misc/.build/build_state.json'
+
 # ==================== 配置常量结束 ====================
 
+# 并发打包时串行化控制台输出,避免行交错
+_print_lock = threading.Lock()
+# 正在运行的打包进程（Ctrl+C时统一终止）
+_running_procs = set()
+# 各解释器的常驻打包进程状态（本次运行中只检查一次）
+_worker_cache = {}
+
 
 def load_config(config_path=None):
     """读取配置文件"""
@@ -126,6 +493,1334 @@ def check_pyinstaller(interpreter):
         return False
 
 
+def _dir_stamps(paths):
+    """目录的mtime（安装/卸载包会在site-packages中增删dist-info目录,目录mtime随之变化）"""
+    stamps = {}
+    for path in paths:
+        try:
+            stamps[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            stamps[path] = None
+    return stamps
+
+
+def probe_interpreter(interpreter, cache_file=PROBE_CACHE_FILE, refresh=False):
+    """
+    获取解释器的版本、已安装分发包和PyInstaller版本
+    
+    结果按解释器路径缓存到磁盘,解释器文件和site-packages目录都未变化时直接使用缓存,不启动子进程
+    
+    Returns:
+        信息字典,失败时返回None
+    """
+    key = os.path.normcase(os.path.abspath(interpreter))
+    cache = {}
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+    
+    entry = cache.get(key)
+    if entry and entry.get('probe_version') == PROBE_VERSION and not refresh:
+        stamps = _dir_stamps(entry['info']['site_packages'] + [interpreter])
+        if stamps == entry['stamps']:
+            return entry['info']
+    
+    try:
+        result = subprocess.run([interpreter, '-c', PROBE_CODE], capture_output=True, text=True, timeout=60)
+        if result.returncode != 0:
+            return None
+        info = json.loads(result.stdout.strip().splitlines()[-1])
+    except Exception:
+        return None
+    
+    cache[key] = {'probe_version': PROBE_VERSION, 'stamps': _dir_stamps(info['site_packages'] + [interpreter]),
+                  'info': info}
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+    except OSError:
+        pass
+    return info
+
+
+def _resolve_module(module, search_dirs):
+    """在搜索目录中查找模块对应的本地文件（模块.py 或 包/__init__.py）"""
+    parts = module.split('.')
+    for base in search_dirs:
+        path = os.path.join(base, *parts)
+        for candidate in (path + '.py', os.path.join(path, '__init__.py')):
+            if os.path.isfile(candidate):
+                # 包的各级__init__.py也会被导入
+                files = [candidate]
+                for i in range(1, len(parts)):
+                    init = os.path.join(base, *parts[:i], '__init__.py')
+                    if os.path.isfile(init):
+                        files.append(init)
+                return files
+    return []
+
+
+def find_local_imports(script_path, search_dirs=None):
+    """
+    递归查找脚本引用的本地模块文件（只解析AST,不执行代码）
+    
+    Args:
+        search_dirs: 本地模块的搜索目录,默认为脚本所在目录和当前工作目录
+    
+    Returns:
+        排序后的绝对路径列表（不含脚本本身）
+    """
+    script_path = os.path.abspath(script_path)
+    if search_dirs is None:
+        search_dirs = [os.path.dirname(script_path), os.getcwd()]
+    search_dirs = [os.path.abspath(d) for d in search_dirs]
+    
+    found = set()
+    pending = [script_path]
+    while pending:
+        path = pending.pop()
+        try:
+            with open(path, 'rb') as f:
+                tree = ast.parse(f.read(), filename=path)
+        except (OSError, SyntaxError, ValueError):
+            continue
+        
+        for node in ast.walk(tree):
+            modules = []
+            if isinstance(node, ast.Import):
+                modules = [(n.name, [os.path.dirname(path)] + search_dirs) for n in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                if node.level:
+                    # 相对导入：从当前文件所在包向上level-1级
+                    base = os.path.dirname(path)
+                    for _ in range(node.level - 1):
+                        base = os.path.dirname(base)
+                    dirs = [base]
+                else:
+                    dirs = [os.path.dirname(path)] + search_dirs
+                prefix = node.module or ''
+                modules = [(prefix, dirs)] if prefix else []
+                # from pkg import mod 中的mod也可能是子模块
+                for n in node.names:
+                    modules.append((f'{prefix}.{n.name}' if prefix else n.name, dirs))
+            
+            for module, dirs in modules:
+                for file_path in _resolve_module(module, dirs):
+                    file_path = os.path.abspath(file_path)
+                    if file_path != script_path and file_path not in found:
+                        found.add(file_path)
+                        pending.append(file_path)
+    return sorted(found)
+
+
+def find_imported_modules(script_path):
+    """
+    脚本及其本地模块中导入的所有顶层模块名（只解析AST）
+    
+    函数内、try块中的import和 importlib.import_module/__import__ 的字符串参数都计入
+    """
+    names = set()
+    for path in [os.path.abspath(script_path)] + find_local_imports(script_path):
+        try:
+            with open(path, 'rb') as f:
+                tree = ast.parse(f.read(), filename=path)
+        except (OSError, SyntaxError, ValueError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.update(n.name.split('.')[0] for n in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                if not node.level and node.module:
+                    names.add(node.module.split('.')[0])
+            elif isinstance(node, ast.Call) and node.args:
+                func = node.func
+                func_name = func.attr if isinstance(func, ast.Attribute) else getattr(func, 'id', None)
+                arg = node.args[0]
+                if (func_name in ('import_module', '__import__') and isinstance(arg, ast.Constant)
+                        and isinstance(arg.value, str) and not arg.value.startswith('.')):
+                    names.add(arg.value.split('.')[0])
+    return names
+
+
+def get_keep_modules(config, script_path, extra=None):
+    """脚本的保留模块：配置中该脚本和"*"的列表 + 命令行 --keep-module"""
+    keep_config = config.get('auto_exclude_keep') or {}
+    keep = set(keep_config.get('*', [])) | set(keep_config.get(os.path.basename(script_path), []))
+    return keep | set(extra or [])
+
+
+def _module_size(name, search_dirs):
+    """模块在磁盘上的大小和.py文件数（包目录或 模块.py/模块.*.so/模块.*.pyd）"""
+    size = files = 0
+    for base in search_dirs:
+        package = os.path.join(base, name)
+        if os.path.isdir(package):
+            for root, dirs, filenames in os.walk(package):
+                dirs[:] = [d for d in dirs if d != '__pycache__']
+                for filename in filenames:
+                    try:
+                        size += os.path.getsize(os.path.join(root, filename))
+                    except OSError:
+                        pass
+                    files += filename.endswith('.py')
+            return size, files
+        for pattern in (f'{name}.py', f'{name}.*.so', f'{name}.*.pyd', f'{name}.pyd', f'{name}.so'):
+            for path in glob.glob(os.path.join(glob.escape(base), pattern)):
+                size += os.path.getsize(path)
+                files += path.endswith('.py')
+        if size:
+            return size, files
+    return size, files
+
+
+def load_collected_toc(work_dir):
+    """
+    读取上一次构建的Analysis TOC,返回 [(模块名, 文件路径, 类型), ...]（没有时返回None）
+    
+    TOC是PyInstaller写入构建目录的Python字面量,其中收集的模块、扩展和数据都是三元组
+    """
+    paths = glob.glob(os.path.join(glob.escape(work_dir), 'Analysis-*.toc'))
+    paths += glob.glob(os.path.join(glob.escape(work_dir), '*', 'Analysis-*.toc'))
+    if not paths:
+        return None
+    entries = []
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = ast.literal_eval(f.read())
+        except (OSError, SyntaxError, ValueError):
+            continue
+        pending = [data]
+        while pending:
+            item = pending.pop()
+            if isinstance(item, (list, tuple)):
+                if (len(item) == 3 and all(isinstance(v, str) for v in item)
+                        and item[2] in ('PYMODULE', 'EXTENSION', 'BINARY', 'DATA')):
+                    entries.append(item)
+                else:
+                    pending.extend(item)
+    return entries
+
+
+# {(模块路径, mtime): 导入的顶层模块集合}（同一进程中多次打包时不重复读取文件）
+_module_imports_cache = {}
+
+
+def _scan_module_imports(path):
+    """模块（包目录或单个.py文件）中所有import语句导入的顶层模块"""
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return set()
+    if key in _module_imports_cache:
+        return _module_imports_cache[key]
+    
+    if os.path.isdir(path):
+        files = []
+        for root, dirs, filenames in os.walk(path):
+            dirs[:] = [d for d in dirs if d != '__pycache__']
+            files.extend(os.path.join(root, f) for f in filenames if f.endswith('.py'))
+    else:
+        files = [path]
+    names = set()
+    for file_path in files:
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        for from_name, import_names in IMPORT_LINE_PATTERN.findall(data):
+            if from_name:
+                names.add(from_name.decode('ascii', 'replace'))
+            else:
+                names.update(n.strip().split(b'.')[0].decode('ascii', 'replace') for n in import_names.split(b','))
+    _module_imports_cache[key] = names
+    return names
+
+
+def find_dist_imports(modules, site_packages):
+    """分发包的顶层模块（在site-packages中查找）导入的所有顶层模块"""
+    names = set()
+    for module in modules:
+        for base in site_packages:
+            path = os.path.join(base, module)
+            if not os.path.isdir(path):
+                path += '.py'
+            if os.path.exists(path):
+                names |= _scan_module_imports(path)
+                break
+    return names
+
+
+def compute_auto_excludes(script_paths, probe, keep=(), work_dir=None):
+    """
+    根据静态import图计算可以排除的模块
+    
+    从脚本直接导入的模块（及保留模块）所属的分发包出发,沿Requires-Dist找出需要的分发包,
+    其余已安装分发包的顶层模块和黑名单中的标准库模块都排除
+    （脚本或需要的分发包中导入了的黑名单模块不排除,如pytest需要unittest）
+    
+    Args:
+        work_dir: 构建目录,有上一次构建的TOC时按其中实际收集的文件估算减少的大小,
+            否则按排除模块在磁盘上的大小估算（上限）
+    
+    Returns:
+        (excludes, report)  report为 {'dists': 排除的分发包, 'modules': 模块数, 'size': 字节数,
+        'files': 少分析的模块数, 'measured': 是否按上次构建估算}
+    """
+    def normalize(name):
+        return re.sub(r'[-_.]+', '-', name).lower()
+    
+    imported = set()
+    for script_path in script_paths:
+        imported |= find_imported_modules(script_path)
+    keep = set(keep)
+    top_levels = probe.get('top_levels', {})
+    requires = probe.get('requires', {})
+    
+    module_dists = {}
+    for dist, modules in top_levels.items():
+        for module in modules:
+            module_dists.setdefault(module, set()).add(dist)
+    
+    def closure(dists):
+        result = set()
+        pending = list(dists)
+        while pending:
+            dist = pending.pop()
+            if dist not in result:
+                result.add(dist)
+                pending.extend(requires.get(dist, ()))
+        return result
+    
+    # 运行时需要的分发包,加上打包时PyInstaller自己需要的分发包
+    runtime = closure(dist for module in imported | keep for dist in module_dists.get(module, ()))
+    needed = runtime | closure(normalize(dist) for dist in AUTO_EXCLUDE_PROTECTED)
+    # 命名空间包可能由多个分发包共同提供,只要有一个需要就保留
+    needed_modules = {module for dist in needed for module in top_levels.get(dist, ())}
+    
+    excludes = set()
+    excluded_dists = []
+    for dist, modules in sorted(top_levels.items()):
+        if dist in needed:
+            continue
+        dist_excludes = [m for m in modules if m.isidentifier() and m not in needed_modules
+                         and m not in imported and m not in keep]
+        if dist_excludes:
+            excludes.update(dist_excludes)
+            excluded_dists.append(dist)
+    denied = {m for m in AUTO_EXCLUDE_DENYLIST if m not in imported and m not in keep}
+    if denied and runtime:
+        runtime_modules = {module for dist in runtime for module in top_levels.get(dist, ())}
+        denied -= find_dist_imports(runtime_modules, probe.get('site_packages', []))
+    
+    size = files = 0
+    toc = load_collected_toc(work_dir) if work_dir else None
+    if toc is not None:
+        for module, path, typecode in toc:
+            top = module.split('.')[0] if typecode == 'PYMODULE' else os.path.normpath(module).split(os.sep)[0]
+            if top in excludes or top in denied:
+                try:
+                    size += os.path.getsize(path)
+                except OSError:
+                    pass
+                files += typecode == 'PYMODULE'
+    else:
+        site_packages = probe.get('site_packages', [])
+        stdlib = [probe['stdlib']] if probe.get('stdlib') else []
+        for modules, search_dirs in ((excludes, site_packages), (denied, stdlib)):
+            for module in modules:
+                module_size, module_files = _module_size(module, search_dirs)
+                size += module_size
+                files += module_files
+    
+    report = {'dists': excluded_dists, 'modules': len(excludes | denied), 'size': size, 'files': files,
+              'measured': toc is not None}
+    return sorted(excludes | denied), report
+
+
+def format_exclude_report(report):
+    """自动排除结果的一行说明"""
+    dists = ', '.join(report['dists'][:8]) + (' ...' if len(report['dists']) > 8 else '')
+    source = '按上次构建估算' if report['measured'] else '按磁盘大小估算的上限'
+    return (f"自动排除: {report['modules']} 个模块（{len(report['dists'])} 个第三方包"
+            + (f": {dists}" if dists else '') + f"）, 预计减少约 {report['size'] / 1024 / 1024:.1f} MB、"
+            f"少分析 {report['files']} 个模块（{source}）")
+
+
+def get_profile_path(spec_dir, name):
+    return os.path.join(spec_dir, name + PROFILE_SUFFIX)
+
+
+def load_profile(path):
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def save_profile(path, profile):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+
+
+def get_executable_path(artifact, name, onedir, probe=None):
+    """输出中可以直接运行的可执行文件（目录模式在输出目录内）"""
+    if not onedir:
+        return artifact
+    platform_name = (probe or {}).get('platform', sys.platform)
+    return os.path.join(artifact, name + ('.exe' if platform_name.startswith('win') else ''))
+
+
+def run_smoke(cmd, timeout=120):
+    """
+    运行冒烟命令
+    
+    Returns:
+        (ok, elapsed, output)  output为输出的最后几行
+    """
+    start = time.time()
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, errors='replace', timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return False, time.time() - start, f'超时（{timeout}s）'
+    except OSError as e:
+        return False, time.time() - start, str(e)
+    output = '\n'.join((result.stdout + result.stderr).strip().splitlines()[-5:])
+    return result.returncode == 0, time.time() - start, output
+
+
+def update_collected_modules(profile, work_dir):
+    """把上一次构建实际收集的顶层模块并入运行记录（取并集,裁剪后的构建不会让候选变少）"""
+    toc = load_collected_toc(work_dir) or []
+    collected = set(profile.get('collected', []))
+    hook_imports = set()
+    for module, path, typecode in toc:
+        if typecode == 'PYMODULE':
+            collected.add(module.split('.')[0])
+    # 运行时钩子（pyi_rth_*）在冒烟运行时不会执行,它们导入的模块必须保留
+    for path in load_runtime_hooks(work_dir):
+        hook_imports |= find_imported_modules(path)
+    profile['collected'] = sorted(collected)
+    profile['hook_imports'] = sorted(hook_imports | set(profile.get('hook_imports', [])))
+    return profile
+
+
+def load_runtime_hooks(work_dir):
+    """上一次构建使用的运行时钩子文件"""
+    paths = []
+    for pattern in ('Analysis-*.toc', os.path.join('*', 'Analysis-*.toc')):
+        for toc_path in glob.glob(os.path.join(glob.escape(work_dir), pattern)):
+            try:
+                with open(toc_path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+            except OSError:
+                continue
+            paths += re.findall(r"\('pyi_rth_\w+',\s*'([^']+)',\s*'PYSOURCE'\)", text)
+    return sorted(set(p for p in paths if os.path.isfile(p)))
+
+
+def resolve_loaded_modules(interpreter, modules):
+    """在目标解释器中导入给定模块,返回随之加载的所有顶层模块（失败时返回None）"""
+    code = ('import sys, json, importlib\n'
+            f'for name in {sorted(modules)!r}:\n'
+            '    try:\n'
+            '        importlib.import_module(name)\n'
+            '    except Exception:\n'
+            '        pass\n'
+            'print(json.dumps(sorted({m.split(".")[0] for m in sys.modules})))')
+    try:
+        result = subprocess.run([interpreter, '-c', code], capture_output=True, text=True, timeout=60)
+        return json.loads(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else None
+    except (OSError, ValueError, IndexError, subprocess.TimeoutExpired):
+        return None
+
+
+def compute_prune_excludes(profile, work_dir, keep=(), interpreter=None):
+    """
+    根据运行记录计算可以裁剪的顶层模块
+    
+    运行时钩子导入的模块连同其间接导入的模块都会保留（在目标解释器中导入一次得到）
+    
+    Returns:
+        (excludes, report)  report为 {'loaded': 加载的顶层模块数, 'collected': 候选数, 'pruned': 裁剪数}
+    """
+    update_collected_modules(profile, work_dir)
+    hook_imports = profile.get('hook_imports', [])
+    if interpreter and profile.get('hook_modules_for') != hook_imports:
+        hook_modules = resolve_loaded_modules(interpreter, hook_imports)
+        if hook_modules is not None:
+            profile['hook_modules'] = hook_modules
+            profile['hook_modules_for'] = hook_imports
+    loaded = {module.split('.')[0] for module in profile.get('modules', [])}
+    protected = (loaded | set(PRUNE_SAFE_MODULES) | set(hook_imports)
+                 | set(profile.get('hook_modules', [])) | set(keep))
+    excludes = sorted(m for m in profile['collected']
+                      if m not in protected and not m.startswith(('pyimod', '_pyi', 'pyi_')))
+    report = {'loaded': len(loaded), 'collected': len(profile['collected']), 'pruned': len(excludes)}
+    return excludes, report
+
+
+def profile_script(script_path, args, config, probe=None):
+    """
+    --profile: 用目标解释器运行脚本,记录实际加载的模块
+    
+    已有未裁剪的构建输出时,同时用相同的冒烟参数运行它,作为之后裁剪构建的比较基准
+    
+    Returns:
+        (ok, msg)
+    """
+    if not os.path.exists(script_path):
+        return False, f"脚本文件不存在: {script_path}"
+    name = get_job_name(script_path, args)
+    output_dir, work_dir, spec_dir = get_job_dirs(name, args, config)
+    profile_path = get_profile_path(spec_dir, name)
+    interpreter = args.interpreter if args.interpreter else find_python_interpreter(config)
+    smoke_args = shlex.split(args.smoke_args or '', posix=(os.name != 'nt'))
+    
+    os.makedirs(spec_dir, exist_ok=True)
+    modules_file = profile_path + '.tmp'
+    if os.path.exists(modules_file):
+        os.remove(modules_file)
+    ok, elapsed, output = run_smoke([interpreter, '-c', PROFILE_CODE, modules_file, script_path] + smoke_args,
+                                    args.timeout)
+    if not os.path.exists(modules_file):
+        return False, f"{name}: 运行失败,没有记录到加载的模块\n{output}"
+    with open(modules_file, 'r', encoding='utf-8') as f:
+        modules = json.load(f)
+    os.remove(modules_file)
+    
+    profile = load_profile(profile_path)
+    profile.update({
+        'script': os.path.abspath(script_path),
+        'interpreter': interpreter,
+        'smoke_args': smoke_args,
+        'modules': modules,
+        'script_elapsed': round(elapsed, 3),
+        'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    })
+    update_collected_modules(profile, work_dir)
+    
+    lines = [f"{name}: 记录 {len(modules)} 个已加载模块"
+             + (f"（脚本退出码非0: {output}）" if not ok else '') + f" -> {profile_path}"]
+    # 上一次是未裁剪的构建时,测量基准
+    mode = 'persistent' if args.persistent else ('onedir' if args.onedir else 'onefile')
+    artifact, executable = next(((a, e) for m, a, e in find_artifacts(output_dir, name, probe) if m == mode),
+                                (None, None))
+    if profile.get('last_build') != 'pruned' and executable:
+        smoke_ok, smoke_elapsed, _ = run_smoke([executable] + smoke_args, args.timeout)
+        if smoke_ok:
+            profile['baseline'] = {'size': (artifact_fingerprint(artifact) or {}).get('size', 0),
+                                   'startup': round(smoke_elapsed, 3)}
+            lines.append(f"{name}: 未裁剪构建基准 {profile['baseline']['size'] / 1024 / 1024:.1f} MB, "
+                         f"冒烟运行 {smoke_elapsed:.2f}s")
+    if not profile.get('collected'):
+        lines.append(f"{name}: 还没有构建记录,先完成一次不带 --prune 的打包后裁剪才会生效")
+    save_profile(profile_path, profile)
+    return True, '\n'.join(lines)
+
+
+def check_pruned_build(profile, profile_path, executable, artifact, pruned, timeout=120):
+    """
+    构建完成后用运行记录中的冒烟参数运行输出,记录大小和启动用时并与未裁剪的基准比较
+    
+    Returns:
+        (smoke_ok, lines)
+    """
+    smoke_ok, elapsed, output = run_smoke([executable] + profile.get('smoke_args', []), timeout)
+    size = (artifact_fingerprint(artifact) or {}).get('size', 0)
+    lines = []
+    if not smoke_ok:
+        lines.append(f"警告: 冒烟运行失败,可能裁剪掉了需要的模块,请用 --keep-module 保留: {output}")
+    elif pruned:
+        line = f"裁剪后: {size / 1024 / 1024:.1f} MB, 冒烟运行 {elapsed:.2f}s"
+        baseline = profile.get('baseline')
+        if baseline:
+            line += (f"（未裁剪: {baseline['size'] / 1024 / 1024:.1f} MB, {baseline['startup']:.2f}s；"
+                     f"大小 {(size - baseline['size']) / 1024 / 1024:+.1f} MB, "
+                     f"启动 {elapsed - baseline['startup']:+.2f}s）")
+        lines.append(line)
+    else:
+        profile['baseline'] = {'size': size, 'startup': round(elapsed, 3)}
+        lines.append(f"未裁剪构建基准: {size / 1024 / 1024:.1f} MB, 冒烟运行 {elapsed:.2f}s")
+    if smoke_ok:
+        profile['last_build'] = 'pruned' if pruned else 'full'
+    save_profile(profile_path, profile)
+    return smoke_ok, lines
+
+
+def _is_windows(probe=None):
+    return (probe or {}).get('platform', sys.platform).startswith('win')
+
+
+def get_launcher_path(output_dir, name, probe=None):
+    return os.path.join(output_dir, name + ('.cmd' if _is_windows(probe) else ''))
+
+
+def get_runtime_root(output_dir, config):
+    runtime_dir = config.get('persistent_runtime_dir')
+    return os.path.abspath(runtime_dir) if runtime_dir else os.path.join(output_dir, PERSISTENT_RUNTIME_DIR)
+
+
+def read_launcher_target(launcher):
+    """启动器指向的版本目录（不是启动器时返回None）"""
+    try:
+        if os.path.getsize(launcher) > 4096:
+            return None
+        with open(launcher, 'r', encoding='utf-8') as f:
+            m = re.search(re.escape(LAUNCHER_MARKER) + r' (.+)', f.read())
+    except (OSError, UnicodeDecodeError):
+        return None
+    return m.group(1).strip() if m else None
+
+
+def hash_tree(path):
+    """目录内容的sha256（相对路径 + 文件内容）"""
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            file_path = os.path.join(root, filename)
+            h.update(os.path.relpath(file_path, path).replace(os.sep, '/').encode('utf-8'))
+            h.update(_file_hash(file_path).encode('ascii'))
+    return h.hexdigest()
+
+
+def cleanup_old_versions(runtime_root, name, current, keep_versions=2):
+    """
+    删除旧版本,按修改时间保留最近的keep_versions个（含当前版本）
+    
+    Returns:
+        删除的版本数（正在使用、无法删除的版本跳过）
+    """
+    pattern = re.compile(re.escape(name) + r'-[0-9a-f]{12}$')
+    versions = []
+    for entry in os.scandir(runtime_root):
+        if entry.is_dir() and pattern.match(entry.name) and entry.path != current:
+            versions.append((entry.stat().st_mtime, entry.path))
+    versions.sort(reverse=True)
+    removed = 0
+    for _, path in versions[max(keep_versions - 1, 0):]:
+        shutil.rmtree(path, ignore_errors=True)
+        removed += not os.path.exists(path)
+    return removed
+
+
+def install_persistent(staged_dir, runtime_root, name, keep_versions=2):
+    """
+    把目录模式的输出安装到 <运行目录>/<名称>-<哈希>/,内容相同的版本直接复用
+    
+    Returns:
+        (version_dir, reused, removed)
+    """
+    version_dir = os.path.join(runtime_root, f'{name}-{hash_tree(staged_dir)[:12]}')
+    reused = os.path.isdir(version_dir)
+    if not reused:
+        os.makedirs(runtime_root, exist_ok=True)
+        tmp_dir = version_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        shutil.move(staged_dir, tmp_dir)
+        os.replace(tmp_dir, version_dir)
+    # 更新修改时间,清理时当前版本总是最新的
+    os.utime(version_dir)
+    removed = cleanup_old_versions(runtime_root, name, version_dir, keep_versions)
+    return version_dir, reused, removed
+
+
+def write_launcher(output_dir, name, version_dir, probe=None):
+    """生成直接执行版本目录中程序的启动器（POSIX为sh脚本,Windows为cmd脚本）"""
+    launcher = get_launcher_path(output_dir, name, probe)
+    executable = get_executable_path(version_dir, name, True, probe)
+    try:
+        target = os.path.relpath(executable, output_dir)
+    except ValueError:
+        target = executable  # Windows上不在同一个盘
+    if _is_windows(probe):
+        if not os.path.isabs(target):
+            target = '%~dp0' + target
+        content = (f'@echo off\r\nrem {LAUNCHER_MARKER} {version_dir}\r\n'
+                   f'"{target}" %*\r\nexit /b %ERRORLEVEL%\r\n')
+    else:
+        # 通过符号链接调用时（如链接到PATH中的目录）先解析出启动器本身的位置,
+        # 不用readlink -f（旧版macOS不支持）
+        resolve = ''
+        if not os.path.isabs(target):
+            resolve = ('self="$0"\n'
+                       'while [ -h "$self" ]; do\n'
+                       '    link=$(readlink "$self")\n'
+                       '    case "$link" in /*) self="$link" ;; *) self="$(dirname "$self")/$link" ;; esac\n'
+                       'done\n')
+            target = '$(dirname "$self")/' + target
+        content = f'#!/bin/sh\n# {LAUNCHER_MARKER} {version_dir}\n{resolve}exec "{target}" "$@"\n'
+    # 之前以目录模式输出的同名目录会挡住启动器
+    if os.path.isdir(launcher):
+        shutil.rmtree(launcher)
+    tmp_file = launcher + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+    os.chmod(tmp_file, 0o755)
+    os.replace(tmp_file, launcher)
+    return launcher
+
+
+def find_artifacts(output_dir, name, probe=None):
+    """
+    已存在的打包输出（单文件、目录和持久解压模式都检查）
+    
+    Returns:
+        [(mode, artifact, executable), ...]  mode为 'onefile'、'onedir' 或 'persistent'
+    """
+    found = []
+    launcher = get_launcher_path(output_dir, name, probe)
+    version_dir = read_launcher_target(launcher) if os.path.isfile(launcher) else None
+    if version_dir and os.path.isdir(version_dir):
+        found.append(('persistent', version_dir, launcher))
+    onefile = get_artifact_path(output_dir, name, False, probe)
+    if os.path.isfile(onefile) and not version_dir:
+        found.append(('onefile', onefile, onefile))
+    onedir = get_artifact_path(output_dir, name, True, probe)
+    executable = get_executable_path(onedir, name, True, probe)
+    if os.path.isdir(onedir) and os.path.isfile(executable):
+        found.append(('onedir', onedir, executable))
+    return found
+
+
+def evict_file_cache(path):
+    """
+    把文件（或目录下所有文件）从操作系统页缓存中清出,模拟冷启动
+    
+    Returns:
+        是否支持（Windows上没有posix_fadvise,冷启动只是第一次运行）
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    paths = [path] if os.path.isfile(path) else [
+        os.path.join(root, f) for root, _, files in os.walk(path) for f in files]
+    for file_path in paths:
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    return True
+
+
+def _peak_rss_windows(handle):
+    """Windows: 进程的峰值工作集（字节）"""
+    import ctypes
+    from ctypes import wintypes
+    
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+    
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    if ctypes.windll.psapi.GetProcessMemoryInfo(int(handle), ctypes.byref(counters), counters.cb):
+        return counters.PeakWorkingSetSize
+    return None
+
+
+def _read_vm_hwm(pid):
+    """Linux: 进程的内存高水位VmHWM（字节,exec之后重新计算,不含父进程fork前的内存）"""
+    try:
+        with open(f'/proc/{pid}/status', 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _proc_children(pid):
+    """Linux: 进程的直接子进程（/proc/<pid>/task/<tid>/children）"""
+    children = []
+    for tid in os.listdir(f'/proc/{pid}/task') if os.path.isdir(f'/proc/{pid}/task') else ():
+        try:
+            with open(f'/proc/{pid}/task/{tid}/children', 'r') as f:
+                children.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            pass
+    return children
+
+
+class HighWaterSampler(threading.Thread):
+    """
+    Linux: 高频采样进程树中每个进程的VmHWM,结果为各进程高水位之和
+    
+    VmHWM本身就是峰值,两次采样之间的峰值不会丢失,只会漏掉进程退出前最后一个间隔内的增长
+    """
+    def __init__(self, pid, interval=BENCH_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peaks = {}
+        self._stop_event = threading.Event()
+    
+    def sample(self):
+        pending = [self.pid]
+        while pending:
+            pid = pending.pop()
+            hwm = _read_vm_hwm(pid)
+            if hwm is None:
+                continue
+            self.peaks[pid] = max(self.peaks.get(pid, 0), hwm)
+            pending.extend(_proc_children(pid))
+    
+    def run(self):
+        self.sample()
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+    
+    def stop(self):
+        """停止采样,返回峰值内存（字节）,没有采样到时返回None"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        return sum(self.peaks.values()) or None
+
+
+def run_timed(cmd, timeout=120):
+    """
+    运行命令直到退出,测量用时和峰值内存
+    
+    Linux采样被测进程树的VmHWM（wait4的ru_maxrss会带上fork时父进程的内存,打包器本身占用大时不准）,
+    其他POSIX系统用ProcessTreeSampler采样进程树的RSS（需要psutil）,
+    Windows用GetProcessMemoryInfo取得峰值工作集
+    
+    Returns:
+        (returncode, elapsed, peak_rss)  peak_rss为字节数,无法获取时为None
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    sampler = None
+    if os.path.isdir('/proc'):
+        sampler = HighWaterSampler(proc.pid)
+    elif os.name != 'nt':
+        sampler = ProcessTreeSampler(proc.pid, BENCH_SAMPLE_INTERVAL)
+    if sampler:
+        sampler.start()
+    try:
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+    elapsed = time.perf_counter() - start
+    if os.name == 'nt':
+        peak = _peak_rss_windows(proc._handle)
+    elif isinstance(sampler, HighWaterSampler):
+        peak = sampler.stop()
+    else:
+        peak = (sampler.stop() or {}).get('peak_rss') or None
+    return proc.returncode, elapsed, peak
+
+
+def _median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def bench_executable(executable, artifact, smoke_args, runs=5, timeout=120):
+    """
+    启动测试：1次冷启动 + runs次热启动
+    
+    Returns:
+        结果字典,失败时返回 (None, 错误信息)
+    """
+    cold_evicted = evict_file_cache(artifact)
+    code, cold, cold_rss = run_timed([executable] + smoke_args, timeout)
+    if code != 0:
+        return None, f"退出码 {code}（参数: {' '.join(smoke_args) or '无'}）"
+    warm, rss = [], [cold_rss] if cold_rss else []
+    for _ in range(runs):
+        code, elapsed, peak = run_timed([executable] + smoke_args, timeout)
+        if code != 0:
+            return None, f"热启动退出码 {code}"
+        warm.append(elapsed)
+        if peak:
+            rss.append(peak)
+    return {
+        'cold': round(cold, 4),
+        'cold_evicted': cold_evicted,
+        'warm_median': round(_median(warm), 4) if warm else None,
+        'warm_min': round(min(warm), 4) if warm else None,
+        'warm_max': round(max(warm), 4) if warm else None,
+        'peak_rss': max(rss) if rss else None,
+        'size': (artifact_fingerprint(artifact) or {}).get('size', 0),
+        'runs': runs,
+    }, None
+
+
+def load_bench_history(history_file=BENCH_HISTORY_FILE):
+    if os.path.exists(history_file):
+        try:
+            with open(history_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def save_bench_history(history, history_file=BENCH_HISTORY_FILE):
+    os.makedirs(os.path.dirname(history_file), exist_ok=True)
+    tmp_file = f'{history_file}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, history_file)
+
+
+def compare_bench(previous, current):
+    """与上一次同模式的结果比较,返回变化说明（变慢/变大超过阈值时标记回归）"""
+    if not previous:
+        return ''
+    notes = []
+    for key, label in (('warm_median', '热启动'), ('cold', '冷启动'), ('size', '大小'), ('peak_rss', '内存')):
+        old, new = previous.get(key), current.get(key)
+        if not old or new is None:
+            continue
+        ratio = (new - old) / old
+        mark = ' 回归!' if ratio > BENCH_REGRESSION_RATIO else ''
+        notes.append(f"{label}{ratio:+.0%}{mark}")
+    return ', '.join(notes)
+
+
+def bench_scripts(scripts, args, config, probe=None):
+    """
+    --bench: 测试已打包输出的启动用时、峰值内存和大小,结果追加到历史记录
+    
+    Returns:
+        有回归或运行失败时返回False
+    """
+    if args.smoke_args is None:
+        smoke_args = ['--help']
+    else:
+        smoke_args = shlex.split(args.smoke_args, posix=(os.name != 'nt'))
+    history = load_bench_history()
+    manifest = load_build_manifest()
+    all_ok = True
+    print(f"{'名称':<20} {'模式':<8} {'冷启动':>8} {'热启动(中位)':>12} {'峰值内存':>10} {'大小':>10}  变化")
+    for script in scripts:
+        name = get_job_name(script, args)
+        output_dir, _, _ = get_job_dirs(name, args, config)
+        artifacts = find_artifacts(output_dir, name, probe)
+        if not artifacts:
+            print(f"{name:<20} 没有找到打包输出,请先打包")
+            all_ok = False
+            continue
+        for mode, artifact, executable in artifacts:
+            result, error = bench_executable(executable, artifact, smoke_args, args.bench_runs, args.timeout)
+            if result is None:
+                print(f"{name:<20} {mode:<8} 运行失败: {error}")
+                all_ok = False
+                continue
+            entries = history.setdefault(name, [])
+            previous = next((e for e in reversed(entries) if e.get('mode') == mode), None)
+            result.update({
+                'mode': mode,
+                'args': smoke_args,
+                'build_key': (manifest.get(name) or {}).get('key'),
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            })
+            change = compare_bench(previous, result)
+            if '回归' in change:
+                all_ok = False
+            entries.append(result)
+            del entries[:-BENCH_HISTORY_LIMIT]
+            rss = f"{result['peak_rss'] / 1024 / 1024:.1f} MB" if result['peak_rss'] else '-'
+            cold = f"{result['cold']:.3f}s" + ('' if result['cold_evicted'] else '*')
+            warm = f"{result['warm_median']:.3f}s" if result['warm_median'] is not None else '-'
+            print(f"{name:<20} {mode:<8} {cold:>8} {warm:>12} {rss:>10} "
+                  f"{result['size'] / 1024 / 1024:>7.1f} MB  {change}")
+    save_bench_history(history)
+    if not hasattr(os, 'posix_fadvise'):
+        print("* 当前系统无法清除文件缓存,冷启动为第一次运行的用时")
+    print(f"历史记录: {BENCH_HISTORY_FILE}")
+    return all_ok
+
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def compute_build_key(script_path, pyinstaller_args, probe):
+    """
+    计算构建键：脚本及本地依赖的内容 + 解释器/分发包/PyInstaller版本 + 实际参数
+    """
+    script_path = os.path.abspath(script_path)
+    base = os.path.dirname(script_path)
+    sources = [(os.path.basename(script_path), _file_hash(script_path))]
+    for path in find_local_imports(script_path):
+        sources.append((os.path.relpath(path, base), _file_hash(path)))
+    
+    environment = {k: probe.get(k) for k in ('version', 'implementation', 'platform', 'machine', 'pyinstaller')}
+    environment['distributions'] = sorted(probe.get('distributions', {}).items())
+    options = [arg for arg in pyinstaller_args if arg not in KEY_IGNORED_ARGS]
+    
+    data = json.dumps({'sources': sources, 'environment': environment, 'options': options}, sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def get_artifact_path(output_dir, name, onedir, probe=None):
+    """打包输出的路径：单文件模式为可执行文件,目录模式为目录"""
+    if onedir:
+        return os.path.join(output_dir, name)
+    platform_name = (probe or {}).get('platform', sys.platform)
+    return os.path.join(output_dir, name + ('.exe' if platform_name.startswith('win') else ''))
+
+
+def artifact_fingerprint(path):
+    """输出文件的完整性指纹（大小和mtime,目录则汇总所有文件）,不存在时返回None"""
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'files': 1}
+    if os.path.isdir(path):
+        size = files = latest = 0
+        for root, _, filenames in os.walk(path):
+            for filename in filenames:
+                st = os.stat(os.path.join(root, filename))
+                size += st.st_size
+                files += 1
+                latest = max(latest, st.st_mtime_ns)
+        return {'size': size, 'mtime_ns': latest, 'files': files} if files else None
+    return None
+
+
+_manifest_lock = threading.Lock()
+
+
+def load_build_manifest(manifest_file=BUILD_MANIFEST_FILE):
+    if os.path.exists(manifest_file):
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def is_build_cached(manifest, name, key, artifact):
+    """构建键一致且输出文件完好时返回True"""
+    entry = manifest.get(name)
+    if not entry or entry.get('key') != key:
+        return False
+    if os.path.normcase(entry.get('artifact', '')) != os.path.normcase(artifact):
+        return False
+    return artifact_fingerprint(artifact) == entry.get('fingerprint')
+
+
+def record_build(name, key, artifact, elapsed, manifest_file=BUILD_MANIFEST_FILE):
+    """打包成功后记录构建键和输出文件指纹（读-改-写,并发任务之间加锁）"""
+    fingerprint = artifact_fingerprint(artifact)
+    if fingerprint is None:
+        return
+    with _manifest_lock:
+        manifest = load_build_manifest(manifest_file)
+        manifest[name] = {
+            'key': key,
+            'artifact': artifact,
+            'fingerprint': fingerprint,
+            'elapsed': round(elapsed, 2),
+            'built_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+        tmp_file = f'{manifest_file}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, manifest_file)
+
+
+def format_build_change(previous, artifact, elapsed):
+    """与上一次构建比较输出大小和用时（上一次的记录来自构建缓存清单）"""
+    current = artifact_fingerprint(artifact) or {}
+    line = f"     输出大小: {current.get('size', 0) / 1024 / 1024:.1f} MB, 用时 {elapsed:.1f}s"
+    if previous and previous.get('fingerprint'):
+        line += (f"（上次 {previous['fingerprint']['size'] / 1024 / 1024:.1f} MB, "
+                 f"{previous.get('elapsed', 0):.1f}s）")
+    return line
+
+
+def normalize_clean_policy(value):
+    """把配置中的清理选项统一为 auto/always/never（旧配置的True/False对应always/never）"""
+    if value is True:
+        return 'always'
+    if value is False:
+        return 'never'
+    value = str(value).lower()
+    return value if value in CLEAN_POLICIES else 'auto'
+
+
+def compute_env_fingerprint(probe, pyinstaller_args):
+    """
+    构建环境指纹：解释器、已安装分发包、PyInstaller版本和参数（不含入口脚本）
+    
+    入口脚本和本地模块的变化由PyInstaller自己的增量分析处理,不需要清理
+    """
+    environment = {k: probe.get(k) for k in ('version', 'implementation', 'platform', 'machine', 'pyinstaller')}
+    environment['executable'] = probe.get('executable')
+    environment['distributions'] = sorted(probe.get('distributions', {}).items())
+    options = [arg for arg in pyinstaller_args[:-1] if arg not in KEY_IGNORED_ARGS]
+    data = json.dumps({'environment': environment, 'options': options}, sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def load_env_fingerprint(work_dir):
+    path = os.path.join(work_dir, ENV_FINGERPRINT_FILE)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def decide_clean(policy, work_dir, fingerprint):
+    """
+    按清理策略决定本次是否传 --clean
+    
+    Returns:
+        (clean, reason)
+    """
+    if policy == 'always':
+        return True, '总是清理'
+    if policy == 'never':
+        return False, '从不清理'
+    if fingerprint is None:
+        return True, '无法获取解释器信息,清理后构建'
+    stored = load_env_fingerprint(work_dir).get('fingerprint')
+    if stored is None:
+        return True, '首次构建'
+    if stored != fingerprint:
+        return True, '解释器、已安装包或打包参数已变化,清理后构建'
+    return False, '环境未变化,增量构建'
+
+
+def save_env_fingerprint(work_dir, fingerprint, elapsed, cleaned):
+    """
+    构建成功后保存环境指纹
+    
+    Returns:
+        增量构建相比上一次清理构建节省的秒数（清理构建或没有记录时为0）
+    """
+    data = load_env_fingerprint(work_dir)
+    saved = 0.0
+    if cleaned:
+        data['clean_elapsed'] = round(elapsed, 2)
+    elif data.get('clean_elapsed'):
+        saved = max(0.0, data['clean_elapsed'] - elapsed)
+    data['fingerprint'] = fingerprint
+    data['updated'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        with open(os.path.join(work_dir, ENV_FINGERPRINT_FILE), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    except OSError:
+        pass
+    return saved
+
+
+# 共享打包的spec中可以直接表达的参数（其他参数PyInstaller在spec模式下不接受）
+SPEC_OPTION_KEYS = {
+    '--add-data': 'datas',
+    '--add-binary': 'binaries',
+    '--hidden-import': 'hiddenimports',
+    '--hiddenimport': 'hiddenimports',
+    '--exclude-module': 'excludes',
+    '--collect-all': 'collect_all',
+    '--collect-submodules': 'collect_submodules',
+    '--collect-data': 'collect_data',
+    '--collect-datas': 'collect_data',
+    '--paths': 'pathex',
+    '-p': 'pathex',
+}
+
+
+def split_arg_lines(text):
+    """把多行参数文本拆成参数列表（每行可带引号,如 --add-data "a b;dest"）"""
+    tokens = []
+    for line in text.strip().split('\n'):
+        line = line.strip()
+        if line:
+            # Windows路径中的反斜杠不能当转义字符
+            tokens.extend(t.strip('"\'') for t in shlex.split(line, posix=(os.name != 'nt')))
+    return tokens
+
+
+def _split_data_spec(value):
+    """拆分 --add-data 的 源:目标（Windows也支持 源;目标，与PyInstaller相同）"""
+    if os.name == 'nt' and ';' in value:
+        return tuple(value.rsplit(';', 1))
+    src, sep, dest = value.rpartition(':')
+    # Windows下 C:\path 这种只有盘符冒号的情况没有目标部分（其他平台单个字母也是普通的相对路径）
+    if not sep or (os.name == 'nt' and len(src) == 1 and src.isalpha() and dest[:1] in ('/', '\\')):
+        return value, '.'
+    return src, dest
+
+
+def parse_spec_options(tokens):
+    """
+    把PyInstaller命令行参数转换为spec中的Analysis选项
+    
+    Returns:
+        (options, unsupported)  options为 {'datas': [...], 'hiddenimports': [...], ...}
+    """
+    options = {key: [] for key in set(SPEC_OPTION_KEYS.values())}
+    unsupported = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        opt, eq, value = token.partition('=')
+        if opt in SPEC_OPTION_KEYS:
+            if not eq:
+                if i + 1 >= len(tokens):
+                    unsupported.append(token)
+                    break
+                value = tokens[i + 1]
+                i += 1
+            key = SPEC_OPTION_KEYS[opt]
+            if key in ('datas', 'binaries'):
+                value = _split_data_spec(value)
+            options[key].append(value)
+        else:
+            unsupported.append(token)
+        i += 1
+    return options, unsupported
+
+
+def generate_shared_spec(entries, bundle_name, spec_path, console=False, icon=None, tokens=None):
+    """
+    生成共享打包的spec：每个入口一个Analysis/PYZ/EXE,所有依赖由一个COLLECT收集到同一目录
+    
+    Args:
+        entries: [(脚本路径, 可执行文件名), ...]
+        tokens: PyInstaller命令行参数（--add-data、--hidden-import等会转换为spec选项）
+    
+    Returns:
+        不支持、被忽略的参数列表
+    """
+    options, unsupported = parse_spec_options(tokens or [])
+    datas = [(os.path.abspath(src), dest) for src, dest in options['datas']]
+    binaries = [(os.path.abspath(src), dest) for src, dest in options['binaries']]
+    
+    lines = [
+        '# -*- mode: python ; coding: utf-8 -*-',
+        '# 由 mypackager_cli.py 生成的共享打包spec,请勿手动修改',
+        'from PyInstaller.utils.hooks import collect_all, collect_submodules, collect_data_files',
+        '',
+        f'datas = {datas!r}',
+        f'binaries = {binaries!r}',
+        f'hiddenimports = {options["hiddenimports"]!r}',
+    ]
+    for package in options['collect_all']:
+        lines.append(f'_d, _b, _h = collect_all({package!r}); datas += _d; binaries += _b; hiddenimports += _h')
+    for package in options['collect_submodules']:
+        lines.append(f'hiddenimports += collect_submodules({package!r})')
+    for package in options['collect_data']:
+        lines.append(f'datas += collect_data_files({package!r})')
+    lines.append('')
+    
+    collect_items = []
+    for i, (script, name) in enumerate(entries):
+        script = os.path.abspath(script)
+        pathex = [os.path.dirname(script)] + [os.path.abspath(p) for p in options['pathex']]
+        lines += [
+            f'a{i} = Analysis(',
+            f'    [{script!r}],',
+            f'    pathex={pathex!r},',
+            '    binaries=binaries,',
+            '    datas=datas,',
+            '    hiddenimports=hiddenimports,',
+            f'    excludes={options["excludes"]!r},',
+            '    noarchive=False,',
+            ')',
+            f'pyz{i} = PYZ(a{i}.pure)',
+            f'exe{i} = EXE(',
+            f'    pyz{i},',
+            f'    a{i}.scripts,',
+            '    [],',
+            '    exclude_binaries=True,',
+            f'    name={name!r},',
+            f'    console={bool(console)!r},',
+            f'    icon={os.path.abspath(icon) if icon else None!r},',
+            ')',
+            '',
+        ]
+        collect_items += [f'exe{i}', f'a{i}.binaries', f'a{i}.datas']
+    
+    lines += [
+        'coll = COLLECT(',
+        *[f'    {item},' for item in collect_items],
+        f'    name={bundle_name!r},',
+        ')',
+        '',
+    ]
+    os.makedirs(os.path.dirname(spec_path), exist_ok=True)
+    with open(spec_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+    return unsupported
+
+
+def get_spec_tokens(args, config):
+    """共享打包时,从命令行和配置中收集可转换为spec选项的参数"""
+    tokens = []
+    if args.add_data:
+        for data in args.add_data:
+            tokens += ['--add-data', data]
+    elif config.get('extra_data'):
+        tokens += split_arg_lines(config['extra_data'])
+    if args.hidden_import:
+        for hidden in args.hidden_import:
+            tokens += ['--hidden-import', hidden]
+    if args.extra_args:
+        tokens += args.extra_args
+    elif config.get('extra_args'):
+        tokens += split_arg_lines(config['extra_args'])
+    return tokens
+
+
+def get_shared_options(tokens, console, icon, output_dir):
+    """共享打包中影响产物的参数（用于构建键和环境指纹）"""
+    return tokens + [f'--console={bool(console)}', f'--icon={icon}', f'--distpath={output_dir}']
+
+
+def compute_bundle_key(entries, options, probe):
+    """共享打包的构建键：合并每个入口的构建键,任一入口或其本地依赖变化都会重新打包"""
+    entry_keys = [compute_build_key(script, options + [name], probe) for script, name in entries]
+    return hashlib.sha256(json.dumps(entry_keys).encode('utf-8')).hexdigest()
+
+
+def get_dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
 def install_pyinstaller(interpreter):
     """安装PyInstaller"""
     print("正在安装 PyInstaller...")
@@ -140,21 +1835,82 @@ def install_pyinstaller(interpreter):
         return False
 
 
-def package_script(script_path, args, config):
-    """打包单个脚本"""
-    if not os.path.exists(script_path):
-        print(f"错误: 脚本文件不存在: {script_path}")
-        return False
+def get_available_memory():
+    """获取可用物理内存（字节）,获取不到时返回None"""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
     
-    script_name = os.path.basename(script_path)
-    script_basename = os.path.splitext(script_name)[0]
+    if os.name == 'nt':
+        import ctypes
+        
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [
+                ('dwLength', ctypes.c_ulong),
+                ('dwMemoryLoad', ctypes.c_ulong),
+                ('ullTotalPhys', ctypes.c_ulonglong),
+                ('ullAvailPhys', ctypes.c_ulonglong),
+                ('ullTotalPageFile', ctypes.c_ulonglong),
+                ('ullAvailPageFile', ctypes.c_ulonglong),
+                ('ullTotalVirtual', ctypes.c_ulonglong),
+                ('ullAvailVirtual', ctypes.c_ulonglong),
+                ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+            ]
+        
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+        return None
     
-    print(f"\n{'='*60}")
-    print(f"开始打包: {script_name}")
-    print(f"{'='*60}")
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def default_jobs():
+    """默认并发数: min(CPU核数, 可用内存 / 每个任务约1.5GB),至少为1"""
+    jobs = os.cpu_count() or 1
+    memory = get_available_memory()
+    if memory:
+        jobs = min(jobs, memory // JOB_MEMORY_BYTES)
+    return max(1, int(jobs))
+
+
+def get_job_name(script_path, args):
+    """打包任务名称（即输出的可执行文件名）"""
+    return args.name if args.name else os.path.splitext(os.path.basename(script_path))[0]
+
+
+def get_job_dirs(name, args, config):
+    """
+    获取任务的输出目录、独立的构建目录和spec目录
     
-    # 构建PyInstaller命令参数
-    pyinstaller_args = []
+    Returns:
+        (output_dir, work_dir, spec_dir)
+    """
+    output_dir = args.output if args.output else os.path.join(os.getcwd(), config.get('build_output_dir', 'dist'))
+    build_dir = args.build_dir if args.build_dir else os.path.join(os.getcwd(), config.get('build_temp_dir', '.misc/.build/build'))
+    spec_dir = args.spec_dir if args.spec_dir else os.path.join(os.getcwd(), config.get('build_spec_dir', '.misc/.build/spec'))
+    return (
+        os.path.normpath(os.path.abspath(output_dir)),
+        os.path.normpath(os.path.abspath(os.path.join(build_dir, name))),
+        os.path.normpath(os.path.abspath(os.path.join(spec_dir, name))),
+    )
+
+
+def build_pyinstaller_args(script_path, name, args, config, output_dir, work_dir, spec_dir, clean=False,
+                           excludes=()):
+    """构建PyInstaller命令参数（脚本路径固定为最后一个参数）"""
+    # 不清理时PyInstaller会询问是否覆盖已有输出,子进程中无法交互,直接确认
+    pyinstaller_args = ["--noconfirm"]
     
     # 单文件/目录模式
     if args.onedir:
@@ -167,31 +1923,20 @@ def package_script(script_path, args, config):
         pyinstaller_args.append("--noconsole")
     
     # 应用名称
-    name = args.name if args.name else script_basename
     pyinstaller_args.append(f"--name={name}")
     
-    # 输出目录
-    output_dir = args.output if args.output else os.path.join(os.getcwd(), config.get('build_output_dir', 'dist'))
-    output_dir = os.path.normpath(os.path.abspath(output_dir))
+    # 输出、构建、spec目录
     pyinstaller_args.append(f"--distpath={output_dir}")
-    
-    # 构建目录
-    build_dir = args.build_dir if args.build_dir else os.path.join(os.getcwd(), config.get('build_temp_dir', '.misc/.build/build'))
-    build_dir = os.path.normpath(os.path.abspath(build_dir))
-    pyinstaller_args.append(f"--workpath={build_dir}")
-    
-    # spec文件目录
-    spec_dir = args.spec_dir if args.spec_dir else os.path.join(os.getcwd(), config.get('build_spec_dir', '.misc/.build/spec'))
-    spec_dir = os.path.normpath(os.path.abspath(spec_dir))
+    pyinstaller_args.append(f"--workpath={work_dir}")
     pyinstaller_args.append(f"--specpath={spec_dir}")
     
-    # 清理选项
-    if args.clean:
+    # 清理选项（由清理策略决定）
+    if clean:
         pyinstaller_args.append("--clean")
     
     # 图标
     if args.icon:
-        pyinstaller_args.append(f"--icon={args.icon}")
+        pyinstaller_args.append(f"--icon={os.path.abspath(args.icon)}")
     
     # 额外数据
     if args.add_data:
@@ -217,42 +1962,1043 @@ def package_script(script_path, args, config):
             if line:
                 pyinstaller_args.append(line)
     
+    # 自动排除的模块
+    for module in excludes:
+        pyinstaller_args.append(f"--exclude-module={module}")
+    
     # 添加脚本路径
-    pyinstaller_args.append(script_path)
+    pyinstaller_args.append(os.path.abspath(script_path))
+    return pyinstaller_args
+
+
+class PhaseTimer:
+    """
+    从PyInstaller日志流中拆分各阶段用时
+    
+    优先使用日志行开头的毫秒时间戳（相对PyInstaller启动）,没有时间戳的行按收到的时间计,
+    第一个阶段标记之前的时间计入"启动"
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.offset = None          # 日志时间戳与本地计时的差
+        self.current = '启动'
+        self.current_start = 0.0
+        self.durations = {}         # {阶段: 秒},按首次出现的顺序
+    
+    def _now(self, line):
+        elapsed = time.perf_counter() - self.start
+        m = LOG_TIME_PATTERN.match(line)
+        if not m:
+            return elapsed
+        if self.offset is None:
+            self.offset = elapsed - int(m.group(1)) / 1000
+        return max(self.offset + int(m.group(1)) / 1000, self.current_start)
+    
+    def _switch(self, phase, now):
+        if phase == self.current:
+            return
+        self.durations[self.current] = self.durations.get(self.current, 0.0) + now - self.current_start
+        self.current, self.current_start = phase, now
+    
+    def feed(self, line):
+        for pattern, phase in PHASE_PATTERNS:
+            m = pattern.search(line)
+            if m:
+                self._switch(phase or m.group(1), self._now(line))
+                return
+    
+    def finish(self):
+        """
+        Returns:
+            [(阶段, 秒), ...]  "完成"之后的收尾时间计入"收尾"
+        """
+        now = time.perf_counter() - self.start
+        self._switch('收尾' if self.current == '完成' else '', now)
+        self.durations.pop('完成', None)
+        self.durations.pop('', None)
+        return [(phase, round(seconds, 3)) for phase, seconds in self.durations.items() if seconds > 0]
+
+
+def _process_tree_usage(root_pid):
+    """
+    进程树的CPU时间和内存
+    
+    CPU = 根进程（含已回收子进程）+ 仍在运行的子孙进程,内存为所有进程RSS之和
+    
+    Returns:
+        (cpu_seconds, rss_bytes, process_count),无法获取时返回None
+    """
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil:
+        try:
+            root = psutil.Process(root_pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        cpu = rss = 0.0
+        for proc in procs:
+            try:
+                times = proc.cpu_times()
+                cpu += times.user + times.system
+                if proc.pid == root_pid:
+                    cpu += times.children_user + times.children_system
+                rss += proc.memory_info().rss
+            except psutil.Error:
+                pass
+        return cpu, int(rss), len(procs)
+    
+    if not os.path.isdir('/proc'):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    stats = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # 进程名可能包含空格和括号,从最后一个')'之后解析
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        stats[int(entry)] = fields
+    if root_pid not in stats:
+        return None
+    children = {}
+    for pid, fields in stats.items():
+        children.setdefault(int(fields[1]), []).append(pid)
+    cpu = rss = count = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        fields = stats[pid]
+        cpu += int(fields[11]) + int(fields[12])
+        if pid == root_pid:
+            cpu += int(fields[13]) + int(fields[14])
+        rss += int(fields[21]) * page_size
+        count += 1
+        pending.extend(children.get(pid, []))
+    return cpu / ticks, rss, count
+
+
+class ProcessTreeSampler(threading.Thread):
+    """
+    后台定时采样进程树的CPU时间和峰值内存
+    """
+    def __init__(self, pid, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.cpu_seconds = 0.0
+        self.peak_rss = 0
+        self.peak_procs = 0
+        self.samples = 0
+        self._stop_event = threading.Event()
+    
+    def sample(self):
+        usage = _process_tree_usage(self.pid)
+        if usage is None:
+            return
+        cpu, rss, count = usage
+        self.cpu_seconds = max(self.cpu_seconds, cpu)
+        self.peak_rss = max(self.peak_rss, rss)
+        self.peak_procs = max(self.peak_procs, count)
+        self.samples += 1
+    
+    def run(self):
+        self.sample()
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+    
+    def stop(self):
+        """
+        停止采样
+        
+        Returns:
+            {'cpu_seconds', 'peak_rss', 'peak_procs', 'samples'}  没有任何采样时返回None
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        if not self.samples:
+            return None
+        return {'cpu_seconds': round(self.cpu_seconds, 2), 'peak_rss': self.peak_rss,
+                'peak_procs': self.peak_procs, 'samples': self.samples}
+
+
+def format_phase_report(phases, resources):
+    """阶段耗时和资源占用的说明行"""
+    total = sum(seconds for _, seconds in phases) or 1.0
+    lines = ["阶段用时: " + " | ".join(f"{phase} {seconds:.1f}s ({seconds / total:.0%})" for phase, seconds in phases)]
+    if resources:
+        lines.append(f"资源占用: CPU {resources['cpu_seconds']:.1f}s, 峰值内存 {resources['peak_rss'] / 1024 / 1024:.0f} MB"
+                     f"（进程树最多 {resources['peak_procs']} 个进程）")
+    return lines
+
+
+def write_build_report(name, report, reports_dir=REPORTS_DIR):
+    """写入构建报告,每个目标只保留最近 REPORTS_LIMIT 份,返回报告路径"""
+    os.makedirs(reports_dir, exist_ok=True)
+    path = os.path.join(reports_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    pattern = re.compile(re.escape(name) + r'-\d{8}-\d{6}\.json$')
+    old_reports = sorted(f for f in os.listdir(reports_dir) if pattern.match(f))
+    for filename in old_reports[:-REPORTS_LIMIT]:
+        try:
+            os.remove(os.path.join(reports_dir, filename))
+        except OSError:
+            pass
+    return path
+
+
+def report_build(name, scripts, returncode, timed_out, elapsed, stats, cmd, log):
+    """显示阶段耗时和资源占用,并写入构建报告"""
+    for line in format_phase_report(stats['phases'], stats['resources']):
+        log(line)
+    report = {
+        'name': name,
+        'scripts': [os.path.abspath(script) for script in scripts],
+        'status': 'ok' if returncode == 0 else ('timeout' if timed_out else 'failed'),
+        'returncode': returncode,
+        'elapsed': round(elapsed, 3),
+        'phases': [{'phase': phase, 'seconds': seconds} for phase, seconds in stats['phases']],
+        'resources': stats['resources'],
+        'command': cmd,
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    try:
+        log(f"构建报告: {write_build_report(name, report)}")
+    except OSError as e:
+        log(f"警告: 无法写入构建报告: {e}")
+
+
+def get_worker_paths(interpreter, worker_dir=WORKER_DIR):
+    """
+    常驻打包进程的状态文件、监听地址和日志文件（每个解释器一个,按项目区分）
+
+    AF_UNIX地址长度有限（约108字节）,监听地址放在临时目录
+    """
+    ident = f"{os.path.normcase(os.path.abspath(interpreter))}|{os.path.abspath(worker_dir)}"
+    key = hashlib.sha256(ident.encode('utf-8')).hexdigest()[:12]
+    return (os.path.join(worker_dir, f'{key}.json'),
+            os.path.join(tempfile.gettempdir(), f'mypackager-worker-{key}.sock'),
+            os.path.join(worker_dir, f'{key}.log'))
+
+
+def worker_supported():
+    """需要fork,Windows上不支持常驻打包进程"""
+    return hasattr(os, 'fork') and sys.platform != 'win32'
+
+
+def load_worker_state(interpreter):
+    state_file, _, _ = get_worker_paths(interpreter)
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def worker_request(state, message):
+    """向常驻进程发送一个请求并返回回复,连接失败时返回None"""
+    try:
+        with Client(state['address'], 'AF_UNIX', authkey=bytes.fromhex(state['authkey'])) as conn:
+            conn.send(message)
+            return conn.recv()
+    except (OSError, EOFError, ValueError, KeyError, AuthenticationError):
+        return None
+
+
+def ping_worker(interpreter):
+    """
+    常驻进程正在运行时返回 (状态, 运行信息),否则返回 (None, None)
+    """
+    state = load_worker_state(interpreter) if worker_supported() else None
+    if not state:
+        return None, None
+    reply = worker_request(state, ('ping', None))
+    if not reply or reply[0] != 'pong':
+        return None, None
+    return state, reply[1]
+
+
+def start_worker(interpreter):
+    """
+    启动常驻打包进程（已在运行时直接返回）
+
+    Returns:
+        (ok, msg)
+    """
+    if not worker_supported():
+        return False, '常驻打包进程需要fork,当前系统不支持,打包时仍使用独立的PyInstaller进程'
+    state, info = ping_worker(interpreter)
+    if state:
+        return True, f"常驻打包进程已在运行 (pid {info['pid']}, PyInstaller {info['pyinstaller']})"
+
+    state_file, address, log_file = get_worker_paths(interpreter)
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    if os.path.exists(address):
+        os.remove(address)  # 上次异常退出留下的套接字文件
+    authkey = os.urandom(32)
+    env = os.environ.copy()
+    env.setdefault('PYTHONIOENCODING', 'utf-8')
+    with open(log_file, 'w', encoding='utf-8') as log_handle:
+        proc = subprocess.Popen([interpreter, '-u', '-c', WORKER_CODE, address], stdin=subprocess.PIPE,
+                                stdout=log_handle, stderr=subprocess.STDOUT, env=env, start_new_session=True)
+    proc.stdin.write(authkey.hex().encode('ascii') + b'\n')
+    proc.stdin.close()
+
+    state = {'pid': proc.pid, 'address': address, 'authkey': authkey.hex(),
+             'interpreter': os.path.abspath(interpreter), 'started': time.time()}
+    fd = os.open(state_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+
+    deadline = time.time() + WORKER_START_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            os.remove(state_file)
+            return False, f'常驻打包进程启动失败（退出码 {proc.returncode}）,日志: {log_file}'
+        reply = worker_request(state, ('ping', None)) if os.path.exists(address) else None
+        if reply and reply[0] == 'pong':
+            _worker_cache.pop(os.path.abspath(interpreter), None)
+            return True, (f"常驻打包进程已启动 (pid {proc.pid}, PyInstaller {reply[1]['pyinstaller']}, "
+                          f"Python {reply[1]['python']})")
+        time.sleep(0.1)
+    proc.kill()
+    os.remove(state_file)
+    return False, f'常驻打包进程在 {WORKER_START_TIMEOUT}s 内没有就绪,日志: {log_file}'
+
+
+def stop_worker(interpreter):
+    """
+    停止常驻打包进程（正在执行的打包任务不受影响）
+
+    Returns:
+        (ok, msg)
+    """
+    state = load_worker_state(interpreter)
+    if not state:
+        return True, '常驻打包进程未运行'
+    reply = worker_request(state, ('stop', None))
+    state_file, address, _ = get_worker_paths(interpreter)
+    os.remove(state_file)
+    if reply and reply[0] == 'bye':
+        return True, f"常驻打包进程已停止 (pid {state['pid']})"
+    if os.path.exists(address):
+        os.remove(address)
+    return True, '常驻打包进程已不在运行,已清除状态文件'
+
+
+def format_worker_status(interpreter):
+    state, info = ping_worker(interpreter)
+    if not state:
+        return '常驻打包进程未运行'
+    return (f"常驻打包进程运行中: pid {info['pid']}, PyInstaller {info['pyinstaller']}, Python {info['python']}, "
+            f"已运行 {info['uptime']:.0f}s, 已执行 {info['builds']} 次打包, 当前 {info['running']} 个")
+
+
+def get_worker(interpreter, probe=None):
+    """
+    打包时使用的常驻进程状态（没有运行时为None）,同一次运行中只检查一次
+
+    常驻进程保留的是它启动时导入的PyInstaller,与probe记录的版本不同（如之后升级过）时重启它,
+    重启失败或版本仍不一致时不使用常驻进程
+    """
+    key = os.path.abspath(interpreter)
+    with _print_lock:
+        if key not in _worker_cache:
+            state, info = ping_worker(interpreter)
+            if state and probe and probe.get('pyinstaller') and info['pyinstaller'] != probe['pyinstaller']:
+                print(f"常驻打包进程使用的 PyInstaller {info['pyinstaller']} 与当前安装的 {probe['pyinstaller']} "
+                      f"不一致,正在重启", flush=True)
+                stop_worker(interpreter)
+                ok, msg = start_worker(interpreter)
+                print(msg if ok else f"警告: {msg}", flush=True)
+                state, info = ping_worker(interpreter) if ok else (None, None)
+                if state and info['pyinstaller'] != probe['pyinstaller']:
+                    print("警告: 重启后版本仍不一致,本次使用独立的PyInstaller进程", flush=True)
+                    state = None
+            _worker_cache[key] = state
+        return _worker_cache[key]
+
+
+class _WorkerJob:
+    """常驻进程中的打包任务,可以像Popen一样kill()（终止整个进程组）"""
+    def __init__(self, pid):
+        self.pid = pid
+
+    def kill(self):
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def run_pyinstaller_in_worker(state, pyinstaller_args, env, log, timeout=600):
+    """
+    把打包任务交给常驻进程执行,逐行转发输出
+
+    Returns:
+        与 run_pyinstaller 相同；无法连接常驻进程时返回None
+    """
+    try:
+        conn = Client(state['address'], 'AF_UNIX', authkey=bytes.fromhex(state['authkey']))
+        conn.send(('build', {'args': pyinstaller_args, 'env': env, 'cwd': os.getcwd()}))
+        kind, pid = conn.recv()
+    except (OSError, EOFError, ValueError, AuthenticationError):
+        return None
+
+    job = _WorkerJob(pid)
+    _running_procs.add(job)
+    timed_out = threading.Event()
+    phase_timer = PhaseTimer()
+    sampler = ProcessTreeSampler(pid)
+    sampler.start()
+
+    def on_timeout():
+        timed_out.set()
+        job.kill()
+
+    timer = threading.Timer(timeout, on_timeout)
+    timer.start()
+    returncode = -1
+    exited = False
+    try:
+        log(f"使用常驻打包进程 (pid {state['pid']}) -> 任务进程 {pid}")
+        while True:
+            try:
+                kind, value = conn.recv()
+            except (OSError, EOFError):
+                log('常驻打包进程的任务连接中断')
+                break
+            if kind == 'line':
+                phase_timer.feed(value)
+                log(value)
+            elif kind == 'exit':
+                returncode = value
+                exited = True
+                break
+    finally:
+        timer.cancel()
+        # 任务进程在常驻进程的会话中,终端的Ctrl+C到不了它；没有正常结束（如KeyboardInterrupt）时在这里终止
+        if not exited:
+            job.kill()
+        conn.close()
+        _running_procs.discard(job)
+        resources = sampler.stop()
+    return returncode, timed_out.is_set(), {'phases': phase_timer.finish(), 'resources': resources}
+
+
+def run_pyinstaller(cmd, work_dir, log, timeout=600, use_worker=True, probe=None):
+    """
+    运行PyInstaller,逐行转发输出
+    
+    每个任务使用独立的PYINSTALLER_CONFIG_DIR（bincache等）,并发时互不干扰,
+    --clean 也只清理本任务的缓存；该解释器的常驻打包进程在运行时交给它执行（使用同样的环境变量）
+    
+    Returns:
+        (returncode, timed_out, stats)  stats为 {'phases': [(阶段, 秒), ...], 'resources': 进程树采样结果}
+    """
+    env = os.environ.copy()
+    env['PYINSTALLER_CONFIG_DIR'] = os.path.join(work_dir, '.pyinstaller')
+    env.setdefault('PYTHONIOENCODING', 'utf-8')
+    
+    worker = get_worker(cmd[0], probe) if use_worker else None
+    if worker:
+        result = run_pyinstaller_in_worker(worker, cmd[3:], env, log, timeout)
+        if result is not None:
+            return result
+        log('警告: 无法连接常驻打包进程,改用独立的PyInstaller进程')
+    
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        env=env,
+        encoding='utf-8',
+        errors='replace'
+    )
+    _running_procs.add(proc)
+    timed_out = threading.Event()
+    phase_timer = PhaseTimer()
+    sampler = ProcessTreeSampler(proc.pid)
+    sampler.start()
+    
+    def on_timeout():
+        timed_out.set()
+        proc.kill()
+    
+    timer = threading.Timer(timeout, on_timeout)
+    timer.start()
+    try:
+        for line in proc.stdout:
+            line = line.rstrip('\n')
+            phase_timer.feed(line)
+            log(line)
+        proc.wait()
+    finally:
+        timer.cancel()
+        _running_procs.discard(proc)
+        resources = sampler.stop()
+    return proc.returncode, timed_out.is_set(), {'phases': phase_timer.finish(), 'resources': resources}
+
+
+def package_script(script_path, args, config, prefix='', probe=None, manifest=None):
+    """
+    打包单个脚本
+    
+    Args:
+        prefix: 控制台输出的行前缀（并发打包时用于区分任务）
+        probe: probe_interpreter() 的结果,提供时启用构建缓存
+        manifest: 构建缓存清单
+    
+    Returns:
+        (status, elapsed, log_file, saved)  status为 'ok'、'cached' 或 'failed',
+        saved为增量构建节省的秒数
+    """
+    start = time.time()
+    if not os.path.exists(script_path):
+        with _print_lock:
+            print(f"{prefix}错误: 脚本文件不存在: {script_path}")
+        return 'failed', 0.0, None, 0.0
+    
+    script_name = os.path.basename(script_path)
+    name = get_job_name(script_path, args)
+    output_dir, work_dir, spec_dir = get_job_dirs(name, args, config)
     
     # 确保目录存在
-    for dir_path in [output_dir, build_dir, spec_dir]:
+    for dir_path in [output_dir, work_dir, spec_dir]:
         try:
             os.makedirs(dir_path, exist_ok=True)
         except OSError as e:
-            print(f"警告: 无法创建目录 {dir_path}: {e}")
+            with _print_lock:
+                print(f"{prefix}警告: 无法创建目录 {dir_path}: {e}")
+    
+    # 自动排除：静态分析import图,用不到的模块作为 --exclude-module
+    excludes, exclude_report = (), None
+    if args.auto_exclude and probe:
+        keep = get_keep_modules(config, script_path, args.keep_module)
+        excludes, exclude_report = compute_auto_excludes([script_path], probe, keep, work_dir)
+    
+    # 运行记录裁剪：排除冒烟运行中从未加载的模块
+    profile_path = get_profile_path(spec_dir, name)
+    profile = load_profile(profile_path)
+    prune_report = None
+    if args.prune and profile.get('modules'):
+        keep = get_keep_modules(config, script_path, args.keep_module)
+        keep |= {module.split('.')[0] for module in args.hidden_import or []}
+        interpreter = args.interpreter if args.interpreter else find_python_interpreter(config)
+        prune_excludes, prune_report = compute_prune_excludes(profile, work_dir, keep, interpreter)
+        excludes = sorted(set(excludes) | set(prune_excludes))
+        save_profile(profile_path, profile)
+    
+    # 持久解压：以目录模式构建到构建目录,成功后安装到运行目录并生成启动器
+    build_args, build_output = args, output_dir
+    if args.persistent:
+        build_args = argparse.Namespace(**vars(args))
+        build_args.onedir = True
+        build_output = os.path.join(work_dir, PERSISTENT_STAGING_DIR)
     
-    # 构建完整命令
+    # 构建缓存：构建键未变且输出完好时跳过
     interpreter = args.interpreter if args.interpreter else find_python_interpreter(config)
-    cmd = [interpreter, '-m', 'PyInstaller'] + pyinstaller_args
+    pyinstaller_args = build_pyinstaller_args(script_path, name, build_args, config, build_output, work_dir, spec_dir,
+                                              excludes=excludes)
+    key = artifact = None
+    if probe and manifest is not None:
+        key = compute_build_key(script_path, pyinstaller_args, probe)
+        if args.persistent:
+            # 版本目录在构建后才知道,使用上次安装的版本目录（启动器仍指向它时）
+            launcher = get_launcher_path(output_dir, name, probe)
+            artifact = read_launcher_target(launcher) if os.path.isfile(launcher) else ''
+        else:
+            artifact = get_artifact_path(output_dir, name, args.onedir, probe)
+        if not args.force and is_build_cached(manifest, name, key, artifact):
+            if not args.quiet:
+                with _print_lock:
+                    print(f"{prefix}[CACHED] {script_name} 未变化,跳过打包: {artifact}")
+            return 'cached', time.time() - start, None, 0.0
+    
+    # 清理策略：auto时只有环境变化才清理
+    fingerprint = compute_env_fingerprint(probe, pyinstaller_args) if probe else None
+    clean, clean_reason = decide_clean(args.clean_policy, work_dir, fingerprint)
+    if clean:
+        pyinstaller_args.insert(-1, '--clean')
     
-    print(f"解释器: {interpreter}")
-    print(f"输出目录: {output_dir}")
-    print(f"命令: {' '.join(cmd)}")
-    print()
+    log_file = os.path.join(work_dir, 'build.log')
+    log_handle = open(log_file, 'w', encoding='utf-8')
+    
+    def log(line, echo=True):
+        log_handle.write(line + '\n')
+        if echo and not args.quiet:
+            with _print_lock:
+                print(f"{prefix}{line}", flush=True)
     
-    # 执行打包
     try:
-        result = subprocess.run(cmd, timeout=args.timeout if args.timeout else 600)
+        # 构建完整命令
+        cmd = [interpreter, '-m', 'PyInstaller'] + pyinstaller_args
         
-        if result.returncode == 0:
-            print(f"\n[OK] {script_name} 打包成功!")
-            print(f"     输出位置: {output_dir}")
-            return True
+        if not prefix:
+            log(f"\n{'='*60}")
+            log(f"开始打包: {script_name}")
+            log(f"{'='*60}")
         else:
-            print(f"\n[FAIL] {script_name} 打包失败!")
-            return False
-    except subprocess.TimeoutExpired:
-        print(f"\n[FAIL] {script_name} 打包超时!")
-        return False
+            log(f"开始打包: {script_name}")
+        log(f"解释器: {interpreter}")
+        log(f"输出目录: {output_dir}")
+        log(f"清理策略: {args.clean_policy} -> {clean_reason}")
+        if exclude_report:
+            log(format_exclude_report(exclude_report))
+        if prune_report:
+            log(f"运行记录裁剪: 冒烟运行加载了 {prune_report['loaded']} 个顶层模块, "
+                f"构建收集了 {prune_report['collected']} 个, 裁剪 {prune_report['pruned']} 个")
+        elif args.prune:
+            log(f"运行记录裁剪: 没有 {profile_path},先运行 --profile 记录加载的模块")
+        log(f"命令: {' '.join(cmd)}")
+        
+        # 执行打包
+        returncode, timed_out, stats = run_pyinstaller(cmd, work_dir, log, args.timeout if args.timeout else 600,
+                                                       not args.no_worker, probe)
+        elapsed = time.time() - start
+        report_build(name, [script_path], returncode, timed_out, elapsed, stats, cmd, log)
+        
+        if returncode == 0:
+            log(f"[OK] {script_name} 打包成功! ({elapsed:.1f}s)")
+            log(f"     输出位置: {output_dir}")
+            if args.persistent:
+                version_dir, reused, removed = install_persistent(
+                    os.path.join(build_output, name), get_runtime_root(output_dir, config), name,
+                    config.get('persistent_keep_versions', 2))
+                artifact = version_dir
+                launcher = write_launcher(output_dir, name, version_dir, probe)
+                log(f"     持久解压: {launcher} -> {version_dir}" + ('（内容未变,复用已有版本）' if reused else '')
+                    + (f", 清理旧版本 {removed} 个" if removed else ''))
+            if exclude_report and artifact:
+                log(format_build_change((manifest or {}).get(name), artifact, elapsed))
+            if profile.get('modules'):
+                output = artifact or get_artifact_path(output_dir, name, build_args.onedir, probe)
+                executable = get_executable_path(output, name, build_args.onedir, probe)
+                pruned = bool(prune_report and prune_report['pruned'])
+                smoke_ok, lines = check_pruned_build(profile, profile_path, executable, output, pruned, args.timeout)
+                for line in lines:
+                    log(f"     {line}")
+                # 裁剪后无法运行的输出不记入构建缓存,下次重新打包
+                if pruned and not smoke_ok:
+                    log(f"[FAIL] {script_name} 裁剪后冒烟运行失败! 日志: {log_file}")
+                    return 'failed', elapsed, log_file, 0.0
+            if key:
+                record_build(name, key, artifact, elapsed)
+            saved = 0.0
+            if fingerprint:
+                saved = save_env_fingerprint(work_dir, fingerprint, elapsed, clean)
+                if saved > 0:
+                    log(f"     增量构建比上次清理构建节省约 {saved:.1f}s")
+            return 'ok', elapsed, log_file, saved
+        elif timed_out:
+            log(f"[FAIL] {script_name} 打包超时!")
+        else:
+            log(f"[FAIL] {script_name} 打包失败! 日志: {log_file}")
+        return 'failed', elapsed, log_file, 0.0
     except Exception as e:
-        print(f"\n[FAIL] {script_name} 打包出错: {e}")
-        return False
+        log(f"[FAIL] {script_name} 打包出错: {e}")
+        return 'failed', time.time() - start, log_file, 0.0
+    finally:
+        log_handle.close()
+
+
+def package_scripts(scripts, args, config, jobs=1, probe=None):
+    """
+    打包多个脚本,jobs>1时并发执行
+    
+    Returns:
+        [(script, status, elapsed, log_file, saved), ...]
+    """
+    manifest = load_build_manifest() if probe and not args.no_cache else None
+    if jobs <= 1 or len(scripts) <= 1:
+        return [(script,) + package_script(script, args, config, probe=probe, manifest=manifest)
+                for script in scripts]
+    
+    width = max(len(get_job_name(script, args)) for script in scripts)
+    
+    def run(script):
+        prefix = f"[{get_job_name(script, args):<{width}}] "
+        return (script,) + package_script(script, args, config, prefix, probe, manifest)
+    
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        return list(executor.map(run, scripts))
+    except KeyboardInterrupt:
+        for proc in list(_running_procs):
+            proc.kill()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+
+def package_shared_bundle(scripts, bundle_name, args, config, probe=None):
+    """
+    共享打包：一个spec、一次PyInstaller进程,输出 <输出目录>/<bundle_name>/ 下的多个可执行文件
+    
+    Returns:
+        [(bundle_name, status, elapsed, log_file, saved)]
+    """
+    start = time.time()
+    entries = [(script, get_job_name(script, argparse.Namespace(name=None))) for script in scripts]
+    output_dir, work_dir, spec_dir = get_job_dirs(bundle_name, args, config)
+    for dir_path in [output_dir, work_dir, spec_dir]:
+        os.makedirs(dir_path, exist_ok=True)
+    spec_path = os.path.join(spec_dir, f'{bundle_name}.spec')
+    
+    tokens = get_spec_tokens(args, config)
+    exclude_report = None
+    if args.auto_exclude and probe:
+        keep = set()
+        for script in scripts:
+            keep |= get_keep_modules(config, script, args.keep_module)
+        excludes, exclude_report = compute_auto_excludes(scripts, probe, keep, work_dir)
+        for module in excludes:
+            tokens += ['--exclude-module', module]
+    unsupported = generate_shared_spec(entries, bundle_name, spec_path, args.console, args.icon, tokens)
+    pyinstaller_args = ['--noconfirm', f'--distpath={output_dir}', f'--workpath={work_dir}', spec_path]
+    
+    # 构建缓存：每个入口的构建键合并为一个
+    artifact = os.path.join(output_dir, bundle_name)
+    key = fingerprint = None
+    if probe:
+        options = get_shared_options(tokens, args.console, args.icon, output_dir)
+        key = compute_bundle_key(entries, options, probe)
+        if not args.no_cache and not args.force and is_build_cached(load_build_manifest(), bundle_name, key, artifact):
+            print(f"[CACHED] {bundle_name} 未变化,跳过打包: {artifact}")
+            return [(bundle_name, 'cached', time.time() - start, None, 0.0)]
+        fingerprint = compute_env_fingerprint(probe, options + [name for _, name in entries] + [spec_path])
+    clean, clean_reason = decide_clean(args.clean_policy, work_dir, fingerprint)
+    if clean:
+        pyinstaller_args.insert(-1, '--clean')
+    
+    log_file = os.path.join(work_dir, 'build.log')
+    with open(log_file, 'w', encoding='utf-8') as log_handle:
+        def log(line):
+            log_handle.write(line + '\n')
+            if not args.quiet:
+                print(line, flush=True)
+        
+        interpreter = args.interpreter if args.interpreter else find_python_interpreter(config)
+        cmd = [interpreter, '-m', 'PyInstaller'] + pyinstaller_args
+        log(f"\n{'='*60}")
+        log(f"共享打包: {bundle_name} ({len(entries)} 个入口: {', '.join(name for _, name in entries)})")
+        log(f"{'='*60}")
+        log(f"spec文件: {spec_path}")
+        if unsupported:
+            log(f"警告: 共享打包的spec不支持以下参数,已忽略: {' '.join(unsupported)}")
+        log(f"清理策略: {args.clean_policy} -> {clean_reason}")
+        if exclude_report:
+            log(format_exclude_report(exclude_report))
+        log(f"命令: {' '.join(cmd)}")
+        
+        returncode, timed_out, stats = run_pyinstaller(cmd, work_dir, log, args.timeout if args.timeout else 600,
+                                                       not args.no_worker, probe)
+        elapsed = time.time() - start
+        report_build(bundle_name, scripts, returncode, timed_out, elapsed, stats, cmd, log)
+        if returncode != 0:
+            log(f"[FAIL] {bundle_name} {'打包超时' if timed_out else '打包失败'}! 日志: {log_file}")
+            return [(bundle_name, 'failed', elapsed, log_file, 0.0)]
+        
+        log(f"[OK] {bundle_name} 打包成功! ({elapsed:.1f}s)")
+        log(f"     输出位置: {artifact} ({get_dir_size(artifact) / 1024 / 1024:.1f} MB)")
+        if exclude_report:
+            log(format_build_change(load_build_manifest().get(bundle_name), artifact, elapsed))
+        if key and not args.no_cache:
+            record_build(bundle_name, key, artifact, elapsed)
+        saved = save_env_fingerprint(work_dir, fingerprint, elapsed, clean) if fingerprint else 0.0
+        return [(bundle_name, 'ok', elapsed, log_file, saved)]
+
+def _load_toml(path):
+    """读取TOML（Python 3.11+ 的tomllib,或安装了tomli时）"""
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            return None, f'读取 {path} 需要Python 3.11+ 或 pip install tomli,也可以改用 {TARGETS_FILE}'
+    try:
+        with open(path, 'rb') as f:
+            return tomllib.load(f), None
+    except (OSError, ValueError) as e:
+        return None, f'无法读取 {path}: {e}'
+
+
+def find_targets_file():
+    """默认的打包清单：优先TOML,其次JSON,都不存在时返回None"""
+    for path in (TARGETS_TOML_FILE, TARGETS_FILE):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def load_targets(path=None):
+    """
+    读取打包清单,检查格式并补全默认值
+
+    清单格式（JSON,TOML为对应的 [targets.<名称>] 表）：
+        {"targets": {"server": {"script": "src/server.py", "icon": "res/app.ico", "onefile": true,
+                                "console": true, "add_data": ["res;res"], "hidden_imports": ["pkg.plugin"],
+                                "extra_args": [], "depends_on": ["helper"]}}}
+    目标名默认作为输出名称（可用 "name" 另外指定）,onefile/console 未填写时使用命令行参数
+
+    Returns:
+        (targets, error)  targets为按清单顺序的 {目标名: 目标配置},出错时为 (None, 错误信息)
+    """
+    path = path or find_targets_file()
+    if not path:
+        return None, f'没有打包清单,请创建 {TARGETS_FILE} 或 {TARGETS_TOML_FILE}'
+    if path.endswith('.toml'):
+        data, error = _load_toml(path)
+        if error:
+            return None, error
+    else:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            return None, f'无法读取 {path}: {e}'
+
+    raw_targets = data.get('targets') if isinstance(data, dict) else None
+    if not isinstance(raw_targets, dict) or not raw_targets:
+        return None, f'{path} 中没有 targets'
+
+    targets = {}
+    names = {}
+    for key, raw in raw_targets.items():
+        if not isinstance(raw, dict):
+            return None, f'目标 {key} 应为一个表/对象'
+        unknown = sorted(set(raw) - set(TARGET_KEYS))
+        if unknown:
+            return None, f"目标 {key} 有未知的字段: {', '.join(unknown)}（可用: {', '.join(TARGET_KEYS)}）"
+        if not isinstance(raw.get('script'), str) or not raw['script']:
+            return None, f'目标 {key} 缺少 script'
+        target = {
+            'script': raw['script'],
+            'name': raw.get('name') or key,
+            'icon': raw.get('icon'),
+            'onefile': raw.get('onefile'),
+            'console': raw.get('console'),
+        }
+        for field in ('add_data', 'hidden_imports', 'extra_args', 'depends_on'):
+            value = raw.get(field, [])
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                return None, f'目标 {key} 的 {field} 应为字符串列表'
+            target[field] = value
+        for field in ('onefile', 'console'):
+            if target[field] is not None and not isinstance(target[field], bool):
+                return None, f'目标 {key} 的 {field} 应为 true/false'
+        if target['name'] in names:
+            return None, f"目标 {names[target['name']]} 和 {key} 的输出名称都是 {target['name']}"
+        names[target['name']] = key
+        targets[key] = target
+    return targets, None
+
+
+def plan_targets(targets, selected=None):
+    """
+    按依赖关系排出打包顺序（拓扑排序,同一层按清单顺序）
+
+    Args:
+        selected: 只打包这些目标（及其依赖）,None或空表示全部
+
+    Returns:
+        (order, error)  order为目标名列表,依赖在前
+    """
+    for key, target in targets.items():
+        missing = [dep for dep in target['depends_on'] if dep not in targets]
+        if missing:
+            return None, f"目标 {key} 依赖的目标不存在: {', '.join(missing)}"
+
+    # 选中的目标及其递归依赖
+    if selected:
+        unknown = [key for key in selected if key not in targets]
+        if unknown:
+            return None, f"清单中没有目标: {', '.join(unknown)}"
+        needed = set()
+        stack = list(selected)
+        while stack:
+            key = stack.pop()
+            if key not in needed:
+                needed.add(key)
+                stack.extend(targets[key]['depends_on'])
+    else:
+        needed = set(targets)
+
+    keys = [key for key in targets if key in needed]
+    remaining = {key: set(targets[key]['depends_on']) for key in keys}
+    order = []
+    while remaining:
+        ready = [key for key in keys if key in remaining and not remaining[key]]
+        if not ready:
+            return None, f"目标之间存在循环依赖: {', '.join(sorted(remaining))}"
+        for key in ready:
+            del remaining[key]
+            order.append(key)
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return order, None
+
+
+def hash_targets(targets):
+    """清单内容的指纹（清单变化后不再继续上次中断的构建）"""
+    return hashlib.sha256(json.dumps(targets, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_build_state(state_file=BUILD_STATE_FILE):
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_build_state(state, state_file=BUILD_STATE_FILE):
+    """先写临时文件再替换,中途崩溃也不会留下半个文件"""
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, state_file)
+
+
+def get_target_args(target, args):
+    """清单目标的打包参数：在命令行参数的基础上使用目标自己的设置"""
+    target_args = argparse.Namespace(**vars(args))
+    target_args.name = target['name']
+    if target['icon']:
+        target_args.icon = target['icon']
+    if target['onefile'] is not None:
+        target_args.onedir = not target['onefile']
+    if target['console'] is not None:
+        target_args.console = target['console']
+    if target['add_data']:
+        target_args.add_data = (args.add_data or []) + target['add_data']
+    if target['hidden_imports']:
+        target_args.hidden_import = (args.hidden_import or []) + target['hidden_imports']
+    if target['extra_args']:
+        target_args.extra_args = (args.extra_args or []) + target['extra_args']
+    if target_args.onedir:
+        target_args.persistent = False
+    return target_args
+
+
+def build_targets(targets, order, args, config, jobs=1, probe=None):
+    """
+    按依赖关系打包清单中的目标,互不依赖的目标并发执行
+
+    - 依赖全部成功（或命中缓存）后才开始,依赖失败时跳过（blocked）
+    - 依赖在该目标上次成功打包之后重新打包过时,强制重新打包
+    - 每个目标结束后把状态写入 build_state.json；中断后再次运行同一份清单时继续：
+      已完成且依赖没有再重新打包的目标不强制重新打包（由构建缓存跳过,不使用缓存时直接跳过）,
+      中断时正在打包的目标清理后重新打包
+
+    Returns:
+        [(目标名称, status, elapsed, log_file, saved), ...]  按order排序,status多了 'blocked'
+    """
+    targets_hash = hash_targets({key: targets[key] for key in order})
+    previous_state = load_build_state()
+    resumed = previous_state.get('manifest') == targets_hash and not previous_state.get('finished', True)
+    previous = previous_state.get('targets', {}) if resumed else {}
+    # 每个目标记录 status、built（最近一次重新打包的序号）和 deps（上次成功时各依赖的built）；
+    # 旧格式只有状态字符串
+    previous = {key: dict(entry) if isinstance(entry, dict) else {'status': entry}
+                for key, entry in previous.items() if key in order}
+    if resumed and not args.quiet:
+        done = sum(1 for entry in previous.values() if entry['status'] in ('ok', 'cached'))
+        print(f"继续上次中断的构建: 已完成 {done}/{len(order)} 个目标")
+
+    state = {'manifest': targets_hash, 'finished': False, 'started': time.time(),
+             'builds': previous_state.get('builds', 0) if resumed else 0,
+             'targets': {key: dict(entry) for key, entry in previous.items()}}
+    save_build_state(state)
+    lock = threading.Lock()
+    manifest = load_build_manifest() if probe and not args.no_cache else None
+    width = max(len(targets[key]['name']) for key in order)
+
+    def set_status(key, status, deps=None):
+        with lock:
+            entry = state['targets'].setdefault(key, {})
+            entry['status'] = status
+            if status == 'ok':
+                state['builds'] += 1
+                entry['built'] = state['builds']
+            if deps is not None:
+                entry['deps'] = deps
+            save_build_state(state)
+
+    def run(key):
+        target = targets[key]
+        target_args = get_target_args(target, args)
+        entry = previous.get(key, {})
+        with lock:
+            built = {dep: state['targets'].get(dep, {}).get('built') for dep in target['depends_on']}
+        # 依赖在本次或中断前重新打包过,而该目标还没有基于它成功打包
+        changed = [dep for dep, seq in built.items()
+                   if seq is not None and seq != entry.get('deps', {}).get(dep)]
+        prefix = f"[{target['name']:<{width}}] " if jobs > 1 else ''
+        if not changed and entry.get('status') in ('ok', 'cached') and manifest is None:
+            if not args.quiet:
+                with _print_lock:
+                    print(f"{prefix}上次中断前已完成,跳过")
+            return ('cached', 0.0, None, 0.0)
+        if changed:
+            target_args.force = True
+        if entry.get('status') == 'running':
+            target_args.clean_policy = 'always'
+        if changed and not args.quiet:
+            with _print_lock:
+                print(f"{prefix}依赖的目标已重新打包（{', '.join(changed)}）,重新打包")
+        set_status(key, 'running')
+        result = package_script(target['script'], target_args, config, prefix, probe, manifest)
+        set_status(key, result[0], built if result[0] in ('ok', 'cached') else None)
+        return result
+
+    results = {}
+    pending = list(order)
+    running = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, jobs))
+    try:
+        while pending or running:
+            for key in list(pending):
+                deps = targets[key]['depends_on']
+                failed = [dep for dep in deps if results.get(dep, ('',))[0] in ('failed', 'blocked')]
+                if failed:
+                    pending.remove(key)
+                    results[key] = ('blocked', 0.0, None, 0.0)
+                    set_status(key, 'blocked')
+                    with _print_lock:
+                        print(f"[BLOCKED] {targets[key]['name']} 依赖的目标未成功（{', '.join(failed)}）,跳过")
+                elif len(running) < jobs and all(dep in results for dep in deps):
+                    pending.remove(key)
+                    running[executor.submit(run, key)] = key
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    except KeyboardInterrupt:
+        for proc in list(_running_procs):
+            proc.kill()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+    # 全部成功才算完成；有失败时下次运行继续,重新打包的序号一并保留
+    state['finished'] = all(results[key][0] in ('ok', 'cached') for key in order)
+    save_build_state(state)
+    return [(targets[key]['name'],) + results[key] for key in order]
 
 
 def main():
@@ -266,6 +3012,10 @@ def main():
   %(prog)s script.py -o dist -n myapp   # 指定输出目录和名称
   %(prog)s *.py                         # 打包当前目录所有Python脚本
   %(prog)s script.py --onedir           # 使用目录模式
+  %(prog)s tools/*.py -j 4              # 同时打包4个脚本
+  %(prog)s tools/*.py --shared-bundle mytools  # 共享打包到 dist/mytools/
+  %(prog)s --build                      # 按打包清单打包所有目标（按依赖顺序,可并发）
+  %(prog)s --build server               # 只打包server及其依赖的目标
   %(prog)s --check                      # 检查PyInstaller是否已安装
   %(prog)s --install                    # 安装PyInstaller
         """
@@ -294,10 +3044,12 @@ def main():
     
     # 高级选项
     parser.add_argument('--icon', help='应用图标路径 (.ico)')
-    parser.add_argument('--clean', action='store_true', default=True,
-                       help='打包前清理（默认启用）')
+    parser.add_argument('--clean', action='store_true',
+                       help='每次打包前清理（等同于 --clean-policy always）')
     parser.add_argument('--no-clean', action='store_true',
-                       help='打包前不清理')
+                       help='打包前不清理（等同于 --clean-policy never）')
+    parser.add_argument('--clean-policy', choices=CLEAN_POLICIES, default=None,
+                       help='清理策略: auto=环境变化时才清理, always=总是清理, never=从不清理（默认读取配置default_clean）')
     parser.add_argument('--build-dir', help='构建临时文件目录')
     parser.add_argument('--spec-dir', help='spec文件目录')
     
@@ -316,6 +3068,46 @@ def main():
                        help='安装PyInstaller')
     parser.add_argument('--timeout', type=int, default=600,
                        help='打包超时时间（秒，默认600）')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                       help='同时打包的脚本数（默认按CPU核数和可用内存自动决定）')
+    parser.add_argument('--force', action='store_true',
+                       help='忽略构建缓存,强制重新打包')
+    parser.add_argument('--auto-exclude', action='store_true',
+                       help='自动排除入口脚本用不到的模块（静态import图 + 内置黑名单）')
+    parser.add_argument('--no-auto-exclude', action='store_true',
+                       help='不自动排除（覆盖配置中的auto_exclude）')
+    parser.add_argument('--keep-module', action='append', metavar='MODULE',
+                       help='自动排除时保留的模块（可多次使用）')
+    parser.add_argument('--profile', action='store_true',
+                       help='不打包,用目标解释器运行脚本并记录实际加载的模块（供 --prune 使用）')
+    parser.add_argument('--smoke-args', metavar='ARGS',
+                       help='--profile、--bench 和裁剪后冒烟运行时传给脚本的参数,如 --smoke-args="--version"')
+    parser.add_argument('--persistent', action='store_true',
+                       help='持久解压: 以目录模式构建并按内容哈希安装到运行目录,输出目录中生成同名启动器')
+    parser.add_argument('--bench', action='store_true',
+                       help='不打包,测试已打包输出的启动用时、峰值内存和大小（参数为 --smoke-args,默认 --help）')
+    parser.add_argument('--bench-runs', type=int, default=5,
+                       help='启动测试的热启动次数（至少1,默认: 5）')
+    parser.add_argument('--prune', action='store_true',
+                       help='按 --profile 的运行记录排除从未加载的模块')
+    parser.add_argument('--no-prune', action='store_true',
+                       help='不按运行记录裁剪（覆盖配置中的trace_prune）')
+    parser.add_argument('--worker-start', action='store_true',
+                       help='启动该解释器的常驻打包进程（预先导入PyInstaller,之后的打包从它fork执行）')
+    parser.add_argument('--worker-stop', action='store_true',
+                       help='停止常驻打包进程')
+    parser.add_argument('--worker-status', action='store_true',
+                       help='查看常驻打包进程的状态')
+    parser.add_argument('--no-worker', action='store_true',
+                       help='常驻打包进程在运行时也使用独立的PyInstaller进程')
+    parser.add_argument('--build', nargs='*', metavar='TARGET', default=None,
+                       help=f'按打包清单（{TARGETS_FILE} 或 .toml）打包指定目标及其依赖,不指定时打包全部目标')
+    parser.add_argument('--targets', metavar='FILE',
+                       help='打包清单路径（默认自动查找）')
+    parser.add_argument('--shared-bundle', metavar='NAME',
+                       help='共享打包: 所有脚本打成 <输出目录>/NAME/ 下的多个可执行文件,共享同一份依赖')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='不使用也不记录构建缓存')
     parser.add_argument('--config', help='配置文件路径')
     parser.add_argument('-q', '--quiet', action='store_true',
                        help='静默模式，减少输出')
@@ -324,13 +3116,29 @@ def main():
     
     args = parser.parse_args()
     
-    # 处理clean选项
-    if args.no_clean:
-        args.clean = False
-    
     # 加载配置
     config = load_config(args.config)
     
+    # 处理清理策略：--clean/--no-clean 优先,其次 --clean-policy,最后是配置
+    if args.clean:
+        args.clean_policy = 'always'
+    elif args.no_clean:
+        args.clean_policy = 'never'
+    elif args.clean_policy is None:
+        args.clean_policy = normalize_clean_policy(config.get('default_clean', 'auto'))
+    
+    # 自动排除：命令行优先于配置
+    if args.no_auto_exclude:
+        args.auto_exclude = False
+    elif not args.auto_exclude:
+        args.auto_exclude = bool(config.get('auto_exclude', False))
+    if not args.persistent:
+        args.persistent = bool(config.get('persistent_extract', False)) and not args.onedir
+    if args.no_prune:
+        args.prune = False
+    elif not args.prune:
+        args.prune = bool(config.get('trace_prune', False))
+    
     # 获取解释器
     interpreter = args.interpreter if args.interpreter else find_python_interpreter(config)
     
@@ -354,8 +3162,35 @@ def main():
             print("PyInstaller 安装失败")
             return 1
     
+    # 常驻打包进程
+    if args.worker_start or args.worker_stop or args.worker_status:
+        print(f"使用解释器: {interpreter}")
+        if args.worker_stop:
+            ok, msg = stop_worker(interpreter)
+        elif args.worker_start:
+            ok, msg = start_worker(interpreter)
+        else:
+            ok, msg = True, format_worker_status(interpreter)
+        print(msg)
+        return 0 if ok else 1
+    
+    # 按打包清单构建：目标和顺序来自清单
+    targets = order = None
+    if args.build is not None:
+        if args.scripts or args.shared_bundle or args.bench or args.profile:
+            print("错误: --build 不能与脚本参数、--shared-bundle、--bench、--profile 同时使用")
+            return 1
+        targets, error = load_targets(args.targets)
+        if not error:
+            order, error = plan_targets(targets, args.build)
+        if error:
+            print(f"错误: {error}")
+            return 1
+        if not args.quiet:
+            print(f"打包清单: {args.targets or find_targets_file()}, 打包顺序: {' -> '.join(order)}")
+    
     # 检查是否提供了脚本
-    if not args.scripts:
+    if not args.scripts and args.build is None:
         parser.print_help()
         print("\n错误: 请提供要打包的Python脚本")
         return 1
@@ -369,36 +3204,96 @@ def main():
         else:
             scripts.append(pattern)
     
-    if not scripts:
+    if not scripts and args.build is None:
         print("错误: 未找到匹配的Python脚本")
         return 1
     
+    # 启动测试（不需要PyInstaller）
+    if args.bench:
+        if args.bench_runs < 1:
+            print("错误: --bench-runs 至少为1")
+            return 1
+        return 0 if bench_scripts(scripts, args, config, probe_interpreter(interpreter)) else 1
+    
+    # 记录运行时加载的模块（不需要PyInstaller）
+    if args.profile:
+        probe = probe_interpreter(interpreter)
+        failed = 0
+        for script in scripts:
+            ok, msg = profile_script(script, args, config, probe)
+            print(msg if ok else f"错误: {msg}")
+            failed += not ok
+        return 0 if failed == 0 else 1
+    
     # 检查PyInstaller是否已安装
     if not args.quiet:
         print(f"使用解释器: {interpreter}")
     
-    if not check_pyinstaller(interpreter):
+    # 常驻打包进程已经导入了PyInstaller,不需要再启动一个进程检查（先获取解释器信息,用于核对其PyInstaller版本）
+    probe = probe_interpreter(interpreter)
+    worker = None if args.no_worker else get_worker(interpreter, probe)
+    if worker:
+        if not args.quiet:
+            print(f"使用常驻打包进程 (pid {worker['pid']})")
+    elif not check_pyinstaller(interpreter):
         print("PyInstaller 未安装，正在安装...")
         if not install_pyinstaller(interpreter):
             print("PyInstaller 安装失败，请手动安装")
             return 1
+        probe = probe_interpreter(interpreter)
+    
+    # 同名脚本会输出到同一个可执行文件和构建目录
+    names = [get_job_name(script, args) for script in scripts] if order is None else []
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        print(f"错误: 以下脚本名称重复,输出会互相覆盖: {', '.join(duplicates)}")
+        return 1
     
     # 打包脚本
-    success_count = 0
-    fail_count = 0
+    jobs = args.jobs if args.jobs else default_jobs()
+    jobs = max(1, min(jobs, len(scripts) if order is None else len(order)))
+    if jobs > 1 and not args.quiet and not args.shared_bundle:
+        print(f"并发打包: {jobs} 个任务同时进行")
     
-    for script in scripts:
-        if package_script(script, args, config):
-            success_count += 1
-        else:
-            fail_count += 1
+    start = time.time()
+    if probe is None:
+        print("警告: 无法获取解释器信息,本次不使用构建缓存,并在打包前清理")
+    
+    if args.shared_bundle:
+        if args.prune:
+            print("警告: 共享打包不支持运行记录裁剪,已忽略 --prune")
+        if args.persistent:
+            print("提示: 共享打包本身就是目录模式,忽略 --persistent")
+        elif not args.onedir:
+            print("警告: 共享打包只能生成目录形式（多个可执行文件共用一个目录）,忽略 --onefile,"
+                  "使用 -D 可去掉此警告")
+        results = package_shared_bundle(scripts, args.shared_bundle, args, config, probe)
+    elif order is not None:
+        results = build_targets(targets, order, args, config, jobs, probe)
+    else:
+        results = package_scripts(scripts, args, config, jobs, probe)
+    success_count = sum(1 for r in results if r[1] == 'ok')
+    cached_count = sum(1 for r in results if r[1] == 'cached')
+    fail_count = sum(1 for r in results if r[1] == 'failed')
+    blocked_count = sum(1 for r in results if r[1] == 'blocked')
+    saved_total = sum(r[4] for r in results)
     
     # 输出统计
     print(f"\n{'='*60}")
-    print(f"打包完成: 成功 {success_count} 个, 失败 {fail_count} 个")
+    if len(results) > 1:
+        for script, status, elapsed, log_file, _ in results:
+            label = script if order is not None else get_job_name(script, args)
+            line = f"  [{status.upper():<7}] {label:<24} {elapsed:7.1f}s"
+            if status == 'failed' and log_file:
+                line += f"  {log_file}"
+            print(line)
+    print(f"打包完成: 成功 {success_count} 个, 缓存 {cached_count} 个, 失败 {fail_count} 个, "
+          + (f"因依赖失败跳过 {blocked_count} 个, " if blocked_count else "")
+          + f"总用时 {time.time() - start:.1f}s")
+    print(f"清理策略: {args.clean_policy}" + (f", 增量构建共节省约 {saved_total:.1f}s" if saved_total > 0 else ""))
     print(f"{'='*60}")
     
-    return 0 if fail_count == 0 else 1
+    return 0 if fail_count == 0 and blocked_count == 0 else 1
 
 
 if __name__ == "__main__":
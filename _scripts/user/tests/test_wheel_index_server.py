@@ -0,0 +1,142 @@
+"""
+wheel_index_server.py 的冒烟测试：索引、重定向、Range下载、路径穿越,以及pip源配置的补充
+
+运行：
+    python -m pytest _scripts/user/tests
+    python -m unittest discover -s _scripts/user/tests
+"""
+
+import os
+import sys
+import json
+import hashlib
+import tempfile
+import unittest
+import http.client
+import importlib.util
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPT_DIR)
+
+import wheel_index_server  # noqa: E402
+
+WHEEL_NAME = 'Foo_Bar-1.0-py3-none-any.whl'
+WHEEL_DATA = bytes(range(256)) * 4
+
+
+def load_install_module():
+    """2_install_import.py 文件名以数字开头,按路径加载"""
+    spec = importlib.util.spec_from_file_location('install_import', os.path.join(SCRIPT_DIR, '2_install_import.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class WheelIndexServerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.wheelhouse = os.path.join(self.tmp.name, 'wheels')
+        os.makedirs(self.wheelhouse)
+        with open(os.path.join(self.wheelhouse, WHEEL_NAME), 'wb') as f:
+            f.write(WHEEL_DATA)
+        # wheel目录外的文件,不应能通过 /packages/ 访问
+        with open(os.path.join(self.tmp.name, 'secret.whl'), 'wb') as f:
+            f.write(b'secret')
+        self.server, self.thread = wheel_index_server.start_server(self.wheelhouse)
+        self.conn = http.client.HTTPConnection(*self.server.server_address[:2], timeout=10)
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def request(self, path, headers=None):
+        self.conn.request('GET', path, headers=headers or {})
+        response = self.conn.getresponse()
+        return response, response.read()
+
+    def test_index(self):
+        response, body = self.request('/simple/')
+        self.assertEqual(response.status, 200)
+        self.assertIn(b'href="/simple/foo-bar/"', body)
+
+        response, body = self.request('/simple/foo-bar/')
+        self.assertEqual(response.status, 200)
+        digest = hashlib.sha256(WHEEL_DATA).hexdigest()
+        self.assertIn(f'/packages/{WHEEL_NAME}#sha256={digest}'.encode(), body)
+
+        response, _ = self.request('/simple/missing/')
+        self.assertEqual(response.status, 404)
+
+    def test_redirect(self):
+        response, _ = self.request('/simple/Foo_Bar/')
+        self.assertEqual(response.status, 301)
+        self.assertEqual(response.getheader('Location'), '/simple/foo-bar/')
+
+        response, _ = self.request('/')
+        self.assertEqual(response.status, 301)
+        self.assertEqual(response.getheader('Location'), '/simple/')
+
+    def test_range(self):
+        response, body = self.request(f'/packages/{WHEEL_NAME}')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, WHEEL_DATA)
+
+        response, body = self.request(f'/packages/{WHEEL_NAME}', {'Range': 'bytes=10-19'})
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.getheader('Content-Range'), f'bytes 10-19/{len(WHEEL_DATA)}')
+        self.assertEqual(body, WHEEL_DATA[10:20])
+
+        response, body = self.request(f'/packages/{WHEEL_NAME}', {'Range': 'bytes=-5'})
+        self.assertEqual(response.status, 206)
+        self.assertEqual(body, WHEEL_DATA[-5:])
+
+        response, _ = self.request(f'/packages/{WHEEL_NAME}', {'Range': f'bytes={len(WHEEL_DATA)}-'})
+        self.assertEqual(response.status, 416)
+
+    def test_traversal(self):
+        for path in ('/packages/../secret.whl', '/packages/%2e%2e/secret.whl', '/packages/%2e%2e%2fsecret.whl'):
+            response, body = self.request(path)
+            self.assertEqual(response.status, 404, path)
+            self.assertNotIn(b'secret', body)
+
+    def test_new_wheel_is_indexed(self):
+        self.request('/simple/')
+        with open(os.path.join(self.wheelhouse, 'baz-2.0-py3-none-any.whl'), 'wb') as f:
+            f.write(b'baz')
+        # 目录mtime的精度可能较低,强制变化
+        st = os.stat(self.wheelhouse)
+        os.utime(self.wheelhouse, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+        response, body = self.request('/simple/')
+        self.assertIn(b'href="/simple/baz/"', body)
+
+
+class PipSourceConfigTest(unittest.TestCase):
+    def test_merge_missing_sources(self):
+        install_mod = load_install_module()
+        config = {'pip_source': 1, 'pip_source_list': {'1': {'name': '自定义', 'url': 'https://example.com/simple'}}}
+        self.assertTrue(install_mod.merge_config_addon(config))
+        self.assertEqual(config['pip_source_list']['1']['url'], 'https://example.com/simple')
+        self.assertIn('4', config['pip_source_list'])
+        self.assertFalse(install_mod.merge_config_addon(config))
+
+    def test_load_config_writes_back(self):
+        install_mod = load_install_module()
+        with tempfile.TemporaryDirectory() as tmp:
+            config_path = os.path.join(tmp, 'pyenv.json')
+            with open(config_path, 'w', encoding='utf-8') as f:
+                json.dump({'pip_source': 0, 'pip_source_list': {'0': {'name': '默认源', 'url': None}}}, f)
+            install_mod.load_config(config_path)
+            with open(config_path, 'r', encoding='utf-8') as f:
+                self.assertIn('4', json.load(f)['pip_source_list'])
+
+    def test_trusted_host(self):
+        install_mod = load_install_module()
+        url = 'http://127.0.0.1:8765/simple/'
+        self.assertEqual(install_mod.get_pip_source_args(url), ['-i', url, '--trusted-host', '127.0.0.1'])
+        self.assertEqual(install_mod.get_pip_source_args(None), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,312 @@
+"""
+本地wheel源服务器（PEP 503 simple index）
+
+把本地wheelhouse目录通过HTTP共享给局域网内的其他机器,pip可以直接把它当作源使用
+
+使用方法：
+    python myscript/wheel_index_server.py                          # 默认共享 .misc/.wheelhouse, 端口8765
+    python myscript/wheel_index_server.py --dir D:/wheels --port 9000
+    python myscript/wheel_index_server.py --host 127.0.0.1         # 只允许本机访问
+
+在 .config/pyenv.json 的 pip_source_list 中添加一项即可使用：
+    "4": {"name": "本地wheel源", "url": "http://192.168.1.10:8765/simple/"}
+
+逻辑：
+    1. 内存中维护索引 {规范化包名: [(文件名, sha256), ...]}
+    2. 每次请求前检查目录的mtime,目录有变化（新增/删除wheel）才重建索引,
+       已计算过的sha256按(文件名, 大小, mtime)缓存,重建时不重复计算
+    3. /simple/ 列出所有包, /simple/<包名>/ 列出该包的文件（带#sha256=校验）
+    4. /packages/<文件名> 下载文件,支持HTTP Range断点续传
+    5. 使用HTTP/1.1 keep-alive,pip可复用连接连续下载多个文件
+    6. 只依赖标准库,测试中可用 start_server(port=0) 启动一个临时的确定性源
+"""
+
+import os
+import re
+import sys
+import html
+import hashlib
+import argparse
+import threading
+from urllib.parse import unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WHEELHOUSE_DIR = '.misc/.wheelhouse'
+DEFAULT_HOST = '0.0.0.0'
+DEFAULT_PORT = 8765
+
+# 可以作为包文件提供下载的扩展名
+PACKAGE_EXTENSIONS = ('.whl', '.tar.gz', '.zip')
+
+
+def normalize_name(name):
+    """PEP 503 包名规范化"""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def parse_project_name(filename):
+    """从wheel/sdist文件名中解析出包名"""
+    if filename.endswith('.whl'):
+        return filename.split('-', 1)[0]
+    for ext in ('.tar.gz', '.zip'):
+        if filename.endswith(ext):
+            return filename[:-len(ext)].rsplit('-', 1)[0]
+    return None
+
+
+class WheelIndex:
+    """
+    wheelhouse目录的内存索引,目录变化时自动重建
+    """
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.projects = {}  # {规范化包名: [(文件名, sha256), ...]}
+        self.files = set()
+        self._dir_mtime = None
+        self._hash_cache = {}  # {(文件名, 大小, mtime): sha256}
+        self._lock = threading.Lock()
+
+    def _file_hash(self, filename, stat):
+        key = (filename, stat.st_size, stat.st_mtime_ns)
+        digest = self._hash_cache.get(key)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(os.path.join(self.directory, filename), 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            self._hash_cache[key] = digest
+        return digest
+
+    def refresh(self):
+        """目录mtime变化时重建索引,返回当前索引"""
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        with self._lock:
+            if mtime == self._dir_mtime:
+                return self.projects
+
+            projects = {}
+            files = set()
+            hash_keys = set()
+            if mtime is not None:
+                with os.scandir(self.directory) as it:
+                    for entry in it:
+                        # 跳过解包中的临时文件
+                        if not entry.is_file() or not entry.name.endswith(PACKAGE_EXTENSIONS):
+                            continue
+                        project = parse_project_name(entry.name)
+                        if not project:
+                            continue
+                        stat = entry.stat()
+                        digest = self._file_hash(entry.name, stat)
+                        hash_keys.add((entry.name, stat.st_size, stat.st_mtime_ns))
+                        projects.setdefault(normalize_name(project), []).append((entry.name, digest))
+                        files.add(entry.name)
+
+            for entries in projects.values():
+                entries.sort()
+            # 删除已不存在文件的缓存
+            self._hash_cache = {k: v for k, v in self._hash_cache.items() if k in hash_keys}
+            self.projects = projects
+            self.files = files
+            self._dir_mtime = mtime
+            return projects
+
+
+class WheelIndexHandler(BaseHTTPRequestHandler):
+    """
+    PEP 503 simple index请求处理
+    """
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    server_version = 'WheelIndexServer/1.0'
+
+    @property
+    def index(self):
+        return self.server.index
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def do_HEAD(self):
+        self.handle_request(send_body=False)
+
+    def do_GET(self):
+        self.handle_request(send_body=True)
+
+    def handle_request(self, send_body):
+        path = unquote(self.path.split('?', 1)[0].split('#', 1)[0])
+        projects = self.index.refresh()
+
+        if path in ('/', '/simple'):
+            self.send_redirect('/simple/')
+        elif path == '/simple/':
+            links = ''.join(
+                f'<a href="/simple/{name}/">{html.escape(name)}</a><br/>\n'
+                for name in sorted(projects)
+            )
+            self.send_html('Simple index', links, send_body)
+        elif path.startswith('/simple/'):
+            project = path[len('/simple/'):].strip('/')
+            normalized = normalize_name(project)
+            if project != normalized:
+                self.send_redirect(f'/simple/{normalized}/')
+            elif normalized not in projects:
+                self.send_error(404, 'Project not found')
+            else:
+                links = ''.join(
+                    f'<a href="/packages/{html.escape(name)}#sha256={digest}">{html.escape(name)}</a><br/>\n'
+                    for name, digest in projects[normalized]
+                )
+                self.send_html(f'Links for {normalized}', links, send_body)
+        elif path.startswith('/packages/'):
+            filename = path[len('/packages/'):]
+            # 只允许访问索引中的文件名,防止路径穿越
+            if filename not in self.index.files:
+                self.send_error(404, 'File not found')
+            else:
+                self.send_package(os.path.join(self.index.directory, filename), send_body)
+        else:
+            self.send_error(404)
+
+    def send_redirect(self, location):
+        self.send_response(301)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def send_html(self, title, body, send_body):
+        data = (
+            '<!DOCTYPE html>\n<html><head>'
+            '<meta name="pypi:repository-version" content="1.0">'
+            f'<title>{title}</title></head><body>\n{body}</body></html>\n'
+        ).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def parse_range(self, size):
+        """解析Range头,返回(start, end)、None（无Range）或False（无法满足）"""
+        header = self.headers.get('Range')
+        if not header:
+            return None
+        m = re.fullmatch(r'\s*bytes=(\d*)-(\d*)\s*', header)
+        if not m or (not m.group(1) and not m.group(2)):
+            # 不支持的格式（如多段Range）按完整文件返回
+            return None
+        if m.group(1):
+            start = int(m.group(1))
+            end = int(m.group(2)) if m.group(2) else size - 1
+        else:
+            # bytes=-N 表示最后N个字节
+            start = max(size - int(m.group(2)), 0)
+            end = size - 1
+        end = min(end, size - 1)
+        if start >= size or start > end:
+            return False
+        return start, end
+
+    def send_package(self, file_path, send_body):
+        try:
+            f = open(file_path, 'rb')
+        except OSError:
+            self.send_error(404, 'File not found')
+            return
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            byte_range = self.parse_range(size)
+            if byte_range is False:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            if byte_range is None:
+                start, end = 0, size - 1
+                self.send_response(200)
+            else:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+
+            length = end - start + 1 if size else 0
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.end_headers()
+            if not send_body:
+                return
+
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(1024 * 1024, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+
+class WheelIndexServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, directory, quiet=False):
+        super().__init__(address, WheelIndexHandler)
+        self.index = WheelIndex(directory)
+        self.quiet = quiet
+
+    @property
+    def url(self):
+        """pip可用的源地址（可直接填入pip_source_list）"""
+        host, port = self.server_address[:2]
+        if host in ('0.0.0.0', '::', ''):
+            host = '127.0.0.1'
+        return f'http://{host}:{port}/simple/'
+
+
+def start_server(directory=WHEELHOUSE_DIR, host='127.0.0.1', port=0, quiet=True):
+    """
+    在后台线程中启动服务器（port=0表示随机端口）,用于测试或嵌入其他脚本
+
+    Returns:
+        (server, thread) 用完后调用 server.shutdown() 和 server.server_close()
+    """
+    server = WheelIndexServer((host, port), directory, quiet=quiet)
+    server.index.refresh()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地wheel源服务器（PEP 503）')
+    parser.add_argument('--dir', type=str, default=WHEELHOUSE_DIR, help=f'wheel目录（默认: {WHEELHOUSE_DIR}）')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST, help=f'监听地址（默认: {DEFAULT_HOST}）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'监听端口（默认: {DEFAULT_PORT}）')
+    parser.add_argument('-q', '--quiet', action='store_true', help='不打印访问日志')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        print(f'错误: 目录不存在: {args.dir}')
+        sys.exit(1)
+
+    server = WheelIndexServer((args.host, args.port), args.dir, quiet=args.quiet)
+    projects = server.index.refresh()
+    print(f'共享目录: {server.index.directory} ({len(projects)} 个包)')
+    print(f'源地址: {server.url}')
+    print('按 Ctrl+C 停止')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('\n已停止')
+    finally:
+        server.server_close()